@@ -3,65 +3,126 @@ Phi-2専用：軽量LLM対話シミュレーション
 メモリ効率とPhi-2の特性に最適化
 """
 
-import torch
 import csv
+import math
 import random
 import os
-from typing import List, Dict, Tuple
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Iterator, Optional, Tuple
 import warnings
 warnings.filterwarnings('ignore')
 
-try:
-    from transformers import AutoTokenizer, AutoModelForCausalLM
-    TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    TRANSFORMERS_AVAILABLE = False
-    print("Error: pip install transformers torch")
+from backends.base import DialogueBackend, StopRule, chain_future
+from dialogue_session import DialogueSession
+from prompt_builder import Prompt, PromptBuilder
+from response_cache import ResponseCache
+from telemetry import Telemetry
+from verdict_head import VerdictHead
 
 
 class Phi2DialogueSimulator:
     """Phi-2専用の最適化シミュレーター"""
     
-    def __init__(self, use_gpu=True):
+    def __init__(self, use_gpu=True, use_kv_cache=True,
+                 batch_size=1, batch_wait_ms=20.0, cached_verdict=True,
+                 quantize=None, model_name="microsoft/phi-2", draft_model=None,
+                 response_cache: Optional[ResponseCache] = None,
+                 backend: Optional[DialogueBackend] = None,
+                 prompt_budget=512,
+                 telemetry: Optional[Telemetry] = None,
+                 yes_threshold=0.8, no_threshold=0.20, verbose=True,
+                 verdict_head: Optional[VerdictHead] = None):
         """
         Phi-2専用初期化
+
+        Args:
+            use_gpu: CUDAが使える場合はGPUで推論する
+            use_kv_cache: 会話ごとにpast_key_valuesを保持し、新しいターンの
+                差分トークンだけをprefillする
+            batch_size: 2以上なら InferenceWorker を起動し、複数スレッドからの
+                generate / 分類リクエストをこの件数までまとめてバッチ推論する
+            batch_wait_ms: バッチが埋まるまで後続リクエストを待つ最大時間
+            cached_verdict: 仲間判定を会話のKVキャッシュの続きとして行い、
+                短い分類用サフィックスだけをprefillする
+            quantize: CPU推論時の量子化モード。"int8" で全Linear層を
+                動的int8量子化する（GPU時は無視）。Noneならfloat32のまま
+            model_name: 読み込むモデル（Hugging Face のIDまたはローカルパス）
+            draft_model: 補助デコード用の小さな因果LM（例: "microsoft/phi-1_5"）。
+                Noneなら通常のトークン単位のデコード
+            response_cache: 応答・判定ロジットのメモ化キャッシュ。Noneなら無効
+            backend: 推論バックエンド。省略時は上記の設定で HFPhi2Backend を作る
+                （指定した場合、モデル関連の引数は無視される）
+            prompt_budget: プロンプトの最大トークン数。超える場合は古い会話ターンから落とす
+            telemetry: 推論イベントの発行先。バックエンドに未設定ならそちらにも設定する
+            yes_threshold: 仲間判定でYES確率がこれ以上なら確定YES
+            no_threshold: 仲間判定でYES確率がこれ以下なら確定NO（間は確率的に判定）
+            verbose: キャラクター生成・会話・判定結果をコンソールに表示する
+            verdict_head: 会話末尾の隠れ状態から判定する学習済みヘッド。
+                Noneやモデルが合わない場合は " YES" / " NO" のロジットで判定する
         """
-        if not TRANSFORMERS_AVAILABLE:
-            raise ImportError("transformers required")
-        
-        self.model_name = "microsoft/phi-2"
-        self.device = "cuda" if use_gpu and torch.cuda.is_available() else "cpu"
-        
-        print(f"Loading Phi-2 on {self.device}...")
-        
-        # Phi-2のロード
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            self.model_name,
-            trust_remote_code=True
-        )
-        self.model = AutoModelForCausalLM.from_pretrained(
-            self.model_name,
-            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-            device_map=self.device,
-            trust_remote_code=True,
-            low_cpu_mem_usage=True
-        )
-        
-        # パディングトークン設定
-        if self.tokenizer.pad_token is None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
-        
-        print("✓ Model loaded successfully")
+        self.verbose = verbose
+        if backend is None:
+            from backends.hf_phi2 import HFPhi2Backend
+            backend = HFPhi2Backend(
+                model_name=model_name, use_gpu=use_gpu,
+                use_kv_cache=use_kv_cache, batch_size=batch_size,
+                batch_wait_ms=batch_wait_ms, quantize=quantize,
+                draft_model=draft_model)
+        self.backend = backend
+
+        # 推論テレメトリ（応答・判定ごとのイベント。バックエンドは生成の内訳を発行する）
+        self.telemetry = telemetry
+        if telemetry is not None and backend.telemetry is None:
+            backend.telemetry = telemetry
 
         # CSVデータ読み込み
         base_dir = os.path.dirname(os.path.abspath(__file__))
         self.jobs = self._load_csv(os.path.join(base_dir, "data", "jobs.csv"))
         self.personalities = self._load_csv(os.path.join(base_dir, "data", "personatlities.csv"))
         self.names = self._load_names(os.path.join(base_dir, "data", "names.csv"))
-        print(f"✓ Loaded {len(self.jobs)} jobs, {len(self.personalities)} personalities, {len(self.names)} names")
-
-        # 対話履歴
-        self.conversation_history = []
+        self._log(f"✓ Loaded {len(self.jobs)} jobs, {len(self.personalities)} personalities, {len(self.names)} names")
+
+        # 会話の状態はセッションごとに持つ。session を省略した呼び出しは既定のセッションを使う
+        self.default_session = DialogueSession(self, session_id="default")
+        self.cached_verdict = cached_verdict
+        self.yes_threshold = yes_threshold
+        self.no_threshold = no_threshold
+
+        # 学習済みの判定ヘッド（別のモデルで学習したものは使わない）
+        model = backend.cache_tag().get('model')
+        if verdict_head is not None and verdict_head.model and verdict_head.model != model:
+            print(f"Verdict head was trained on {verdict_head.model}, not {model}; "
+                  f"using YES/NO logits")
+            verdict_head = None
+        self.verdict_head = verdict_head
+
+        # 応答メモ化キャッシュ
+        self.response_cache = response_cache
+
+        # 応答の整形で捨てる部分（2文目以降・改行以降・200文字超）は生成しない
+        self.stop_rule = StopRule()
+
+        # テンプレート・プロフィール・会話ターンのトークンIDをキャッシュするビルダー
+        self.prompts = PromptBuilder(self.backend.encode, prompt_budget)
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """既定のセッションの会話履歴"""
+        return self.default_session.history
+
+    @conversation_history.setter
+    def conversation_history(self, history: List[Dict]):
+        self.default_session.history = list(history)
+
+    def new_session(self, character: Optional[Dict] = None) -> DialogueSession:
+        """このシミュレーター（読み込み済みのモデル）を共有する新しい会話を作る"""
+        return DialogueSession(self, character)
+
+    def _log(self, *args):
+        """verbose のときだけ表示する"""
+        if self.verbose:
+            print(*args)
     
     @staticmethod
     def _load_csv(path: str) -> List[Dict]:
@@ -75,12 +136,22 @@ class Phi2DialogueSimulator:
         with open(path, encoding='utf-8') as f:
             return [line.strip() for line in f if line.strip()]
 
-    def create_random_character(self) -> Dict:
-        """ランダムにジョブと性格を選んでキャラクターを生成"""
-        job = random.choice(self.jobs)
-        personality = random.choice(self.personalities)
-        name = random.choice(self.names)
+    def create_random_character(self, rng: Optional[random.Random] = None) -> Dict:
+        """
+        ランダムにジョブと性格を選んでキャラクターを生成
 
+        Args:
+            rng: 使用する乱数生成器（ベンチマーク等で再現性が必要な場合に渡す）。
+                Noneならモジュールの random を使う
+        """
+        rng = rng or random
+        job = rng.choice(self.jobs)
+        personality = rng.choice(self.personalities)
+        name = rng.choice(self.names)
+        return self.create_character(job, personality, name)
+
+    def create_character(self, job: Dict, personality: Dict, name: str) -> Dict:
+        """jobs.csv / personatlities.csv の行と名前からキャラクターを作る"""
         character = {
             'name': name,
             'job': job['Class'],
@@ -99,87 +170,216 @@ class Phi2DialogueSimulator:
             'agi': int(personality['AGI']),
         }
 
-        print(f"\n--- キャラクター生成 ---")
-        print(f"名前: {name}")
-        print(f"職業: {job['Class']} ({job['Role']}) - {job['Description']}")
-        print(f"性格: {personality['Trait']} - {personality['Description']}")
-        print(f"武器: {job['Primary_Weapon']} / 能力: {job['Typical_Abilities']}")
+        self._log(f"\n--- キャラクター生成 ---")
+        self._log(f"名前: {name}")
+        self._log(f"職業: {job['Class']} ({job['Role']}) - {job['Description']}")
+        self._log(f"性格: {personality['Trait']} - {personality['Description']}")
+        self._log(f"武器: {job['Primary_Weapon']} / 能力: {job['Typical_Abilities']}")
         stat_mods = [f"HP{character['hp']:+d}", f"ATK{character['atk']:+d}",
                      f"DEF{character['def']:+d}", f"WIS{character['wis']:+d}",
                      f"LUC{character['luc']:+d}", f"AGI{character['agi']:+d}"]
-        print(f"性格補正: {', '.join(stat_mods)}")
-        print(f"-----------------------")
+        self._log(f"性格補正: {', '.join(stat_mods)}")
+        self._log(f"-----------------------")
 
         return character
 
     def generate_response(self,
                         user_input: str,
                         character: Dict,
-                        is_first_greeting: bool = False) -> str:
+                        is_first_greeting: bool = False,
+                        seed: Optional[int] = None,
+                        session: Optional[DialogueSession] = None) -> str:
+        """
+        キャラクターの応答を生成する。
+        session を渡すとその会話の履歴を文脈にし、バックエンドの会話状態もその会話のものを使う
+        （省略時は既定のセッション）。履歴への追記は呼び出し側で行う。
+        """
+        session = session or self.default_session
+        t0 = time.perf_counter()
+        prompt, max_tokens, temp = self._build_response_prompt(
+            user_input, character, is_first_greeting, session.snapshot())
+
+        key = self._response_key(prompt, max_tokens, temp, seed)
+        raw = self.response_cache.get(key) if self.response_cache is not None else None
+        cache = self._cache_state(raw)
+        if raw is None:
+            raw = self.backend.generate(prompt.text, max_tokens, temp,
+                                        seed=seed, input_ids=prompt.ids,
+                                        stop=self.stop_rule, session=session.id)
+            if self.response_cache is not None:
+                self.response_cache.put(key, raw)
+
+        self._emit_response("generate", prompt, is_first_greeting, cache, t0)
+        return self._extract_phi2_response(raw, "", character['name'])
+
+    def submit_response(self,
+                        user_input: str,
+                        character: Dict,
+                        is_first_greeting: bool = False,
+                        seed: Optional[int] = None,
+                        session: Optional[DialogueSession] = None) -> Future:
+        """
+        generate_response の非同期版。整形済み応答を結果に持つFutureを返す。
+        バックエンドがバッチ推論に対応していれば他のリクエストとまとめて処理される。
+        """
+        session = session or self.default_session
+        t0 = time.perf_counter()
+        prompt, max_tokens, temp = self._build_response_prompt(
+            user_input, character, is_first_greeting, session.snapshot())
         name = character['name']
-        role = character['role']
 
-        if is_first_greeting:
-            # 初回専用のシンプルなプロンプト
-            prompt = f"""A traveler meets {name}, a {character['personality']} {character['job']}.
+        key = self._response_key(prompt, max_tokens, temp, seed)
+        cached = self.response_cache.get(key) if self.response_cache is not None else None
+        cache = self._cache_state(cached)
+        if cached is not None:
+            self._emit_response("submit", prompt, is_first_greeting, cache, t0)
+            future = Future()
+            future.set_result(self._extract_phi2_response(cached, "", name))
+            return future
 
-    {name}'s profile:
-    - Role: {role}
-    - Weapon: {character['weapon']}
-    - Skills: {character['abilities']}
-    - Personality: {character['personality']}
+        future = self.backend.submit(prompt.text, max_tokens, temp,
+                                     seed=seed, input_ids=prompt.ids,
+                                     stop=self.stop_rule, session=session.id)
+
+        def finish(raw: str) -> str:
+            if self.response_cache is not None:
+                self.response_cache.put(key, raw)
+            self._emit_response("submit", prompt, is_first_greeting, cache, t0)
+            return self._extract_phi2_response(raw, "", name)
+
+        return chain_future(future, finish)
+
+    def stream_response(self,
+                        user_input: str,
+                        character: Dict,
+                        is_first_greeting: bool = False,
+                        seed: Optional[int] = None,
+                        session: Optional[DialogueSession] = None) -> Iterator[str]:
+        """
+        generate_response のストリーミング版。
+        デコードされた順に生成テキストの断片をyieldする（プロンプトは含まない）。
+        最初の改行以降は応答として使われないため、そこでyieldを止める。
+        整形済みの応答が必要なら、連結した断片を _extract_phi2_response(text, "", name) に通す。
+        キャッシュヒット時は保存済みのテキストを1片でyieldする。
+        """
+        session = session or self.default_session
+        t0 = time.perf_counter()
+        prompt, max_tokens, temp = self._build_response_prompt(
+            user_input, character, is_first_greeting, session.snapshot())
+
+        key = self._response_key(prompt, max_tokens, temp, seed)
+        cached = self.response_cache.get(key) if self.response_cache is not None else None
+        cache = self._cache_state(cached)
+        if cached is not None:
+            self._emit_response("stream", prompt, is_first_greeting, cache, t0)
+            yield cached
+            return
+
+        text = ""
+        raw = ""
+        for chunk in self.backend.stream(prompt.text, max_tokens, temp,
+                                         seed=seed, input_ids=prompt.ids,
+                                         stop=self.stop_rule, session=session.id):
+            raw += chunk
+            if '\n' in text.strip():
+                continue
+            text += chunk
+            yield chunk
+
+        if self.response_cache is not None:
+            self.response_cache.put(key, raw)
+        self._emit_response("stream", prompt, is_first_greeting, cache, t0)
+
+    def _cache_state(self, cached) -> str:
+        """テレメトリ用の応答キャッシュ結果（"hit" / "miss" / "off"）"""
+        if self.response_cache is None:
+            return "off"
+        return "hit" if cached is not None else "miss"
+
+    def _emit_response(self, mode: str, prompt: Prompt, is_first_greeting: bool,
+                       cache: str, t0: float):
+        """1ターン分の応答イベント（プロンプトの組み立て〜生成完了）"""
+        if self.telemetry is None:
+            return
+        self.telemetry.emit(
+            "response", mode=mode, greeting=is_first_greeting, cache=cache,
+            prompt_tokens=len(prompt.ids), dropped_turns=prompt.dropped_turns,
+            truncated=prompt.truncated, total_s=time.perf_counter() - t0,
+            segment_hits=self.prompts.hits, segment_misses=self.prompts.misses)
+
+    def _response_key(self, prompt: Prompt, max_tokens: int, temp: float,
+                      seed: Optional[int]) -> Optional[str]:
+        """応答キャッシュのキー（プロンプト＋サンプリング設定＋シード）"""
+        if self.response_cache is None:
+            return None
+        params = {'max_new_tokens': max_tokens, 'temperature': temp,
+                  'stop': self.stop_rule, **self.backend.cache_tag()}
+        return self.response_cache.make_key(prompt.text, params, seed)
+
+    def _build_response_prompt(self,
+                               user_input: str,
+                               character: Dict,
+                               is_first_greeting: bool,
+                               history: Optional[List[Dict]] = None) -> Tuple[Prompt, int, float]:
+        """
+        応答生成用のプロンプトと生成パラメータ（最大トークン数, temperature）を返す。
+        history を省略すると conversation_history を文脈に使う。
+        会話ターンはトークン予算に収まる分だけ、新しいものから残す。
+        """
+        if history is None:
+            history = self.conversation_history
+        name = character['name']
+        user_input = user_input.strip()
+
+        if is_first_greeting:
+            # 初回専用のシンプルなプロンプト（プロフィール部分はキャラクターごとにキャッシュ）
+            prompt = self.prompts.build(
+                head=[self._profile_block(character)],
+                tail=["\n\n    Traveler:", f" {user_input}", f"\n    {name}: I am"])
 
-    Traveler: {user_input}
-    {name}: I am"""
-            
             max_tokens = 80
             temp = 0.5
         else:
             # 既存の会話継続用プロンプト
-            system_msg = f"I am {name}, a {character['personality']} {character['job']}."
-            
-            conversation_context = ""
-            if self.conversation_history:
-                recent_turns = self.conversation_history[-3:]
-                lines = []
-                for t in recent_turns:
-                    lines.append(f"User: {t['user']}")
-                    lines.append(f"{name}: {t['ai']}")
-                conversation_context = "\n" + "\n".join(lines) + "\n"
-
-            prompt = f"""{system_msg}
-
-    {conversation_context}User: {user_input}
-    {name}:"""
-            
+            head, turns, tail = self._dialogue_segments(user_input, character, history)
+            prompt = self.prompts.build(head, turns, tail)
+
             max_tokens = 50
             temp = 0.7
-        
-        inputs = self.tokenizer(
-            prompt, 
-            return_tensors="pt",
-            truncation=True,
-            max_length=512
-        ).to(self.device)
-        
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_tokens,
-                temperature=temp,
-                top_p=0.85,
-                top_k=30,
-                repetition_penalty=1.3,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id,
-                eos_token_id=self.tokenizer.eos_token_id
-            )
-        
-        full_response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        response = self._extract_phi2_response(full_response, prompt, name)
-        
-        return response
-    
+
+        return prompt, max_tokens, temp
+
+    def _dialogue_segments(self, user_input: str, character: Dict,
+                           history: List[Dict]) -> Tuple[List[str], List[str], List[str]]:
+        """会話継続プロンプトの (固定の先頭, 会話ターン, 固定の末尾) セグメント"""
+        name = character['name']
+        system_msg = f"I am {name}, a {character['personality']} {character['job']}."
+        return ([system_msg, "\n\n    "],
+                self._turn_segments(history, name),
+                ["\nUser:", f" {user_input.strip()}", f"\n    {name}:"])
+
+    @staticmethod
+    def _profile_block(character: Dict) -> str:
+        """初回挨拶プロンプトのキャラクター紹介部分"""
+        name = character['name']
+        return f"""A traveler meets {name}, a {character['personality']} {character['job']}.
+
+    {name}'s profile:
+    - Role: {character['role']}
+    - Weapon: {character['weapon']}
+    - Skills: {character['abilities']}
+    - Personality: {character['personality']}"""
+
+    @classmethod
+    def _turn_segments(cls, history: List[Dict], name: str) -> List[str]:
+        """会話履歴を1ターン1セグメントのテキストにする（各セグメントは改行始まり）"""
+        return [f"\nUser: {t['user']}\n{name}:{cls._reply_text(t['ai'])}" for t in history]
+
+    @staticmethod
+    def _reply_text(reply: str) -> str:
+        """「名前:」に続ける応答部分。空の応答では空白を付けない（セグメントを空白で終わらせない）"""
+        return f" {reply}" if reply else ""
+
     def _extract_phi2_response(self, full_text: str, prompt: str, char_name: str) -> str:
         """Phi-2の出力から応答を抽出"""
         
@@ -192,6 +392,11 @@ class Phi2DialogueSimulator:
         # 最初の文または改行まで
         if '\n' in response:
             response = response.split('\n')[0]
+
+        # 次の話者の発言が同じ行に続いた場合はその手前まで
+        for marker in self.stop_rule.markers:
+            if marker in response:
+                response = response.split(marker)[0].strip()
         
         # キャラクター名を削除（重複している場合）
         if response.startswith(f"{char_name}:"):
@@ -210,107 +415,91 @@ class Phi2DialogueSimulator:
     
     def simulate_conversation(self,
                              scenario: List[str],
-                             character: Dict) -> Tuple[bool, float, Dict]:
+                             character: Dict,
+                             session: Optional[DialogueSession] = None,
+                             rng: Optional[random.Random] = None) -> Tuple[bool, float, Dict]:
         """
         会話シミュレーション
 
         Args:
             scenario: ユーザー発言リスト
             character: create_random_character() で生成したキャラクター辞書
+            session: 会話を記録するセッション（省略時は既定のセッション）
+            rng: 最終判定の乱数生成器（Noneならモジュールの random）
         """
+        session = session or self.default_session
         name = character['name']
 
-        print("\n" + "="*60)
-        print(f"シミュレーション: {name} ({character['job']} / {character['personality']})")
-        print("="*60)
+        self._log("\n" + "="*60)
+        self._log(f"シミュレーション: {name} ({character['job']} / {character['personality']})")
+        self._log("="*60)
 
         for turn_idx, user_input in enumerate(scenario, 1):
-            print(f"\n[ターン {turn_idx}]")
-            print(f"User: {user_input}")
+            self._log(f"\n[ターン {turn_idx}]")
+            self._log(f"User: {user_input}")
 
             # AI応答生成
-            ai_response = self.generate_response(user_input, character)
-            print(f"{name}: {ai_response}")
+            ai_response = self.generate_response(user_input, character, session=session)
+            self._log(f"{name}: {ai_response}")
 
             # 記録
-            self.conversation_history.append({
-                'turn': turn_idx,
-                'user': user_input,
-                'ai': ai_response
-            })
+            session.add_turn(user_input, ai_response, turn_idx)
 
         # 最終判定：transformerによる二値分類
-        return self._classify_companion(character)
+        return self._classify_companion(character, session=session, rng=rng)
 
-    def _classify_companion(self, character: Dict) -> Tuple[bool, float, Dict]:
+    def _classify_companion(self, character: Dict,
+                            use_cache: Optional[bool] = None,
+                            session: Optional[DialogueSession] = None,
+                            rng: Optional[random.Random] = None) -> Tuple[bool, float, Dict]:
         """
         会話履歴全体をtransformerに入力し、仲間になるかを二値分類する。
         YESトークンとNOトークンの生成確率を比較して判定。
+
+        Args:
+            use_cache: Trueなら会話のKVキャッシュに分類サフィックスを続けて判定する。
+                Noneなら self.cached_verdict に従う。
+            session: 判定する会話（省略時は既定のセッション）
+            rng: 確率的判定に使う乱数生成器。Noneならモジュールの random を使う
         """
+        session = session or self.default_session
+        history = session.snapshot()
 
-        if not self.conversation_history:
+        if not history:
             return False, 0.0, {}
 
-        name = character['name']
-        job = character['job']
-        personality = character['personality']
-
-        # 会話履歴をテキストに整形
-        dialogue_lines = []
-        for turn in self.conversation_history:
-            dialogue_lines.append(f"User: {turn['user']}")
-            dialogue_lines.append(f"{name}: {turn['ai']}")
-        dialogue_text = "\n".join(dialogue_lines)
-
-        # 分類プロンプト
-        prompt = f"""Instruct: Read the following conversation between a user and {name} (a {personality} {job}).
-Based on the conversation, does {name} want to join the user's party as a companion?
-
-Conversation:
-{dialogue_text}
-
-Answer YES if {name} is willing to join. Answer NO if {name} is unwilling or the role is incompatible.
-Output:"""
-
-        inputs = self.tokenizer(
-            prompt,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512
-        ).to(self.device)
-
-        # 次トークンのロジットを取得（生成はしない）
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            next_token_logits = outputs.logits[:, -1, :]
+        head_logit = self._head_logit(character, history, session)
+        if head_logit is not None:
+            # 学習済みヘッド（softmax(logit, 0) がそのままYES確率）
+            yes_logit, no_logit, source = head_logit, 0.0, "head"
+        else:
+            if use_cache is None:
+                use_cache = self.cached_verdict
 
-        # YES / NO それぞれのトークンIDを取得
-        yes_tokens = self.tokenizer.encode(" YES", add_special_tokens=False)
-        no_tokens = self.tokenizer.encode(" NO", add_special_tokens=False)
+            if use_cache:
+                prompt = self._build_cached_verdict_prompt(character, history)
+            else:
+                prompt = self._build_verdict_prompt(character, history)
 
-        # 各トークン列の先頭トークンのロジットで比較
-        yes_logit = next_token_logits[0, yes_tokens[0]].item()
-        no_logit = next_token_logits[0, no_tokens[0]].item()
+            yes_logit, no_logit = self._verdict_logits(prompt, session)
+            source = "logits"
 
         # softmaxで確率化
-        logits_pair = torch.tensor([yes_logit, no_logit])
-        probs = torch.softmax(logits_pair, dim=0)
-        yes_prob = probs[0].item()
-        no_prob = probs[1].item()
+        yes_prob, no_prob = self._softmax_pair(yes_logit, no_logit)
 
         # 確率的判定
-        random_value = random.random()  # 0.0～1.0の乱数生成
+        random_value = (rng or random).random()  # 0.0～1.0の乱数生成
 
-        if yes_prob >= 0.8:
-            # 80%以上なら確定でYES
+        if yes_prob >= self.yes_threshold:
+            # 閾値（既定80%）以上なら確定でYES
             becomes_companion = True
-            decision_type = "確定YES (≥80%)"
-        elif yes_prob <= 0.20:
-            # 10%以下なら確定でNO
+            decision_type = f"確定YES (≥{self.yes_threshold:.0%})"
+        elif yes_prob <= self.no_threshold:
+            # 閾値（既定20%）以下なら確定でNO
             becomes_companion = False
-            decision_type = "確定NO (≤20%)"
+            decision_type = f"確定NO (≤{self.no_threshold:.0%})"
         else:
-            # 10%～90%の間は確率的判定
+            # 両閾値の間は確率的判定
             becomes_companion = random_value < yes_prob
             decision_type = f"確率的判定 (乱数={random_value:.3f})"
 
@@ -323,23 +512,162 @@ Output:"""
             'yes_logit': yes_logit,
             'no_logit': no_logit,
             'random_value': random_value,
-            'decision_type': decision_type
+            'decision_type': decision_type,
+            'source': source,
         }
 
         # 結果表示
-        print("\n" + "="*60)
-        print("最終判定（確率的二値分類）")
-        print("="*60)
-        print(f"仲間になる: {'✓ YES' if becomes_companion else '✗ NO'}")
-        print(f"YES確率: {yes_prob:.3f}")
-        print(f"NO確率:  {no_prob:.3f}")
-        print(f"乱数値:  {random_value:.3f}")
-        print(f"判定方式: {decision_type}")
-        print(f"確信度:  {confidence:.3f}")
-        print("="*60)
+        self._log("\n" + "="*60)
+        self._log("最終判定（確率的二値分類）")
+        self._log("="*60)
+        self._log(f"仲間になる: {'✓ YES' if becomes_companion else '✗ NO'}")
+        self._log(f"YES確率: {yes_prob:.3f}")
+        self._log(f"NO確率:  {no_prob:.3f}")
+        self._log(f"乱数値:  {random_value:.3f}")
+        self._log(f"判定方式: {decision_type}")
+        self._log(f"確信度:  {confidence:.3f}")
+        self._log("="*60)
 
         return becomes_companion, yes_prob, details
     
+    def _build_verdict_prompt(self, character: Dict, history: List[Dict]) -> Prompt:
+        """会話全体を埋め込んだ独立の分類プロンプト（全体をprefillする）"""
+        name = character['name']
+        job = character['job']
+        personality = character['personality']
+
+        # 分類プロンプト（会話部分は予算に収まる分だけ新しいターンから残す）
+        return self.prompts.build(
+            head=[f"""Instruct: Read the following conversation between a user and {name} (a {personality} {job}).
+Based on the conversation, does {name} want to join the user's party as a companion?
+
+Conversation:"""],
+            turns=self._turn_segments(history, name),
+            tail=[f"""
+
+Answer YES if {name} is willing to join. Answer NO if {name} is unwilling or the role is incompatible.
+Output:"""])
+
+    def _build_cached_verdict_prompt(self, character: Dict, history: List[Dict]) -> Prompt:
+        """
+        最終ターンの生成プロンプト＋応答の後ろに分類指示を続けたプロンプト。
+        先頭は直前の generate と同じトークン列になるため、KVキャッシュが効き
+        最終応答と分類サフィックスだけがprefillされる。
+        """
+        name = character['name']
+        head, turns, tail = self._conversation_segments(character, history)
+        return self.prompts.build(head, turns, tail + [
+            f"""
+
+Instruct: Based on the conversation above, does {name} want to join the user's party as a companion?
+Answer YES if {name} is willing to join. Answer NO if {name} is unwilling or the role is incompatible.
+Output:"""])
+
+    def _build_conversation_prompt(self, character: Dict, history: List[Dict]) -> Prompt:
+        """最終ターンの生成プロンプト＋応答（判定ヘッドはこの末尾の隠れ状態を見る）"""
+        return self.prompts.build(*self._conversation_segments(character, history))
+
+    def _conversation_segments(self, character: Dict,
+                               history: List[Dict]) -> Tuple[List[str], List[str], List[str]]:
+        """最終ターンの生成プロンプトと同じセグメント列に、その応答を続けたもの"""
+        last = history[-1]
+        head, turns, tail = self._dialogue_segments(last['user'], character, history[:-1])
+        return head, turns, tail + [self._reply_text(last['ai'])]
+
+    def verdict_features(self, character: Dict, history: List[Dict],
+                         session: Optional[DialogueSession] = None) -> List[float]:
+        """判定ヘッドの入力（会話末尾トークンの最終層の隠れ状態）"""
+        session = session or self.default_session
+        prompt = self._build_conversation_prompt(character, history)
+        return self.backend.hidden_state(prompt.text, input_ids=prompt.ids,
+                                         session=session.id)
+
+    def _head_logit(self, character: Dict, history: List[Dict],
+                    session: DialogueSession) -> Optional[float]:
+        """学習済みヘッドによるYESのロジット。ヘッドが無い・使えない場合はNone"""
+        if self.verdict_head is None:
+            return None
+        t0 = time.perf_counter()
+        try:
+            logit = self.verdict_head.logit(self.verdict_features(character, history, session))
+        except (NotImplementedError, ValueError) as e:
+            # 隠れ状態を出せないバックエンド・次元の合わないヘッドは以後使わない
+            print(f"Verdict head disabled ({e}); using YES/NO logits")
+            self.verdict_head = None
+            return None
+        if self.telemetry is not None:
+            self.telemetry.emit("verdict", cache="off", source="head",
+                                classify_s=time.perf_counter() - t0)
+        return logit
+
+    def _verdict_logits(self, prompt: Prompt,
+                        session: Optional[DialogueSession] = None) -> Tuple[float, float]:
+        """分類プロンプトに対する " YES" / " NO" 先頭トークンのロジット"""
+        t0 = time.perf_counter()
+        key = None
+        if self.response_cache is not None:
+            key = self.response_cache.make_key(
+                prompt.text, {'kind': 'verdict', **self.backend.cache_tag()})
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                self._emit_verdict(prompt, "hit", t0)
+                return cached[0], cached[1]
+
+        # YES / NO 各トークン列の先頭トークンのロジットで比較
+        session = session or self.default_session
+        yes_logit, no_logit = self.backend.classify(prompt.text, [" YES", " NO"],
+                                                    input_ids=prompt.ids,
+                                                    session=session.id)
+
+        if key:
+            self.response_cache.put(key, [yes_logit, no_logit])
+        self._emit_verdict(prompt, "miss" if key else "off", t0)
+        return yes_logit, no_logit
+
+    def _emit_verdict(self, prompt: Prompt, cache: str, t0: float):
+        if self.telemetry is not None:
+            self.telemetry.emit("verdict", cache=cache, source="logits",
+                                prompt_tokens=len(prompt.ids),
+                                dropped_turns=prompt.dropped_turns,
+                                classify_s=time.perf_counter() - t0)
+
+    def verdict_parity(self, character: Dict,
+                       session: Optional[DialogueSession] = None) -> Dict:
+        """
+        キャッシュ経由の判定と従来の全体再エンコード判定の yes_prob を比較する。
+        乱数判定は行わず、確率と判定帯（確定YES / 確定NO / 確率的）の一致を返す。
+        """
+        # 先にキャッシュ経路を評価する（従来プロンプトは会話キャッシュを上書きするため）
+        session = session or self.default_session
+        history = session.snapshot()
+        results = {}
+        for key, prompt in (("cached", self._build_cached_verdict_prompt(character, history)),
+                            ("legacy", self._build_verdict_prompt(character, history))):
+            yes_logit, no_logit = self._verdict_logits(prompt, session)
+            results[key] = self._softmax_pair(yes_logit, no_logit)[0]
+
+        return {
+            'legacy_yes_prob': results['legacy'],
+            'cached_yes_prob': results['cached'],
+            'abs_diff': abs(results['legacy'] - results['cached']),
+            'same_band': self.verdict_band(results['legacy']) == self.verdict_band(results['cached']),
+        }
+
+    def verdict_band(self, yes_prob: float) -> str:
+        """判定帯（確定YES "yes" / 確定NO "no" / 確率的 "random"）"""
+        if yes_prob >= self.yes_threshold:
+            return "yes"
+        if yes_prob <= self.no_threshold:
+            return "no"
+        return "random"
+
+    @staticmethod
+    def _softmax_pair(a: float, b: float) -> Tuple[float, float]:
+        """2値のsoftmax"""
+        m = max(a, b)
+        ea, eb = math.exp(a - m), math.exp(b - m)
+        return ea / (ea + eb), eb / (ea + eb)
+
     def reset(self):
-        """履歴リセット"""
-        self.conversation_history = []
\ No newline at end of file
+        """既定のセッションの履歴リセット（バックエンドのKVキャッシュも破棄）"""
+        self.default_session.reset()
\ No newline at end of file
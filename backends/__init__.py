@@ -0,0 +1,22 @@
+from backends.base import DialogueBackend, GenerationCancelled, StopRule
+
+
+def create_backend(kind: str = "hf", /, **options) -> DialogueBackend:
+    """
+    名前からバックエンドを生成する（"hf" / "onnx" / "mock" / "process"）。
+    "process" は options の kind で指定したバックエンドを子プロセスで動かす。
+    重い依存を避けるため、各実装は必要になった時点でimportする。
+    """
+    if kind == "hf":
+        from backends.hf_phi2 import HFPhi2Backend
+        return HFPhi2Backend(**options)
+    if kind == "onnx":
+        from backends.onnx import OnnxBackend
+        return OnnxBackend(**options)
+    if kind == "mock":
+        from backends.mock import MockBackend
+        return MockBackend(**options)
+    if kind == "process":
+        from backends.process import ProcessBackend
+        return ProcessBackend(**options)
+    raise ValueError(f"Unknown backend: {kind}")
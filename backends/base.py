@@ -0,0 +1,273 @@
+"""
+対話バックエンドの共通インターフェース
+シミュレーターはプロンプト（文字列と、任意でトークン化済みのID列）だけを渡し、
+モデルの読み込み・生成・分類はバックエンド側に閉じ込める
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import CancelledError, Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# 実行中リクエストの中断フラグの登録簿（全バックエンド共通）を守るロック
+_tokens_lock = threading.Lock()
+
+
+def chain_future(future: Future, fn: Callable) -> Future:
+    """future の結果に fn を適用した新しい Future を返す"""
+    chained: Future = Future()
+
+    def done(f: Future):
+        try:
+            chained.set_result(fn(f.result()))
+        except Exception as e:
+            chained.set_exception(e)
+
+    future.add_done_callback(done)
+    return chained
+
+
+class StopRule(NamedTuple):
+    """
+    生成を打ち切る条件（_extract_phi2_response で捨てられる部分を生成しないため）。
+    判定は生成部分のテキストだけを見る。
+    """
+    newline: bool = True                 # 本文が始まった後の改行で停止
+    markers: Tuple[str, ...] = ("User:",)  # 次の話者の開始で停止
+    max_sentences: int = 2               # "." で終わる文がこの数に達したら停止（0で無効）
+    max_chars: int = 200                 # 本文がこの文字数を超えたら停止（0で無効）
+
+    def should_stop(self, text: str) -> bool:
+        line = text.lstrip()
+        if not line:
+            return False
+        if self.newline and "\n" in line:
+            return True
+        if any(marker in line for marker in self.markers):
+            return True
+        if self.max_sentences:
+            finished = line.split(".")[:-1]
+            if sum(1 for s in finished if s.strip()) >= self.max_sentences:
+                return True
+        return bool(self.max_chars) and len(line) > self.max_chars
+
+
+class GenerationCancelled(Exception):
+    """cancel() で中断された生成・分類（結果は返らない）"""
+
+
+class CancelToken:
+    """
+    実行中のリクエスト1件の中断フラグ。
+    バックエンドはデコードステップの間やモデルのロック取得後にこれを確認し、
+    立っていればそこで推論をやめて GenerationCancelled を送出する
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn()
+
+    def on_cancel(self, fn: Callable[[], None]):
+        """中断されたときに fn() を呼ぶ（中断済みなら即座に呼ぶ）"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def check(self):
+        """中断されていれば GenerationCancelled を送出する"""
+        if self._event.is_set():
+            raise GenerationCancelled("request cancelled")
+
+    def wait(self, future: Future):
+        """
+        Future の結果を待つ。中断されたらキュー待ちのリクエストを取り下げる
+        （実行が始まっていた場合は完了を待ってから GenerationCancelled）
+        """
+        self.on_cancel(future.cancel)
+        try:
+            result = future.result()
+        except CancelledError:
+            raise GenerationCancelled("request cancelled") from None
+        self.check()
+        return result
+
+
+class DialogueBackend(ABC):
+    """対話モデルバックエンドの基底クラス"""
+
+    name = "base"
+
+    # 推論イベントの送り先（telemetry.Telemetry）。Noneなら発行しない
+    telemetry = None
+
+    # 各メソッドの input_ids は prompt をトークン化済みのID列。
+    # 渡された場合はこちらをモデル入力に使い、prompt はログ等の参照用になる。
+    # stop を渡すと、生成テキストが条件を満たした時点でデコードを打ち切る。
+    # session は会話の識別子。KVキャッシュ等の会話単位の状態はこのキーごとに保持する。
+    # 実行中のリクエストは cancel(session) で中断でき、その場合は GenerationCancelled になる
+
+    @abstractmethod
+    def encode(self, text: str) -> List[int]:
+        """テキストをトークンID列にする（特殊トークンは付けない）"""
+
+    @abstractmethod
+    def generate(self, prompt: str, max_new_tokens: int, temperature: float,
+                 seed: Optional[int] = None,
+                 input_ids: Optional[Sequence[int]] = None,
+                 stop: Optional[StopRule] = None,
+                 session: Optional[str] = None) -> str:
+        """プロンプトに続く生成テキストを返す（プロンプト自体は含まない）"""
+
+    @abstractmethod
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float,
+               seed: Optional[int] = None,
+               input_ids: Optional[Sequence[int]] = None,
+               stop: Optional[StopRule] = None,
+               session: Optional[str] = None) -> Iterator[str]:
+        """generate と同じ生成を、デコードされた順にテキスト断片としてyieldする"""
+
+    @abstractmethod
+    def classify(self, prompt: str, labels: Sequence[str],
+                 input_ids: Optional[Sequence[int]] = None,
+                 session: Optional[str] = None) -> List[float]:
+        """プロンプト直後の次トークンとして、各ラベルの先頭トークンのロジットを返す"""
+
+    def hidden_state(self, prompt: str,
+                     input_ids: Optional[Sequence[int]] = None,
+                     session: Optional[str] = None) -> List[float]:
+        """プロンプト末尾トークンの最終層の隠れ状態（学習済み判定ヘッドの入力）"""
+        raise NotImplementedError(f"{self.name} backend does not expose hidden states")
+
+    def submit(self, prompt: str, max_new_tokens: int, temperature: float,
+               seed: Optional[int] = None,
+               input_ids: Optional[Sequence[int]] = None,
+               stop: Optional[StopRule] = None,
+               session: Optional[str] = None) -> Future:
+        """generate の非同期版。既定では同期実行して完了済みのFutureを返す"""
+        future: Future = Future()
+        try:
+            future.set_result(self.generate(prompt, max_new_tokens, temperature,
+                                            seed, input_ids, stop, session))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def cache_tag(self) -> Dict:
+        """応答キャッシュのキーに含める、出力に影響する設定"""
+        return {'backend': self.name}
+
+    def reset(self, session: Optional[str] = None):
+        """会話 session について保持している状態（KVキャッシュ等）を破棄する"""
+        pass
+
+    def cancel(self, session: Optional[str] = None):
+        """
+        会話 session の実行中のリクエストを中断させる（次のデコードステップで止まる）。
+        中断後に送られたリクエストは通常どおり実行される
+        """
+        with _tokens_lock:
+            tokens = list(self.__dict__.get('_active_tokens', {}).get(session, ()))
+        for token in tokens:
+            token.cancel()
+
+    @contextmanager
+    def _cancellable(self, session: Optional[str]) -> Iterator[CancelToken]:
+        """リクエスト1件の中断フラグを作り、終わるまで cancel(session) の対象にする"""
+        token = self._register(session)
+        try:
+            yield token
+        finally:
+            self._release(session, token)
+
+    def _track(self, future: Future, session: Optional[str]) -> Future:
+        """
+        キューに積んだリクエストの Future を、完了するまで実行中として数え cancel(session) の対象にする。
+        取り下げられた場合（ワーカーの停止を含む）は GenerationCancelled で失敗する Future を返す
+        """
+        token = self._register(session)
+        token.on_cancel(future.cancel)
+        tracked: Future = Future()
+
+        def done(f: Future):
+            self._release(session, token)
+            if f.cancelled():
+                tracked.set_exception(GenerationCancelled("request cancelled"))
+            elif f.exception() is not None:
+                tracked.set_exception(f.exception())
+            else:
+                tracked.set_result(f.result())
+
+        future.add_done_callback(done)
+        return tracked
+
+    def _register(self, session: Optional[str]) -> CancelToken:
+        token = CancelToken()
+        with _tokens_lock:
+            active = self.__dict__.setdefault('_active_tokens', {})
+            active.setdefault(session, set()).add(token)
+        return token
+
+    def _release(self, session: Optional[str], token: CancelToken):
+        with _tokens_lock:
+            active = self.__dict__['_active_tokens']
+            tokens = active[session]
+            tokens.discard(token)
+            if not tokens:
+                del active[session]
+
+    def load(self) -> float:
+        """unload したモデルを読み込み直す。かかった秒数を返す（読み込み済みなら0）"""
+        return 0.0
+
+    def unload(self) -> Dict:
+        """
+        モデルをメモリから降ろす（次の推論か load() で読み込み直す）。
+        降ろしたものの説明を返す。降ろせるものが無い・推論中なら空
+        """
+        return {}
+
+    def is_loaded(self) -> bool:
+        """モデルがメモリ上にあるか（unload 後、読み込み直す前はFalse）"""
+        return True
+
+    def trim(self) -> int:
+        """再計算できる会話単位の状態（KVキャッシュ等）を全会話分破棄し、その件数を返す"""
+        return 0
+
+    def _in_flight(self) -> int:
+        """実行中（_cancellable で登録中）のリクエスト数"""
+        with _tokens_lock:
+            return sum(len(tokens) for tokens in self.__dict__.get('_active_tokens', {}).values())
+
+    def _emit(self, kind: str, **fields):
+        """テレメトリが設定されていればイベントを発行する"""
+        if self.telemetry is not None:
+            self.telemetry.emit(kind, backend=self.name, **fields)
+
+    @staticmethod
+    def _timing_fields(prefill_s: float, decode_s: float, generated: int) -> Dict:
+        """prefill / decode の時間から generate イベントの速度項目を作る"""
+        decode_tokens = max(0, generated - 1)  # 最初のトークンはprefillの直後に出る
+        return {
+            'prefill_s': prefill_s,
+            'decode_s': decode_s,
+            'decode_s_per_token': decode_s / decode_tokens if decode_tokens else None,
+            'tokens_per_s': decode_tokens / decode_s if decode_s > 0 else None,
+        }
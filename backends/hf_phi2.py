@@ -0,0 +1,664 @@
+"""
+Hugging Face transformers による Phi-2 バックエンド
+KVキャッシュ再利用・バッチ推論ワーカー・CPU int8 量子化・アイドル時のモデル退避に対応
+"""
+
+import ctypes
+import gc
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import torch
+
+try:
+    from transformers import (AutoTokenizer, AutoModelForCausalLM, LogitsProcessor,
+                              LogitsProcessorList, StoppingCriteriaList,
+                              TextIteratorStreamer)
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+    print("Error: pip install transformers torch")
+
+from backends.base import CancelToken, DialogueBackend, StopRule
+from backends.stopping import CancelCriteria, StopRuleCriteria
+from inference_worker import InferenceWorker
+
+
+class _StepTimer(LogitsProcessor if TRANSFORMERS_AVAILABLE else object):
+    """
+    ロジットを変更せず、各デコードステップの時刻だけを記録する。
+    最初の呼び出しはprefillのforward直後なので、prefill / decode の内訳が分かる
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.steps: List[float] = []
+
+    def __call__(self, input_ids, scores):
+        self.steps.append(time.perf_counter())
+        return scores
+
+    def fields(self, generated: int) -> Dict:
+        end = time.perf_counter()
+        first = self.steps[0] if self.steps else end
+        return DialogueBackend._timing_fields(first - self.start, end - first, generated)
+
+
+class HFPhi2Backend(DialogueBackend):
+    """transformers の AutoModelForCausalLM で Phi-2 を動かすバックエンド"""
+
+    name = "hf"
+
+    def __init__(self, model_name: str = "microsoft/phi-2", use_gpu: bool = True,
+                 use_kv_cache: bool = True, batch_size: int = 1,
+                 batch_wait_ms: float = 20.0, quantize: Optional[str] = None,
+                 snapshot_dir: Optional[str] = None,
+                 draft_model: Optional[str] = None,
+                 kv_sessions: int = 4):
+        """
+        Args:
+            model_name: 読み込むモデル（Hugging Face のIDまたはローカルパス）
+            use_gpu: CUDAが使える場合はGPUで推論する
+            use_kv_cache: 会話ごとにpast_key_valuesを保持し、新しいターンの
+                差分トークンだけをprefillする
+            batch_size: 2以上なら InferenceWorker を起動し、複数スレッドからの
+                generate / 分類リクエストをこの件数までまとめてバッチ推論する
+            batch_wait_ms: バッチが埋まるまで後続リクエストを待つ最大時間
+            quantize: CPU推論時の量子化モード。"int8" で全Linear層を
+                動的int8量子化する（GPU時は無視）。Noneならfloat32のまま
+            snapshot_dir: safetensors形式のローカルスナップショットの保存先。
+                model_name から作ったものがあればここからメモリマップで読み込み（ウォームスタート）、
+                無い・別のモデルのものなら読み込み後にここへ書き出す
+            draft_model: 補助デコード（speculative decoding）用の小さな因果LM。
+                下書きモデルが数トークンずつ候補を出し、本体は1回のforwardでまとめて検証する。
+                トークナイザが異なるモデルも指定できる（テキスト経由で候補を変換）
+            kv_sessions: KVキャッシュを保持する会話（session）の最大数。
+                超えた分は最後に使われたのが古いものから破棄する
+        """
+        if not TRANSFORMERS_AVAILABLE:
+            raise ImportError("transformers required")
+
+        self.model_name = model_name
+        self.snapshot_dir = snapshot_dir
+        self.device = "cuda" if use_gpu and torch.cuda.is_available() else "cpu"
+
+        # CPU量子化（load のたびに適用する）
+        self.quantize = None
+        if quantize and self.device != "cpu":
+            print(f"Quantize mode '{quantize}' is CPU-only; ignored on {self.device}")
+        elif quantize:
+            self.quantize = quantize
+
+        self.draft_model_name = draft_model
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+
+        # 会話ごとのKVキャッシュ（session -> (直前の入力+生成トークン列, past_key_values)）
+        self.use_kv_cache = use_kv_cache
+        self.kv_sessions = max(1, kv_sessions)
+        self._kv: "OrderedDict[Optional[str], tuple]" = OrderedDict()
+        # _kv の出し入れの排他。reset / trim は UI・監視・受信スレッドから推論と並行して呼ばれる
+        # （_model_lock は生成の間ずっと保持されるため、そちらを待つと画面が止まる）
+        self._kv_lock = threading.Lock()
+
+        # 分類ラベルの先頭トークンID（ラベルごとに1回だけトークン化）
+        self._label_ids: Dict[str, int] = {}
+        self._model_lock = threading.Lock()
+        # 読み込み・退避の排他（推論の入口での読み込み直しと MemoryManager からの操作）
+        self._load_lock = threading.Lock()
+
+        # 生成時のサンプリング設定（temperature と最大トークン数は呼び出しごと）
+        self.top_p = 0.85
+        self.top_k = 30
+        self.repetition_penalty = 1.3
+
+        self.model = None
+        self.draft_model = None
+        self.draft_tokenizer = None
+        self.worker = None
+        self.load()
+
+    # ---------- 読み込み・退避 ----------
+
+    def load(self) -> float:
+        """モデルを読み込む（退避後の読み込み直しにも使う）。読み込み済みなら0を返す"""
+        with self._load_lock:
+            if self.model is not None:
+                return 0.0
+            t0 = time.perf_counter()
+            self._load_weights()
+            seconds = time.perf_counter() - t0
+        self._emit("load", load_s=seconds, warm=self.warm_start)
+        return seconds
+
+    def _load_weights(self):
+        """本体・下書きモデルの読み込み、量子化、バッチ推論ワーカーの起動（_load_lock 保持中に呼ぶ）"""
+        # 読み込み時間の計測（ウォーム = ローカルスナップショットから）
+        self.warm_start = self._has_snapshot()
+        source = self.snapshot_dir if self.warm_start else self.model_name
+        print(f"Loading {source} on {self.device}...")
+        t0 = time.perf_counter()
+        self.tokenizer, model = self._load_model()
+        self.load_seconds = time.perf_counter() - t0
+        print(f"✓ {'Warm' if self.warm_start else 'Cold'} load took {self.load_seconds:.1f}s")
+
+        if self.snapshot_dir and not self.warm_start:
+            self._save_snapshot(model)
+
+        if self.quantize:
+            model = self._quantize_model(model, self.quantize)
+            print(f"✓ Quantized linear layers ({self.quantize})")
+
+        # 補助デコード用の下書きモデル（本体と同じ量子化を適用）
+        if self.draft_model_name:
+            self.draft_tokenizer, draft = self._load_draft_model(self.draft_model_name)
+            if self.quantize:
+                draft = self._quantize_model(draft, self.quantize)
+            self.draft_model = draft
+            print(f"✓ Draft model loaded ({self.draft_model_name})")
+
+        # パディングトークン設定
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        print("✓ Model loaded successfully")
+
+        # バッチ推論ワーカー（batch_size > 1 のときのみ）
+        if self.batch_size > 1:
+            self.worker = InferenceWorker(
+                model, self.tokenizer, self.device,
+                max_batch_size=self.batch_size, max_wait_ms=self.batch_wait_ms,
+                lock=self._model_lock)
+            print(f"✓ Batching worker started (max batch {self.batch_size}, "
+                  f"wait {self.batch_wait_ms}ms)")
+
+        # 最後に設定する（model が None でなければ推論可能）
+        self.model = model
+
+    def unload(self) -> Dict:
+        """
+        モデル・下書きモデル・KVキャッシュを破棄してメモリを返す（トークナイザは残す）。
+        次の推論か load() で読み込み直す。推論中のリクエストがあれば何もしない。
+        破棄したものの説明を返す（何もしなかった場合は空）
+        """
+        with self._load_lock:
+            if self.model is None or self._in_flight():
+                return {}
+            freed = {'model': self.model_name, 'draft_model': self.draft_model_name,
+                     'quantize': self.quantize, 'kv_sessions': len(self._kv)}
+            worker, self.worker = self.worker, None
+            if worker:
+                worker.shutdown()
+            with self._model_lock, self._kv_lock:
+                self.model = None
+                self.draft_model = None
+                self._kv.clear()
+        self._release_memory()
+        print(f"✓ Unloaded {self.model_name}")
+        self._emit("unload", **freed)
+        return freed
+
+    def is_loaded(self) -> bool:
+        return self.model is not None
+
+    def trim(self) -> int:
+        with self._kv_lock:
+            count = len(self._kv)
+            self._kv.clear()
+        return count
+
+    def _ensure_loaded(self):
+        """
+        退避中なら読み込み直す（推論の入口で、実行中として登録した後に呼ぶ）。
+        実行中の退避と重ならないよう常に _load_lock を通す（登録後は unload されない）
+        """
+        self.load()
+
+    def _release_memory(self):
+        """解放したテンソルのメモリをOSに返す"""
+        gc.collect()
+        if self.device == "cuda":
+            torch.cuda.empty_cache()
+        try:
+            # glibc は解放済みのヒープを保持し続けるため、RSSに反映させるには明示的に返す
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+    def _load_model(self):
+        """トークナイザとモデルを読み込む"""
+        # safetensorsはファイルをメモリマップして必要な重みだけ読み込むため、
+        # ローカルスナップショットからの読み込みはハブ経由より大幅に速い
+        source = self.snapshot_dir if self.warm_start else self.model_name
+        tokenizer = AutoTokenizer.from_pretrained(
+            source,
+            trust_remote_code=True
+        )
+        model = AutoModelForCausalLM.from_pretrained(
+            source,
+            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+            device_map=self.device,
+            trust_remote_code=True,
+            low_cpu_mem_usage=True,
+            use_safetensors=True if self.warm_start else None
+        )
+        return tokenizer, model
+
+    def _load_draft_model(self, name: str):
+        """補助デコード用の下書きモデルを読み込む。本体と語彙が同じならトークナイザは共有"""
+        tokenizer = AutoTokenizer.from_pretrained(name, trust_remote_code=True)
+        if tokenizer.get_vocab() == self.tokenizer.get_vocab():
+            tokenizer = None
+        model = AutoModelForCausalLM.from_pretrained(
+            name,
+            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+            device_map=self.device,
+            trust_remote_code=True,
+            low_cpu_mem_usage=True
+        )
+        return tokenizer, model
+
+    # スナップショットの元のモデルを記録するファイル（重みの書き出しが終わってから作る）
+    SNAPSHOT_INFO = "snapshot.json"
+
+    def _has_snapshot(self) -> bool:
+        """snapshot_dir に model_name から作った読み込み可能なsafetensorsスナップショットがあるか"""
+        if not self.snapshot_dir:
+            return False
+        if not any(os.path.exists(os.path.join(self.snapshot_dir, f))
+                   for f in ("model.safetensors", "model.safetensors.index.json")):
+            return False
+        try:
+            with open(os.path.join(self.snapshot_dir, self.SNAPSHOT_INFO), encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            info = {}
+        if info.get('model') != self.model_name:
+            # 別のモデル（または記録の無い古い形式）のスナップショットは使わずに作り直す
+            print(f"Snapshot in {self.snapshot_dir} is not from {self.model_name}; re-creating it")
+            return False
+        return True
+
+    def _save_snapshot(self, model):
+        """読み込んだモデルをsafetensors形式でローカルに書き出す（量子化前）"""
+        info_path = os.path.join(self.snapshot_dir, self.SNAPSHOT_INFO)
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            # 書き出し途中で止まったスナップショットを使わないよう、先に記録を消す
+            if os.path.exists(info_path):
+                os.remove(info_path)
+            model.save_pretrained(self.snapshot_dir, safe_serialization=True)
+            self.tokenizer.save_pretrained(self.snapshot_dir)
+            with open(info_path, "w", encoding="utf-8") as f:
+                json.dump({'model': self.model_name,
+                           'revision': getattr(model.config, "_commit_hash", None)}, f)
+            print(f"✓ Saved local snapshot to {self.snapshot_dir}")
+        except OSError as e:
+            print(f"Could not save snapshot to {self.snapshot_dir}: {e}")
+
+    @staticmethod
+    def _quantize_model(model, mode: str):
+        """CPU向けにモデルを量子化する"""
+        if mode == "int8":
+            # 重みをint8で保持し、活性は実行時に動的量子化する
+            from torch.ao.quantization import quantize_dynamic
+            return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        raise ValueError(f"Unknown quantize mode: {mode}")
+
+    # ---------- DialogueBackend ----------
+
+    def encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def generate(self, prompt: str, max_new_tokens: int, temperature: float,
+                 seed: Optional[int] = None,
+                 input_ids: Optional[Sequence[int]] = None,
+                 stop: Optional[StopRule] = None,
+                 session: Optional[str] = None) -> str:
+        with self._cancellable(session) as cancel:
+            return self._generate_text(prompt, max_new_tokens, temperature,
+                                       seed=seed, input_ids=input_ids, stop=stop,
+                                       session=session, cancel=cancel)
+
+    def submit(self, prompt: str, max_new_tokens: int, temperature: float,
+               seed: Optional[int] = None,
+               input_ids: Optional[Sequence[int]] = None,
+               stop: Optional[StopRule] = None,
+               session: Optional[str] = None) -> Future:
+        with self._cancellable(session):
+            # 登録してから読み込みを確かめ、キューに積んだ後も完了まで実行中として数える（退避させない）
+            self._ensure_loaded()
+            # バッチのサンプリングには1件ごとのシードを効かせられないため、シード付きは直接経路
+            if self.worker and self.draft_model is None and seed is None:
+                return self._track(
+                    self._submit_batched(prompt, max_new_tokens, temperature, input_ids, stop),
+                    session)
+        return super().submit(prompt, max_new_tokens, temperature, seed,
+                              input_ids, stop, session)
+
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float,
+               seed: Optional[int] = None,
+               input_ids: Optional[Sequence[int]] = None,
+               stop: Optional[StopRule] = None,
+               session: Optional[str] = None) -> Iterator[str]:
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        error = []
+        # 中断フラグはスレッドの起動前に登録する（起動までに届いた cancel() を取りこぼさない）
+        cancel = self._register(session)
+
+        def run():
+            try:
+                self._generate_text(prompt, max_new_tokens, temperature,
+                                    streamer=streamer, seed=seed,
+                                    input_ids=input_ids, stop=stop,
+                                    session=session, cancel=cancel)
+            except Exception as e:
+                error.append(e)
+                streamer.end()
+            finally:
+                self._release(session, cancel)
+
+        worker = threading.Thread(target=run, daemon=True)
+        try:
+            worker.start()
+        except BaseException:
+            self._release(session, cancel)
+            raise
+
+        for chunk in streamer:
+            yield chunk
+
+        worker.join()
+        if error:
+            raise error[0]
+
+    def classify(self, prompt: str, labels: Sequence[str],
+                 input_ids: Optional[Sequence[int]] = None,
+                 session: Optional[str] = None) -> List[float]:
+        token_ids = [self._label_id(label) for label in labels]
+        with self._cancellable(session) as cancel:
+            return self._next_token_logits(prompt, token_ids, input_ids=input_ids,
+                                           session=session, cancel=cancel)
+
+    def hidden_state(self, prompt: str,
+                     input_ids: Optional[Sequence[int]] = None,
+                     session: Optional[str] = None) -> List[float]:
+        t0 = time.perf_counter()
+        with self._cancellable(session) as cancel:
+            self._ensure_loaded()
+            if self.worker:
+                hidden = cancel.wait(self.worker.submit_hidden(prompt, input_ids=input_ids))
+                self._emit("hidden_state",
+                           prompt_tokens=len(input_ids) if input_ids is not None else None,
+                           reused_tokens=0, hidden_s=time.perf_counter() - t0, batched=True)
+                return hidden
+
+            outputs, prompt_tokens, cached_len = self._prefill(
+                prompt, input_ids, session, cancel, output_hidden_states=True)
+        hidden = outputs.hidden_states[-1][0, -1].float().tolist()
+        self._emit("hidden_state", prompt_tokens=prompt_tokens, reused_tokens=cached_len,
+                   hidden_s=time.perf_counter() - t0, batched=False)
+        return hidden
+
+    def _label_id(self, label: str) -> int:
+        token_id = self._label_ids.get(label)
+        if token_id is None:
+            token_id = self._label_ids[label] = self.encode(label)[0]
+        return token_id
+
+    def cache_tag(self) -> Dict:
+        return {
+            'backend': self.name,
+            'model': self.model_name,
+            'quantize': self.quantize,
+            'draft_model': self.draft_model_name,
+            'top_p': self.top_p,
+            'top_k': self.top_k,
+            'repetition_penalty': self.repetition_penalty,
+        }
+
+    def reset(self, session: Optional[str] = None):
+        """会話 session のKVキャッシュを破棄（生成中でも待たない。使用中のキャッシュは生成側が持つ）"""
+        with self._kv_lock:
+            self._kv.pop(session, None)
+
+    # ---------- 推論 ----------
+
+    def _generate_text(self, prompt: str, max_tokens: int, temp: float,
+                       streamer=None, seed: Optional[int] = None,
+                       input_ids: Optional[Sequence[int]] = None,
+                       stop: Optional[StopRule] = None,
+                       session: Optional[str] = None,
+                       cancel: Optional[CancelToken] = None) -> str:
+        """
+        プロンプトに続けて生成し、生成部分だけをデコードして返す。
+        cancel が立つと次のデコードステップで止め、GenerationCancelled を送出する
+        """
+        cancel = cancel or CancelToken()
+        self._ensure_loaded()
+        if self.worker and streamer is None and self.draft_model is None and seed is None:
+            # バッチ経路（KVキャッシュは使わない。補助デコード・シード付きはバッチ非対応のため直接経路）。
+            # 中断はキュー待ちの間だけ効く（実行中のバッチは他のリクエストと共有のため止めない）
+            return cancel.wait(
+                self._submit_batched(prompt, max_tokens, temp, input_ids, stop))
+
+        inputs = self._encode_prompt(prompt, input_ids)
+        prompt_len = inputs["input_ids"].shape[1]
+        stopping = StoppingCriteriaList([CancelCriteria(cancel)])
+        if stop is not None:
+            stopping.append(StopRuleCriteria(self.tokenizer, prompt_len, stop))
+        timer = _StepTimer() if self.telemetry is not None else None
+        processors = LogitsProcessorList([timer]) if timer else None
+        reused = 0
+
+        # モデルと乱数状態を共有するため、直接経路の推論は1件ずつ（シードもロック内で設定）
+        with self._model_lock, torch.no_grad():
+            cancel.check()  # ロック待ちの間に中断されたものは実行しない
+            if seed is not None:
+                torch.manual_seed(seed)
+            if self.draft_model is not None:
+                # 補助デコードは下書きモデル側のキャッシュと揃える必要があるため、
+                # 会話のKVキャッシュは使わず、更新もしない
+                outputs = self.model.generate(
+                    **inputs,
+                    streamer=streamer,
+                    stopping_criteria=stopping,
+                    logits_processor=processors,
+                    use_cache=True,
+                    return_dict_in_generate=True,
+                    **self._sampling_kwargs(max_tokens, temp),
+                    **self._assist_kwargs()
+                )
+            else:
+                past_key_values = self._reuse_kv_cache(inputs["input_ids"], session)
+                if past_key_values is not None:
+                    reused = past_key_values.get_seq_length()
+
+                outputs = self.model.generate(
+                    **inputs,
+                    past_key_values=past_key_values,
+                    streamer=streamer,
+                    stopping_criteria=stopping,
+                    logits_processor=processors,
+                    use_cache=True,
+                    return_dict_in_generate=True,
+                    **self._sampling_kwargs(max_tokens, temp)
+                )
+
+                if cancel.cancelled:
+                    # 途中で止めた会話のキャッシュは次のターンで使われないため残さない
+                    with self._kv_lock:
+                        self._kv.pop(session, None)
+                else:
+                    self._store_kv_cache(session, outputs.sequences, outputs.past_key_values)
+
+        cancel.check()
+        generated = outputs.sequences.shape[1] - prompt_len
+        if timer:
+            self._emit("generate", prompt_tokens=prompt_len, reused_tokens=reused,
+                       generated_tokens=generated, total_s=time.perf_counter() - timer.start,
+                       batched=False, streamed=streamer is not None,
+                       assisted=self.draft_model is not None,
+                       **timer.fields(generated))
+
+        return self.tokenizer.decode(outputs.sequences[0, prompt_len:],
+                                     skip_special_tokens=True)
+
+    def _submit_batched(self, prompt: str, max_tokens: int, temp: float,
+                        input_ids: Optional[Sequence[int]],
+                        stop: Optional[StopRule]) -> Future:
+        """バッチ推論ワーカーに生成を依頼する（prefill / decode の内訳は取れない）"""
+        t0 = time.perf_counter()
+        future = self.worker.submit_generate(
+            prompt, input_ids=input_ids, stop=stop,
+            **self._sampling_kwargs(max_tokens, temp))
+
+        if self.telemetry is not None:
+            def done(f: Future):
+                if f.exception() is None:
+                    self._emit("generate",
+                               prompt_tokens=len(input_ids) if input_ids is not None else None,
+                               reused_tokens=0, generated_tokens=len(self.encode(f.result())),
+                               total_s=time.perf_counter() - t0, batched=True)
+            future.add_done_callback(done)
+        return future
+
+    def _encode_prompt(self, prompt: str,
+                       input_ids: Optional[Sequence[int]] = None) -> Dict:
+        """モデル入力を作る（トークン化済みならそのまま、無ければ512トークンで切り詰め）"""
+        if input_ids is not None:
+            ids = torch.tensor([list(input_ids)], dtype=torch.long, device=self.device)
+            return {"input_ids": ids, "attention_mask": torch.ones_like(ids)}
+        return self.tokenizer(
+            prompt,
+            return_tensors="pt",
+            truncation=True,
+            max_length=512
+        ).to(self.device)
+
+    def _sampling_kwargs(self, max_tokens: int, temp: float) -> Dict:
+        """応答生成で共通のサンプリング設定"""
+        return dict(
+            max_new_tokens=max_tokens,
+            temperature=temp,
+            top_p=self.top_p,
+            top_k=self.top_k,
+            repetition_penalty=self.repetition_penalty,
+            do_sample=True,
+            pad_token_id=self.tokenizer.eos_token_id,
+            eos_token_id=self.tokenizer.eos_token_id
+        )
+
+    def _assist_kwargs(self) -> Dict:
+        """補助デコード用の generate 引数（下書きモデルが無ければ空）"""
+        if self.draft_model is None:
+            return {}
+        kwargs = dict(assistant_model=self.draft_model)
+        if self.draft_tokenizer is not None:
+            # 語彙が異なる場合はテキストを介して候補を本体のトークンに変換する
+            kwargs.update(tokenizer=self.tokenizer,
+                          assistant_tokenizer=self.draft_tokenizer)
+        return kwargs
+
+    def _next_token_logits(self, prompt: str, token_ids: Sequence[int],
+                           input_ids: Optional[Sequence[int]] = None,
+                           session: Optional[str] = None,
+                           cancel: Optional[CancelToken] = None) -> List[float]:
+        """プロンプト直後の次トークンについて、token_ids 各々のロジットを返す"""
+        t0 = time.perf_counter()
+        cancel = cancel or CancelToken()
+        self._ensure_loaded()
+        if self.worker:
+            logits = cancel.wait(self.worker.submit_logits(prompt, token_ids,
+                                                           input_ids=input_ids))
+            self._emit("classify",
+                       prompt_tokens=len(input_ids) if input_ids is not None else None,
+                       reused_tokens=0, classify_s=time.perf_counter() - t0, batched=True)
+            return logits
+
+        outputs, prompt_tokens, cached_len = self._prefill(prompt, input_ids, session, cancel)
+        next_token_logits = outputs.logits[:, -1, :]
+
+        logits = [next_token_logits[0, tid].item() for tid in token_ids]
+        self._emit("classify", prompt_tokens=prompt_tokens, reused_tokens=cached_len,
+                   classify_s=time.perf_counter() - t0, batched=False)
+        return logits
+
+    def _prefill(self, prompt: str, input_ids: Optional[Sequence[int]],
+                 session: Optional[str], cancel: Optional[CancelToken] = None,
+                 **forward_kwargs):
+        """
+        プロンプトを1回 forward する（生成はしない）。
+        会話のKVキャッシュと一致する先頭部分はスキップし、残りだけをprefillする。
+        (出力, プロンプトのトークン数, 再利用したトークン数) を返す。
+        cancel はロック取得時に確認する（1回の forward は途中で止めない）
+        """
+        inputs = self._encode_prompt(prompt, input_ids)
+        input_ids = inputs["input_ids"]
+
+        with self._model_lock, torch.no_grad():
+            if cancel is not None:
+                cancel.check()
+            past_key_values = self._reuse_kv_cache(input_ids, session)
+            cached_len = past_key_values.get_seq_length() if past_key_values is not None else 0
+
+            outputs = self.model(
+                input_ids=input_ids[:, cached_len:],
+                attention_mask=inputs["attention_mask"],
+                past_key_values=past_key_values,
+                use_cache=self.use_kv_cache,
+                **forward_kwargs
+            )
+
+            self._store_kv_cache(session, input_ids, outputs.past_key_values)
+
+        return outputs, input_ids.shape[1], cached_len
+
+    def _reuse_kv_cache(self, input_ids: torch.Tensor, session: Optional[str] = None):
+        """
+        会話 session の前回のKVキャッシュのうち、今回の入力と一致する先頭部分だけを残して返す。
+        一致部分が無ければNone（全体をprefillする）。_model_lock 保持中に呼ぶ
+        """
+        if not self.use_kv_cache:
+            return None
+        with self._kv_lock:
+            entry = self._kv.get(session)
+        if entry is None:
+            return None
+        cached_ids, cache = entry
+        if not hasattr(cache, "crop"):
+            return None
+
+        cached_ids = cached_ids[0]
+        new_ids = input_ids[0]
+        # 最後の1トークンは必ずprefillする（次トークンのロジットが必要）
+        n = min(cache.get_seq_length(), len(cached_ids), len(new_ids) - 1)
+        if n <= 0:
+            return None
+
+        mismatch = (cached_ids[:n] != new_ids[:n]).nonzero()
+        keep = mismatch[0].item() if len(mismatch) else n
+        if keep == 0:
+            with self._kv_lock:
+                self._kv.pop(session, None)
+            return None
+
+        if keep < cache.get_seq_length():
+            cache.crop(keep - cache.get_seq_length())
+        return cache
+
+    def _store_kv_cache(self, session: Optional[str], ids: torch.Tensor, cache):
+        """会話 session のKVキャッシュを保存する（上限を超えたら古い会話から破棄）"""
+        if not self.use_kv_cache:
+            return
+        with self._kv_lock:
+            self._kv[session] = (ids, cache)
+            self._kv.move_to_end(session)
+            while len(self._kv) > self.kv_sessions:
+                self._kv.popitem(last=False)
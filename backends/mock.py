@@ -0,0 +1,141 @@
+"""
+決定的なモックバックエンド
+モデルを読み込まずにゲームループやベンチマークを動かすためのもの。
+出力はプロンプトとシードのハッシュだけで決まり、遅延は設定で再現する
+"""
+
+import hashlib
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from backends.base import DialogueBackend, StopRule
+
+
+class MockBackend(DialogueBackend):
+    """プロンプトのハッシュから定型応答を返すバックエンド"""
+
+    name = "mock"
+
+    REPLIES = [
+        " a wandering blade for hire. I have fought in many battles. Gold and good company are all I ask.",
+        " happy to meet you, traveler. My skills are yours if your cause is just.",
+        " not sure about you yet. Prove that you can keep up with me.",
+        " honored that you asked. I would gladly join your party.",
+        " busy with my own quest. Perhaps another time.",
+        " looking for a strong party myself. Tell me where we are headed.",
+    ]
+
+    # 判定プロンプト中にあるとYES/NO寄りになる語
+    POSITIVE_WORDS = ("gladly", "honored", "happy", "join", "yours", "headed")
+    NEGATIVE_WORDS = ("not sure", "busy", "another time", "alone", "never")
+
+    # hidden_state の次元数
+    HIDDEN_SIZE = 64
+
+    def __init__(self, prefill_ms_per_token: float = 0.0,
+                 decode_ms_per_token: float = 0.0,
+                 classify_ms: float = 0.0):
+        """
+        Args:
+            prefill_ms_per_token: プロンプト1トークンあたりの擬似prefill時間
+            decode_ms_per_token: 生成1トークンあたりの擬似デコード時間
+            classify_ms: classify 1回あたりの擬似時間
+        """
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.decode_ms_per_token = decode_ms_per_token
+        self.classify_ms = classify_ms
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        """空白区切りの疑似トークン化（空白は直後の語に付ける）"""
+        return [(" " if i else "") + w for i, w in enumerate(text.split(" "))]
+
+    def _digest(self, prompt: str, seed: Optional[int]) -> int:
+        payload = f"{seed}\x00{prompt}".encode("utf-8")
+        return int.from_bytes(hashlib.sha256(payload).digest()[:8], "big")
+
+    def _reply(self, prompt: str, max_new_tokens: int,
+               seed: Optional[int]) -> List[str]:
+        reply = self.REPLIES[self._digest(prompt, seed) % len(self.REPLIES)]
+        return self._tokens(reply)[:max_new_tokens]
+
+    def _sleep_prefill(self, prompt: str):
+        if self.prefill_ms_per_token:
+            time.sleep(len(prompt.split()) * self.prefill_ms_per_token / 1000.0)
+
+    # ---------- DialogueBackend ----------
+
+    def encode(self, text: str) -> List[int]:
+        # 疑似トークンごとのハッシュ値をIDとする（生成・分類は prompt のみを見る）
+        return [self._digest(token, None) % 50000 for token in self._tokens(text)]
+
+    def generate(self, prompt: str, max_new_tokens: int, temperature: float,
+                 seed: Optional[int] = None,
+                 input_ids: Optional[Sequence[int]] = None,
+                 stop: Optional[StopRule] = None,
+                 session: Optional[str] = None) -> str:
+        return "".join(self.stream(prompt, max_new_tokens, temperature, seed,
+                                   stop=stop, session=session))
+
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float,
+               seed: Optional[int] = None,
+               input_ids: Optional[Sequence[int]] = None,
+               stop: Optional[StopRule] = None,
+               session: Optional[str] = None) -> Iterator[str]:
+        with self._cancellable(session) as cancel:
+            t0 = time.perf_counter()
+            self._sleep_prefill(prompt)
+            t_first = None
+            text = ""
+            generated = 0
+            for token in self._reply(prompt, max_new_tokens, seed):
+                if self.decode_ms_per_token:
+                    time.sleep(self.decode_ms_per_token / 1000.0)
+                cancel.check()
+                if t_first is None:
+                    t_first = time.perf_counter()
+                generated += 1
+                yield token
+                text += token
+                if stop and stop.should_stop(text):
+                    break
+
+        total = time.perf_counter() - t0
+        prefill = (t_first or time.perf_counter()) - t0
+        self._emit("generate", prompt_tokens=len(self._tokens(prompt)), reused_tokens=0,
+                   generated_tokens=generated, total_s=total, batched=False,
+                   **self._timing_fields(prefill, total - prefill, generated))
+
+    def classify(self, prompt: str, labels: Sequence[str],
+                 input_ids: Optional[Sequence[int]] = None,
+                 session: Optional[str] = None) -> List[float]:
+        t0 = time.perf_counter()
+        with self._cancellable(session) as cancel:
+            self._sleep_prefill(prompt)
+            if self.classify_ms:
+                time.sleep(self.classify_ms / 1000.0)
+            cancel.check()
+        self._emit("classify", prompt_tokens=len(self._tokens(prompt)), reused_tokens=0,
+                   classify_s=time.perf_counter() - t0, batched=False)
+
+        # 最初のラベルを肯定、それ以外を否定として、語の出現数でロジットを決める
+        text = prompt.lower()
+        score = (sum(text.count(w) for w in self.POSITIVE_WORDS)
+                 - sum(text.count(w) for w in self.NEGATIVE_WORDS))
+        jitter = (self._digest(prompt, None) % 1000) / 1000.0 - 0.5
+        return [score * 0.5 + jitter] + [0.0] * (len(labels) - 1)
+
+    def hidden_state(self, prompt: str,
+                     input_ids: Optional[Sequence[int]] = None,
+                     session: Optional[str] = None) -> List[float]:
+        # 肯定語・否定語の出現数と、語のハッシュによる疑似埋め込み（判定ヘッドの学習確認用）
+        text = prompt.lower()
+        features = [float(sum(text.count(w) for w in self.POSITIVE_WORDS)),
+                    float(sum(text.count(w) for w in self.NEGATIVE_WORDS))]
+        buckets = [0.0] * (self.HIDDEN_SIZE - len(features))
+        for token in self._tokens(text):
+            buckets[self._digest(token, None) % len(buckets)] += 1.0
+        return features + buckets
+
+    def cache_tag(self) -> Dict:
+        return {'backend': self.name}
@@ -0,0 +1,79 @@
+"""
+ONNX Runtime による Phi-2 バックエンド
+optimum の ORTModelForCausalLM を使い、生成・分類ロジックは HFPhi2Backend と共通
+"""
+
+import os
+from typing import Optional
+
+
+try:
+    from optimum.onnxruntime import ORTModelForCausalLM
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
+from transformers import AutoTokenizer
+
+from backends.hf_phi2 import HFPhi2Backend
+
+# エクスポートの既定の保存先（プロジェクトの models/onnx）
+DEFAULT_EXPORT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "onnx")
+
+
+class OnnxBackend(HFPhi2Backend):
+    """ONNX Runtime で推論するバックエンド（初回はONNXへエクスポート）"""
+
+    name = "onnx"
+
+    def __init__(self, model_name: str = "microsoft/phi-2", use_gpu: bool = True,
+                 export_dir: Optional[str] = None):
+        """
+        Args:
+            model_name: Hugging Face のID、またはエクスポート済みONNXのディレクトリ
+            use_gpu: CUDAExecutionProvider が使える場合はGPUで推論する
+            export_dir: エクスポートしたONNXモデルの保存先のルート（None なら models/onnx）。
+                モデルごとのサブディレクトリに保存し、次回以降はそこから読み込む
+        """
+        if not ORT_AVAILABLE:
+            raise ImportError("pip install optimum[onnxruntime]")
+
+        self.export_dir = os.path.join(export_dir or DEFAULT_EXPORT_DIR,
+                                       self._export_name(model_name))
+        # ORTのKVキャッシュは切り詰めできず、バッチ用の位置ID指定も非対応のため両方無効
+        super().__init__(model_name=model_name, use_gpu=use_gpu,
+                         use_kv_cache=False, batch_size=1)
+
+    def _load_model(self):
+        source = self.model_name
+        if self.export_dir and os.path.exists(os.path.join(self.export_dir, "model.onnx")):
+            source = self.export_dir
+        needs_export = not os.path.exists(os.path.join(source, "model.onnx"))
+
+        provider = "CUDAExecutionProvider" if self.device == "cuda" else "CPUExecutionProvider"
+        tokenizer = AutoTokenizer.from_pretrained(source, trust_remote_code=True)
+        model = ORTModelForCausalLM.from_pretrained(
+            source, export=needs_export, provider=provider, use_cache=True)
+
+        if needs_export:
+            model.save_pretrained(self.export_dir)
+            tokenizer.save_pretrained(self.export_dir)
+            print(f"✓ Exported ONNX model to {self.export_dir}")
+
+        return tokenizer, model
+
+    @staticmethod
+    def _export_name(model_name: str) -> str:
+        """モデルごとの保存先ディレクトリ名（"microsoft/phi-2" → "microsoft--phi-2"）"""
+        if os.path.isdir(model_name):
+            return os.path.basename(os.path.normpath(model_name))
+        return model_name.replace("/", "--")
+
+    def hidden_state(self, prompt, input_ids=None, session=None):
+        # ORTModelForCausalLM はロジットとKVキャッシュしか出力しない
+        raise NotImplementedError("OnnxBackend does not expose hidden states")
+
+    @staticmethod
+    def _quantize_model(model, mode: str):
+        raise ValueError("OnnxBackend does not support torch quantization")
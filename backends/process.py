@@ -0,0 +1,318 @@
+"""
+別プロセスで動くバックエンドのクライアント
+モデルの読み込み・トークン化・generate を子プロセスに移し、pygame のメインループと
+GILを取り合わないようにする。子プロセスが落ちた場合（例外終了・OOMでのkill）は
+待機中のリクエストをすべて BackendCrashed で失敗させる
+"""
+
+import itertools
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from backends.base import DialogueBackend, GenerationCancelled, StopRule
+
+
+class BackendError(RuntimeError):
+    """子プロセス内のバックエンドで発生した例外"""
+
+
+class BackendCrashed(BackendError):
+    """子プロセスが応答せずに終了した"""
+
+
+_STREAM_END = object()
+
+# 子プロセスから同じ型で送り直す例外（呼び出し側が型で区別するもの）。それ以外は BackendError
+_REMOTE_ERRORS = {cls.__name__: cls for cls in (GenerationCancelled, NotImplementedError)}
+
+
+def _serve(conn, kind: str, options: Dict):
+    """子プロセスのエントリポイント。リクエストごとにスレッドで処理して応答を返す"""
+    from backends import create_backend
+    from telemetry import Telemetry
+
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            conn.send(msg)
+
+    try:
+        backend = create_backend(kind, **options)
+    except Exception as e:
+        send(("error", 0, (type(e).__name__, str(e))))
+        return
+    send(("ready", 0, {'name': backend.name, 'cache_tag': backend.cache_tag()}))
+
+    class _PipeSink:
+        """子プロセスのイベントを親へ送るシンク"""
+
+        def write(self, event: Dict):
+            send(("event", 0, event))
+
+    backend.telemetry = Telemetry(_PipeSink())
+
+    def handle(req_id: int, method: str, args, kwargs):
+        try:
+            if method == "stream":
+                for chunk in backend.stream(*args, **kwargs):
+                    send(("chunk", req_id, chunk))
+                send(("done", req_id, None))
+            else:
+                send(("done", req_id, getattr(backend, method)(*args, **kwargs)))
+        except Exception as e:
+            send(("error", req_id, (type(e).__name__, str(e))))
+
+    while True:
+        try:
+            req_id, method, args, kwargs = conn.recv()
+        except EOFError:
+            return
+        if method == "shutdown":
+            return
+        if method in ("reset", "cancel"):
+            # 応答不要（UIスレッドから呼ばれるため待たせない）。
+            # cancel は処理中のリクエストのスレッドに届くよう受信ループで直接実行する
+            getattr(backend, method)(*args)
+            continue
+        threading.Thread(target=handle, args=(req_id, method, args, kwargs),
+                         daemon=True).start()
+
+
+class ProcessBackend(DialogueBackend):
+    """任意のバックエンドを子プロセスで動かし、パイプ越しに呼び出すプロキシ"""
+
+    def __init__(self, kind: str = "hf", start_timeout: Optional[float] = None,
+                 **options):
+        """
+        Args:
+            kind: 子プロセスで生成するバックエンド（create_backend の名前）
+            start_timeout: 子プロセスの読み込み完了を待つ最大秒数（Noneで無制限）
+            **options: バックエンドのコンストラクタ引数（pickle可能であること）
+        """
+        self.name = kind
+
+        # torch を読み込んだ親からのforkは危険なため、常にspawnで起動する
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child_conn, kind, options),
+                                   daemon=True, name=f"{kind}-backend")
+        self.process.start()
+        # 子側の端を閉じておくと、子の終了がEOFとして検出できる
+        child_conn.close()
+
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, object] = {}  # req_id -> Future / 断片用Queue
+        self._pending_lock = threading.Lock()
+        self.error: Optional[str] = None
+
+        # 読み込み完了（または失敗）を待つ
+        if not self._conn.poll(start_timeout):
+            self.close()
+            raise BackendCrashed(f"{kind} backend did not start in {start_timeout}s")
+        try:
+            status, _, payload = self._conn.recv()
+        except EOFError:
+            self.process.join(timeout=5)
+            raise BackendCrashed(self._exit_reason())
+        if status != "ready":
+            self.process.join(timeout=5)
+            raise self._remote_error(payload)
+
+        self.name = payload['name']
+        self._cache_tag = payload['cache_tag']
+        print(f"✓ {self.name} backend running in process {self.process.pid}")
+
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    # ---------- DialogueBackend ----------
+
+    def encode(self, text: str) -> List[int]:
+        return self._call("encode", text).result()
+
+    def generate(self, prompt: str, max_new_tokens: int, temperature: float,
+                 seed: Optional[int] = None,
+                 input_ids: Optional[Sequence[int]] = None,
+                 stop: Optional[StopRule] = None,
+                 session: Optional[str] = None) -> str:
+        return self.submit(prompt, max_new_tokens, temperature,
+                           seed, input_ids, stop, session).result()
+
+    def submit(self, prompt: str, max_new_tokens: int, temperature: float,
+               seed: Optional[int] = None,
+               input_ids: Optional[Sequence[int]] = None,
+               stop: Optional[StopRule] = None,
+               session: Optional[str] = None) -> Future:
+        return self._call("generate", prompt, max_new_tokens, temperature,
+                          seed=seed, input_ids=self._ids_list(input_ids), stop=stop,
+                          session=session)
+
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float,
+               seed: Optional[int] = None,
+               input_ids: Optional[Sequence[int]] = None,
+               stop: Optional[StopRule] = None,
+               session: Optional[str] = None) -> Iterator[str]:
+        chunks: queue.Queue = queue.Queue()
+        req_id = self._send("stream", (prompt, max_new_tokens, temperature),
+                            dict(seed=seed, input_ids=self._ids_list(input_ids),
+                                 stop=stop, session=session), chunks)
+        try:
+            while True:
+                item = chunks.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            with self._pending_lock:
+                self._pending.pop(req_id, None)
+
+    def classify(self, prompt: str, labels: Sequence[str],
+                 input_ids: Optional[Sequence[int]] = None,
+                 session: Optional[str] = None) -> List[float]:
+        return self._call("classify", prompt, list(labels),
+                          input_ids=self._ids_list(input_ids),
+                          session=session).result()
+
+    def hidden_state(self, prompt: str,
+                     input_ids: Optional[Sequence[int]] = None,
+                     session: Optional[str] = None) -> List[float]:
+        # 子プロセス側の未対応は NotImplementedError のまま返る（呼び出し側でフォールバックする）
+        return self._call("hidden_state", prompt, input_ids=self._ids_list(input_ids),
+                          session=session).result()
+
+    def cache_tag(self) -> Dict:
+        return self._cache_tag
+
+    def reset(self, session: Optional[str] = None):
+        if self.error is None:
+            self._send("reset", (session,), {}, None)
+
+    def load(self) -> float:
+        return self._call("load").result() if self.error is None else 0.0
+
+    def unload(self) -> Dict:
+        return self._call("unload").result() if self.error is None else {}
+
+    def is_loaded(self) -> bool:
+        return self._call("is_loaded").result() if self.error is None else False
+
+    def trim(self) -> int:
+        return self._call("trim").result() if self.error is None else 0
+
+    def cancel(self, session: Optional[str] = None):
+        # 中断されたリクエストは子プロセスから GenerationCancelled のエラーとして返る
+        if self.error is None:
+            self._send("cancel", (session,), {}, None)
+
+    def close(self):
+        """子プロセスを停止する"""
+        if self.process.is_alive():
+            try:
+                with self._send_lock:
+                    self._conn.send((0, "shutdown", (), {}))
+            except (OSError, ValueError):
+                pass
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+
+    @property
+    def alive(self) -> bool:
+        return self.error is None and self.process.is_alive()
+
+    # ---------- IPC ----------
+
+    @staticmethod
+    def _ids_list(input_ids: Optional[Sequence[int]]) -> Optional[List[int]]:
+        return list(input_ids) if input_ids is not None else None
+
+    def _call(self, method: str, *args, **kwargs) -> Future:
+        future: Future = Future()
+        self._send(method, args, kwargs, future)
+        return future
+
+    def _send(self, method: str, args, kwargs, waiter) -> int:
+        req_id = next(self._ids)
+        if self.error is not None:
+            self._fail(waiter, BackendCrashed(self.error))
+            return req_id
+        if waiter is not None:
+            with self._pending_lock:
+                self._pending[req_id] = waiter
+        try:
+            with self._send_lock:
+                self._conn.send((req_id, method, args, kwargs))
+        except (OSError, ValueError) as e:
+            with self._pending_lock:
+                self._pending.pop(req_id, None)
+            self._fail(waiter, BackendCrashed(f"{self.name} backend unreachable: {e}"))
+        return req_id
+
+    def _read_loop(self):
+        """子プロセスからの応答を振り分ける。パイプが閉じたらクラッシュとして扱う"""
+        while True:
+            try:
+                status, req_id, payload = self._conn.recv()
+            except (EOFError, OSError):
+                break
+
+            if status == "event":
+                if self.telemetry is not None:
+                    self.telemetry.forward(payload)
+                continue
+
+            with self._pending_lock:
+                waiter = self._pending.get(req_id)
+                if waiter is not None and status != "chunk":
+                    del self._pending[req_id]
+            if waiter is None:
+                continue  # 中断されたストリームの残り
+
+            if status == "chunk":
+                waiter.put(payload)
+            elif status == "done":
+                if isinstance(waiter, Future):
+                    waiter.set_result(payload)
+                else:
+                    waiter.put(_STREAM_END)
+            else:
+                self._fail(waiter, self._remote_error(payload))
+
+        self.process.join(timeout=5)
+        self.error = self._exit_reason()
+        print(f"Inference process stopped: {self.error}")
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for waiter in pending:
+            self._fail(waiter, BackendCrashed(self.error))
+
+    def _exit_reason(self) -> str:
+        code = self.process.exitcode
+        if code is not None and code < 0:
+            return f"{self.name} backend killed by signal {-code} (out of memory?)"
+        return f"{self.name} backend exited (code {code})"
+
+    @staticmethod
+    def _remote_error(payload) -> Exception:
+        """子プロセスの (例外クラス名, メッセージ) を例外にする（中断・未対応は同じ型に戻す）"""
+        name, message = payload
+        cls = _REMOTE_ERRORS.get(name)
+        if cls is not None:
+            return cls(message)
+        return BackendError(f"{name}: {message}")
+
+    @staticmethod
+    def _fail(waiter, error: Exception):
+        if isinstance(waiter, Future):
+            if not waiter.done():
+                waiter.set_exception(error)
+        elif waiter is not None:
+            waiter.put(error)
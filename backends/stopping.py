@@ -0,0 +1,44 @@
+"""
+StopRule と中断フラグを transformers の generate に渡すための StoppingCriteria
+"""
+
+from typing import List
+
+import torch
+from transformers import StoppingCriteria
+
+from backends.base import CancelToken, StopRule
+
+
+class StopRuleCriteria(StoppingCriteria):
+    """各ステップで生成部分をデコードし、StopRule を満たした系列を止める"""
+
+    def __init__(self, tokenizer, prompt_len: int, rule: StopRule):
+        """
+        Args:
+            tokenizer: デコードに使うトークナイザ
+            prompt_len: 入力（パディング込み）のトークン数。これ以降を生成部分とみなす
+            rule: 停止条件
+        """
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.rule = rule
+
+    def __call__(self, input_ids: torch.LongTensor, scores, **kwargs) -> torch.BoolTensor:
+        done: List[bool] = [
+            self.rule.should_stop(self.tokenizer.decode(
+                seq[self.prompt_len:], skip_special_tokens=True))
+            for seq in input_ids
+        ]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class CancelCriteria(StoppingCriteria):
+    """中断フラグが立ったら、次のデコードステップで全系列を止める"""
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def __call__(self, input_ids: torch.LongTensor, scores, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.token.cancelled,
+                          dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,177 @@
+"""
+勧誘パイプラインのベンチマーク
+シード固定のシナリオ（キャラクター生成 → 挨拶 → 会話ターン → 仲間判定）を流し、
+初回トークンまでの時間・トークン速度・ターンごとのレイテンシ・判定時間・
+ピークメモリをJSONで出力する（実行間でdiffできるようキーは固定）
+
+使い方:
+    python -m benchmarks.dialogue --scenarios 5
+    python -m benchmarks.dialogue --backend mock --mock-decode-ms 20   # オフライン
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import resource
+import time
+from typing import Dict, List
+
+from Phi2DialogueSimulatour import Phi2DialogueSimulator
+from dialogue_session import DialogueSession
+from backends import create_backend
+from benchmarks.quantization import USER_LINES
+
+# 酒場の最初の呼びかけ（TavernScreen.GREETING_MSG と同じ）
+GREETING = ("Hello! I'm looking for companions. "
+            "Can you tell me about yourself and your abilities?")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """線形補間のパーセンタイル（q は 0〜100）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def _timed_reply(session: DialogueSession, text: str,
+                 is_first_greeting: bool, seed: int) -> Dict:
+    """1ターン分の応答をストリーミングで受け取り、時間とトークン数を測る"""
+    sim = session.simulator
+    t0 = time.perf_counter()
+    ttft = None
+    raw = ""
+    for chunk in session.stream_response(text, is_first_greeting=is_first_greeting,
+                                         seed=seed):
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+        raw += chunk
+    total = time.perf_counter() - t0
+
+    return {
+        'ttft_s': ttft if ttft is not None else total,
+        'total_s': total,
+        'tokens': len(sim.backend.encode(raw)) if raw else 0,
+        'reply': sim._extract_phi2_response(raw, "", session.character['name']),
+    }
+
+
+def run_scenarios(sim: Phi2DialogueSimulator, scenarios: int, turns: int,
+                  seed: int) -> Dict:
+    rng = random.Random(seed)
+    greetings, follow_ups, classify_s, create_s = [], [], [], []
+
+    for i in range(scenarios):
+        # 判定の乱数もシナリオごとに固定
+        random.seed(seed * 1000 + i)
+
+        t0 = time.perf_counter()
+        session = sim.new_session(sim.create_random_character(rng))
+        create_s.append(time.perf_counter() - t0)
+
+        turn = _timed_reply(session, GREETING, True, seed=rng.randrange(2**31))
+        greetings.append(turn)
+        session.add_turn(GREETING, turn['reply'])
+
+        for _ in range(turns):
+            user = rng.choice(USER_LINES)
+            turn = _timed_reply(session, user, False, seed=rng.randrange(2**31))
+            follow_ups.append(turn)
+            session.add_turn(user, turn['reply'])
+
+        t0 = time.perf_counter()
+        session.classify()
+        classify_s.append(time.perf_counter() - t0)
+        session.reset()
+
+    def summary(rows: List[Dict]) -> Dict:
+        tokens = sum(r['tokens'] for r in rows)
+        total = sum(r['total_s'] for r in rows)
+        decode = sum(r['total_s'] - r['ttft_s'] for r in rows)
+        latencies = [r['total_s'] for r in rows]
+        ttfts = [r['ttft_s'] for r in rows]
+        return {
+            'count': len(rows),
+            'ttft_p50_s': _percentile(ttfts, 50),
+            'ttft_p95_s': _percentile(ttfts, 95),
+            'latency_p50_s': _percentile(latencies, 50),
+            'latency_p95_s': _percentile(latencies, 95),
+            'tokens': tokens,
+            'tokens_per_s': tokens / total if total else 0.0,
+            # 初回トークン以降のデコード速度
+            'decode_tokens_per_s': (tokens - len(rows)) / decode if decode > 0 else 0.0,
+        }
+
+    return {
+        'greeting': summary(greetings),
+        'follow_up': summary(follow_ups),
+        'all_turns': summary(greetings + follow_ups),
+        'classify_p50_s': _percentile(classify_s, 50),
+        'classify_p95_s': _percentile(classify_s, 95),
+        'create_character_p50_s': _percentile(create_s, 50),
+    }
+
+
+def _make_backend(args):
+    if args.backend == "mock":
+        return create_backend("mock", prefill_ms_per_token=args.mock_prefill_ms,
+                              decode_ms_per_token=args.mock_decode_ms,
+                              classify_ms=args.mock_classify_ms)
+    options = dict(model_name=args.model, use_gpu=args.gpu)
+    if args.backend == "hf":
+        quantize = None if args.quantize == "none" else args.quantize
+        options.update(quantize=quantize, draft_model=args.draft)
+    return create_backend(args.backend, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recruitment dialogue benchmark")
+    parser.add_argument("--backend", default="hf", choices=["hf", "onnx", "mock"])
+    parser.add_argument("--model", default="microsoft/phi-2",
+                        help="Hugging Face id or local path (e.g. a tiny test model)")
+    parser.add_argument("--gpu", action="store_true")
+    parser.add_argument("--quantize", default="none")
+    parser.add_argument("--draft", default=None, help="draft model for assisted decoding")
+    parser.add_argument("--scenarios", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=2,
+                        help="follow-up turns after the greeting")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mock-prefill-ms", type=float, default=0.0)
+    parser.add_argument("--mock-decode-ms", type=float, default=0.0)
+    parser.add_argument("--mock-classify-ms", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    # シミュレーターのprint出力はJSONに混ざらないよう捨てる
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        sim = Phi2DialogueSimulator(backend=_make_backend(args))
+        load_s = time.perf_counter() - t0
+        results = run_scenarios(sim, args.scenarios, args.turns, args.seed)
+
+    report = {
+        'backend': args.backend,
+        'model': args.model if args.backend != "mock" else None,
+        'quantize': args.quantize,
+        'draft': args.draft,
+        'scenarios': args.scenarios,
+        'turns': args.turns,
+        'seed': args.seed,
+        'load_s': load_s,
+        **results,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
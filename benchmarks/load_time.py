@@ -0,0 +1,97 @@
+"""
+モデル読み込み時間ベンチマーク
+ハブ（またはHFキャッシュ）からのコールド読み込みと、
+safetensorsスナップショットからのウォーム読み込みを別プロセスで計測する
+
+使い方:
+    python -m benchmarks.load_time --runs 3
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from backends.hf_phi2 import HFPhi2Backend
+
+
+def run_load(model_name: str, snapshot_dir: str) -> Dict:
+    """1回分の読み込みを計測する（子プロセス内で実行）"""
+    t0 = time.perf_counter()
+    backend = HFPhi2Backend(model_name=model_name, use_gpu=False,
+                            snapshot_dir=snapshot_dir)
+    total_s = time.perf_counter() - t0
+    return {
+        'warm': backend.warm_start,
+        'load_s': backend.load_seconds,
+        'total_s': total_s,  # スナップショット書き出しを含む
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _run_in_subprocess(args, snapshot_dir: str) -> Dict:
+    cmd = [sys.executable, "-m", "benchmarks.load_time", "--variant",
+           "--model", args.model, "--snapshot-dir", snapshot_dir]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    # バックエンドのprint出力の後、最終行にJSONが出る
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phi-2 cold/warm load benchmark")
+    parser.add_argument("--model", default="microsoft/phi-2")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="number of warm loads to average")
+    parser.add_argument("--snapshot-dir", default=None,
+                        help="snapshot directory (default: a temporary one)")
+    parser.add_argument("--variant", action="store_true",
+                        help=argparse.SUPPRESS)  # 子プロセス用
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_load(args.model, args.snapshot_dir)))
+        return
+
+    tmp_dir = None
+    snapshot_dir = args.snapshot_dir
+    if snapshot_dir is None:
+        tmp_dir = tempfile.mkdtemp(prefix="phi2-snapshot-")
+        snapshot_dir = os.path.join(tmp_dir, "snapshot")
+
+    try:
+        # 既存のスナップショットを指定した場合は1回目もウォーム読み込みになる（first_load.warm で判別）
+        cold = _run_in_subprocess(args, snapshot_dir)
+        warm = [_run_in_subprocess(args, snapshot_dir) for _ in range(args.runs)]
+        warm_load = [w['load_s'] for w in warm]
+
+        report = {
+            'model': args.model,
+            'first_load': cold,
+            'warm_load_s': warm_load,
+            'warm_load_mean_s': sum(warm_load) / max(1, len(warm_load)),
+            'warm_peak_rss_mb': max((w['peak_rss_mb'] for w in warm), default=0.0),
+            'snapshot_mb': _dir_size_mb(snapshot_dir),
+        }
+        if not cold['warm'] and warm_load:
+            report['speedup'] = cold['load_s'] / report['warm_load_mean_s']
+        print(json.dumps(report, indent=2))
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+量子化ベンチマーク
+float32 と量子化モード（int8）の Phi-2 を別プロセスで読み込み、
+メモリ使用量・生成速度・仲間判定の不一致率を比較する
+
+使い方:
+    python -m benchmarks.quantization --quantize int8 --samples 20
+"""
+
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import torch
+
+from Phi2DialogueSimulatour import Phi2DialogueSimulator
+
+
+# 判定用の固定会話（NPC側の発言を固定し、モデル間で分類だけを比較する）
+USER_LINES = [
+    "Will you join my party?",
+    "We are heading into the dungeon tomorrow. Are you in?",
+    "I could use someone with your skills.",
+]
+NPC_LINES = [
+    "I would be honored to fight at your side.",
+    "Gold first, then we talk about loyalty.",
+    "I prefer to travel alone.",
+    "Your cause sounds noble. Count me in.",
+    "I am not sure you can keep up with me.",
+    "Never. I do not trust strangers.",
+]
+
+PROMPTS = [
+    "I am a brave knight of the northern keep.\n\nUser: What brings you here?\nKnight:",
+    "A traveler meets Lyra, a cheerful mage.\n\nTraveler: Hello!\nLyra: I am",
+]
+
+
+def _scripted_conversations(sim: Phi2DialogueSimulator, n: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    convs = []
+    for _ in range(n):
+        ch = {
+            'name': rng.choice(sim.names),
+            'job': rng.choice(sim.jobs)['Class'],
+            'personality': rng.choice(sim.personalities)['Trait'],
+        }
+        history = [{'turn': t + 1, 'user': rng.choice(USER_LINES), 'ai': rng.choice(NPC_LINES)}
+                   for t in range(3)]
+        convs.append({'character': ch, 'history': history, 'random_value': rng.random()})
+    return convs
+
+
+def _decide(yes_prob: float, random_value: float) -> bool:
+    """_classify_companion と同じ判定帯（乱数は固定値を共有）"""
+    if yes_prob >= 0.8:
+        return True
+    if yes_prob <= 0.20:
+        return False
+    return random_value < yes_prob
+
+
+def run_variant(model_name: str, quantize, samples: int, gen_tokens: int, seed: int) -> Dict:
+    """1つのモードで読み込み・速度・判定を計測する（子プロセス内で実行）"""
+    t0 = time.perf_counter()
+    sim = Phi2DialogueSimulator(use_gpu=False, use_kv_cache=False,
+                                quantize=quantize, model_name=model_name)
+    load_s = time.perf_counter() - t0
+
+    # 生成速度（固定長まで生成させる）
+    torch.manual_seed(seed)
+    new_tokens = 0
+    gen_s = 0.0
+    backend = sim.backend
+    for prompt in PROMPTS:
+        inputs = backend.tokenizer(prompt, return_tensors="pt").to(backend.device)
+        kwargs = backend._sampling_kwargs(gen_tokens, 0.7)
+        kwargs['min_new_tokens'] = gen_tokens
+        t0 = time.perf_counter()
+        with torch.no_grad():
+            out = backend.model.generate(**inputs, **kwargs)
+        gen_s += time.perf_counter() - t0
+        new_tokens += out.shape[1] - inputs["input_ids"].shape[1]
+
+    # 仲間判定
+    verdicts = []
+    for conv in _scripted_conversations(sim, samples, seed):
+        yes_logit, no_logit = sim._verdict_logits(
+            sim._build_verdict_prompt(conv['character'], conv['history']))
+        yes_prob = sim._softmax_pair(yes_logit, no_logit)[0]
+        verdicts.append({'yes_prob': yes_prob,
+                         'decision': _decide(yes_prob, conv['random_value'])})
+
+    return {
+        'quantize': quantize,
+        'load_s': load_s,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'tokens_per_s': new_tokens / gen_s if gen_s else 0.0,
+        'verdicts': verdicts,
+    }
+
+
+def _run_in_subprocess(args, quantize) -> Dict:
+    cmd = [sys.executable, "-m", "benchmarks.quantization", "--variant",
+           "--model", args.model, "--samples", str(args.samples),
+           "--gen-tokens", str(args.gen_tokens), "--seed", str(args.seed)]
+    cmd += ["--quantize", quantize or "none"]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    # シミュレーターのprint出力の後、最終行にJSONが出る
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phi-2 quantized inference benchmark")
+    parser.add_argument("--model", default="microsoft/phi-2")
+    parser.add_argument("--quantize", default="int8")
+    parser.add_argument("--samples", type=int, default=20,
+                        help="number of scripted conversations to classify")
+    parser.add_argument("--gen-tokens", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variant", action="store_true",
+                        help=argparse.SUPPRESS)  # 子プロセス用
+    args = parser.parse_args()
+
+    if args.variant:
+        quantize = None if args.quantize == "none" else args.quantize
+        print(json.dumps(run_variant(args.model, quantize, args.samples,
+                                     args.gen_tokens, args.seed)))
+        return
+
+    base = _run_in_subprocess(args, None)
+    quant = _run_in_subprocess(args, args.quantize)
+
+    pairs = list(zip(base['verdicts'], quant['verdicts']))
+    disagree = sum(a['decision'] != b['decision'] for a, b in pairs)
+    mean_diff = sum(abs(a['yes_prob'] - b['yes_prob']) for a, b in pairs) / max(1, len(pairs))
+
+    report = {
+        'model': args.model,
+        'fp32': {k: base[k] for k in ('load_s', 'peak_rss_mb', 'tokens_per_s')},
+        args.quantize: {k: quant[k] for k in ('load_s', 'peak_rss_mb', 'tokens_per_s')},
+        'verdict_samples': len(pairs),
+        'verdict_disagreement': disagree / max(1, len(pairs)),
+        'mean_abs_yes_prob_diff': mean_diff,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+補助デコード（speculative decoding）ベンチマーク
+同じプロンプトを通常の model.generate と下書きモデル付きの generate で生成し、
+レイテンシ・トークン速度・下書きトークンの採択率を比較する
+
+採択率は本体と下書きモデルの forward 回数から求める。
+補助デコードでは1ラウンドごとに本体が1回 forward し、採択された下書きトークン
+＋本体自身の1トークンが確定するため、採択数 = 生成トークン数 − 本体のforward回数。
+下書きモデルは1回の forward で1トークン提案する。
+
+使い方:
+    python -m benchmarks.speculative --draft microsoft/phi-1_5 --runs 3
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+import torch
+
+from backends.hf_phi2 import HFPhi2Backend
+from benchmarks.quantization import PROMPTS
+
+
+class _ForwardCounter:
+    """モデルの forward 呼び出し回数を数えるフック"""
+
+    def __init__(self, model):
+        self.calls = 0
+        self._handle = model.register_forward_hook(self._hook)
+
+    def _hook(self, module, args, output):
+        self.calls += 1
+
+    def remove(self):
+        self._handle.remove()
+
+
+def _run(backend: HFPhi2Backend, prompts: List[str], gen_tokens: int,
+         runs: int, seed: int, assisted: bool) -> Dict:
+    target = _ForwardCounter(backend.model)
+    draft = _ForwardCounter(backend.draft_model) if assisted else None
+    latencies = []
+    new_tokens = 0
+
+    for run in range(runs):
+        for i, prompt in enumerate(prompts):
+            inputs = backend.tokenizer(prompt, return_tensors="pt").to(backend.device)
+            kwargs = backend._sampling_kwargs(gen_tokens, 0.7)
+            kwargs['min_new_tokens'] = gen_tokens
+            if assisted:
+                kwargs.update(backend._assist_kwargs())
+
+            torch.manual_seed(seed + run * len(prompts) + i)
+            t0 = time.perf_counter()
+            with torch.no_grad():
+                out = backend.model.generate(**inputs, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+            new_tokens += out.shape[1] - inputs["input_ids"].shape[1]
+
+    target.remove()
+    result = {
+        'latency_mean_s': statistics.mean(latencies),
+        'latency_p50_s': statistics.median(latencies),
+        'tokens_per_s': new_tokens / sum(latencies),
+        'new_tokens': new_tokens,
+        'target_forward_calls': target.calls,
+        'tokens_per_target_forward': new_tokens / max(1, target.calls),
+    }
+    if draft:
+        draft.remove()
+        accepted = new_tokens - target.calls
+        result['draft_forward_calls'] = draft.calls
+        result['accepted_draft_tokens'] = accepted
+        result['acceptance_rate'] = accepted / max(1, draft.calls)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phi-2 assisted decoding benchmark")
+    parser.add_argument("--model", default="microsoft/phi-2")
+    parser.add_argument("--draft", default="microsoft/phi-1_5")
+    parser.add_argument("--gen-tokens", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quantize", default="none")
+    args = parser.parse_args()
+
+    quantize = None if args.quantize == "none" else args.quantize
+    backend = HFPhi2Backend(model_name=args.model, use_gpu=False,
+                            use_kv_cache=False, quantize=quantize,
+                            draft_model=args.draft)
+
+    # 1回ずつ捨てて、初回のみのオーバーヘッドを除く
+    _run(backend, PROMPTS[:1], 4, 1, args.seed, assisted=False)
+    _run(backend, PROMPTS[:1], 4, 1, args.seed, assisted=True)
+
+    plain = _run(backend, PROMPTS, args.gen_tokens, args.runs, args.seed, assisted=False)
+    assisted = _run(backend, PROMPTS, args.gen_tokens, args.runs, args.seed, assisted=True)
+
+    report = {
+        'model': args.model,
+        'draft': args.draft,
+        'quantize': quantize,
+        'gen_tokens': args.gen_tokens,
+        'plain': plain,
+        'assisted': assisted,
+        'speedup': plain['latency_mean_s'] / assisted['latency_mean_s'],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
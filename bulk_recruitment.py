@@ -0,0 +1,313 @@
+"""
+勧誘シミュレーションの一括実行（ヘッドレス）
+キャラクター × 台本シナリオの組み合わせごとに 挨拶 → 会話ターン → 仲間判定 を流し、
+YES確率・判定方式・各ターンの発言を1行1シミュレーションでCSV（または Parquet）に書き出す。
+仲間判定の閾値や personatlities.csv の補正値を大量の結果から調整するためのもの
+
+複数のワーカースレッドから同時に推論を投げ、バックエンドのバッチ推論でまとめて処理する。
+バッチ推論では生成にシードを効かせられないため、--batch-size 2以上の hf では
+応答テキストは実行ごとに変わり、seed 列は出力せず --seed も受け付けない。
+--batch-size 1（または mock）なら各ターンにシードを渡し、seed 列の値から行を再現できる
+
+使い方:
+    python bulk_recruitment.py --characters 1000 --output results/recruitment.csv
+    python bulk_recruitment.py --grid --characters 3 --output results/grid.parquet
+    python bulk_recruitment.py --backend mock --characters 200   # オフライン
+    python bulk_recruitment.py --batch-size 1 --seed 42 --characters 50   # 再現可能
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+from Phi2DialogueSimulatour import Phi2DialogueSimulator
+from backends import create_backend
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 酒場の最初の呼びかけ（TavernScreen.GREETING_MSG と同じ）
+GREETING = ("Hello! I'm looking for companions. "
+            "Can you tell me about yourself and your abilities?")
+
+# 挨拶の後に続ける台本（酒場と同じく3ターン）
+SCENARIOS = [
+    ["Will you join my party?",
+     "We are heading into the dungeon tomorrow. Are you in?",
+     "I could use someone with your skills."],
+    ["What do you think of dragons?",
+     "We plan to hunt one in the northern mountains.",
+     "The reward will be split evenly. Will you come?"],
+    ["I can't pay much, but I can promise adventure.",
+     "My last companion left me in the swamp.",
+     "Would you still travel with me?"],
+    ["Show me what you can do.",
+     "Impressive. Our party lacks someone like you.",
+     "Join us and you will be treated as an equal."],
+]
+
+_BASE_FIELDS = [
+    'index', 'scenario', 'seed', 'name', 'job', 'role', 'personality',
+    'hp', 'atk', 'def', 'wis', 'luc', 'agi',
+    'yes_prob', 'yes_logit', 'no_logit', 'random_value', 'band',
+    'decision_type', 'recruited',
+]
+
+
+class _Task(NamedTuple):
+    index: int
+    character: Dict
+    scenario: int
+    seed: int
+
+
+def _make_tasks(sim: Phi2DialogueSimulator, scenarios: List[List[str]],
+                count: int, grid: bool, seed: int) -> List[_Task]:
+    """
+    シミュレーションの一覧を作る。
+    grid なら全ジョブ × 全性格について count 人ずつ、そうでなければランダムに count 人。
+    各キャラクターは全シナリオを1回ずつ流す
+    """
+    rng = random.Random(seed)
+    if grid:
+        characters = [sim.create_character(job, personality, rng.choice(sim.names))
+                      for job in sim.jobs for personality in sim.personalities
+                      for _ in range(count)]
+    else:
+        characters = [sim.create_random_character(rng) for _ in range(count)]
+
+    tasks = []
+    for character in characters:
+        for s in range(len(scenarios)):
+            tasks.append(_Task(len(tasks), character, s, rng.randrange(2**31)))
+    return tasks
+
+
+def _simulate(sim: Phi2DialogueSimulator, task: _Task,
+              scenarios: List[List[str]], seeded: bool = True) -> Dict:
+    """
+    1人のキャラクターと1つのシナリオで会話し、判定までの結果を1行にする。
+    seeded が False なら生成にシードを渡さない（バッチ推論に回す。seed 列も出さない）
+    """
+    rng = random.Random(task.seed)
+
+    def turn_seed() -> Optional[int]:
+        # 使わない場合も乱数を進め、確率的判定の乱数を seeded に関わらず揃える
+        seed = rng.randrange(2**31)
+        return seed if seeded else None
+
+    session = sim.new_session(task.character)
+    try:
+        reply = session.generate_response(GREETING, is_first_greeting=True,
+                                          seed=turn_seed())
+        session.add_turn(GREETING, reply)
+        for line in scenarios[task.scenario]:
+            reply = session.generate_response(line, seed=turn_seed())
+            session.add_turn(line, reply)
+
+        recruited, yes_prob, details = session.classify(rng=rng)
+        turns = session.snapshot()
+    finally:
+        session.reset()
+
+    ch = task.character
+    row = {
+        'index': task.index, 'scenario': task.scenario, 'seed': task.seed,
+        'name': ch['name'], 'job': ch['job'], 'role': ch['role'],
+        'personality': ch['personality'],
+        'hp': ch['hp'], 'atk': ch['atk'], 'def': ch['def'],
+        'wis': ch['wis'], 'luc': ch['luc'], 'agi': ch['agi'],
+        'yes_prob': yes_prob,
+        'yes_logit': details.get('yes_logit'),
+        'no_logit': details.get('no_logit'),
+        'random_value': details.get('random_value'),
+        'band': sim.verdict_band(yes_prob),
+        'decision_type': details.get('decision_type'),
+        'recruited': recruited,
+    }
+    if not seeded:
+        del row['seed']
+    for t, turn in enumerate(turns, 1):
+        row[f'turn{t}_user'] = turn['user']
+        row[f'turn{t}_ai'] = turn['ai']
+    return row
+
+
+class _CsvWriter:
+    """結果を1行ずつ追記する（途中で止めてもそこまでの結果は残る）"""
+
+    def __init__(self, path: str, fields: List[str]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fields)
+        self._writer.writeheader()
+
+    def write(self, row: Dict):
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    """結果をまとめて列指向の Parquet に書き出す"""
+
+    def __init__(self, path: str, fields: List[str]):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pip install pyarrow")
+        self.path = path
+        self.fields = fields
+        self._rows: List[Dict] = []
+
+    def write(self, row: Dict):
+        self._rows.append(row)
+
+    def close(self):
+        columns = {f: [row.get(f) for row in self._rows] for f in self.fields}
+        pyarrow.parquet.write_table(pyarrow.table(columns), self.path,
+                                    compression="zstd")
+
+
+def run(sim: Phi2DialogueSimulator, tasks: List[_Task],
+        scenarios: List[List[str]], output: str, workers: int,
+        progress_every: int = 50, seeded: bool = True) -> Dict:
+    """
+    全シミュレーションをワーカープールで実行し、結果を output に書き出す。
+    seeded が False なら生成にシードを渡さず、seed 列を出力しない
+    """
+    max_turns = 1 + max(len(s) for s in scenarios)
+    base_fields = _BASE_FIELDS if seeded else [f for f in _BASE_FIELDS if f != 'seed']
+    fields = base_fields + [f'turn{t}_{who}' for t in range(1, max_turns + 1)
+                            for who in ('user', 'ai')]
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    writer_cls = _ParquetWriter if output.endswith(".parquet") else _CsvWriter
+    writer = writer_cls(output, fields)
+
+    bands = {"yes": 0, "no": 0, "random": 0}
+    recruited = failed = done = 0
+    t0 = time.perf_counter()
+
+    def simulate(task: _Task) -> Optional[Dict]:
+        try:
+            return _simulate(sim, task, scenarios, seeded)
+        except Exception as e:
+            print(f"Simulation {task.index} failed: {type(e).__name__}: {e}")
+            return None
+
+    try:
+        # map は投入順に結果を返すため、出力の行順は index 順になる
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for row in pool.map(simulate, tasks):
+                done += 1
+                if row is None:
+                    failed += 1
+                else:
+                    writer.write(row)
+                    bands[row['band']] += 1
+                    recruited += row['recruited']
+                if done % progress_every == 0 or done == len(tasks):
+                    rate = done / (time.perf_counter() - t0)
+                    print(f"[{done}/{len(tasks)}] {rate:.2f} sims/s")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - t0
+    completed = done - failed
+    return {
+        'simulations': completed,
+        'failed': failed,
+        'recruit_rate': recruited / completed if completed else 0.0,
+        'bands': bands,
+        'elapsed_s': elapsed,
+        'sims_per_s': done / elapsed if elapsed else 0.0,
+        'output': output,
+    }
+
+
+def _make_backend(args):
+    if args.backend == "mock":
+        return create_backend("mock", prefill_ms_per_token=args.mock_prefill_ms,
+                              decode_ms_per_token=args.mock_decode_ms)
+    options = dict(model_name=args.model, use_gpu=args.gpu)
+    if args.backend == "hf":
+        quantize = None if args.quantize == "none" else args.quantize
+        options.update(quantize=quantize, batch_size=args.batch_size,
+                       batch_wait_ms=args.batch_wait_ms)
+    return create_backend(args.backend, **options)
+
+
+def _load_scenarios(path: Optional[str]) -> List[List[str]]:
+    """台本の読み込み（JSON: ユーザー発言のリストのリスト）。省略時は SCENARIOS"""
+    if not path:
+        return SCENARIOS
+    with open(path, encoding="utf-8") as f:
+        scenarios = json.load(f)
+    if not scenarios or not all(isinstance(s, list) and s for s in scenarios):
+        raise ValueError(f"{path}: expected a non-empty list of non-empty lists of lines")
+    return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless bulk recruitment simulator")
+    parser.add_argument("--backend", default="hf", choices=["hf", "onnx", "mock"])
+    parser.add_argument("--model", default="microsoft/phi-2",
+                        help="Hugging Face id or local path")
+    parser.add_argument("--gpu", action="store_true")
+    parser.add_argument("--quantize", default="none")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="max requests per batched forward (hf backend)")
+    parser.add_argument("--batch-wait-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="concurrent simulations (default: batch size)")
+    parser.add_argument("--characters", type=int, default=100,
+                        help="random characters, or characters per job x personality with --grid")
+    parser.add_argument("--grid", action="store_true",
+                        help="cover every job x personality combination")
+    parser.add_argument("--scenarios", default=None,
+                        help="JSON file with a list of scripted user-line lists")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="reproducible runs (default 0); not available with hf batching")
+    parser.add_argument("--yes-threshold", type=float, default=0.8)
+    parser.add_argument("--no-threshold", type=float, default=0.20)
+    parser.add_argument("--output", default="results/recruitment.csv",
+                        help=".csv, or .parquet (requires pyarrow)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print every character, conversation and verdict")
+    parser.add_argument("--mock-prefill-ms", type=float, default=0.0)
+    parser.add_argument("--mock-decode-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    if args.output.endswith(".parquet") and not PYARROW_AVAILABLE:
+        parser.error("--output *.parquet requires pyarrow (pip install pyarrow)")
+    # バッチ推論の生成にはシードが効かないため、再現できない値を記録しない
+    seeded = not (args.backend == "hf" and args.batch_size > 1)
+    if not seeded and args.seed is not None:
+        parser.error("--seed needs reproducible generation: use --batch-size 1 "
+                     "(batched generation cannot be seeded)")
+    if seeded and args.seed is None:
+        args.seed = 0
+
+    scenarios = _load_scenarios(args.scenarios)
+    sim = Phi2DialogueSimulator(backend=_make_backend(args),
+                                yes_threshold=args.yes_threshold,
+                                no_threshold=args.no_threshold,
+                                verbose=args.verbose)
+    tasks = _make_tasks(sim, scenarios, args.characters, args.grid, args.seed)
+    workers = args.workers or max(1, args.batch_size)
+    print(f"Running {len(tasks)} simulations with {workers} workers...")
+
+    summary = run(sim, tasks, scenarios, args.output, workers, seeded=seeded)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+対話セッション
+1人のキャラクターとの会話履歴と、バックエンドが会話単位で保持する状態（KVキャッシュ）の
+キーをまとめて持つ。1つのシミュレーター（読み込み済みのモデル）を複数の会話で
+同時に使い回せるよう、会話ごとの状態はシミュレーターではなくセッションに置く
+"""
+
+import itertools
+import random
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from Phi2DialogueSimulatour import Phi2DialogueSimulator
+
+_session_ids = itertools.count(1)
+
+
+class DialogueSession:
+    """1つの会話（キャラクター・会話履歴・バックエンド側の状態のキー）"""
+
+    def __init__(self, simulator: "Phi2DialogueSimulator",
+                 character: Optional[Dict] = None,
+                 session_id: Optional[str] = None):
+        """
+        Args:
+            simulator: 推論に使うシミュレーター（複数のセッションで共有してよい）
+            character: 会話相手のキャラクター
+            session_id: バックエンドに渡す会話の識別子。省略時は自動で振る
+        """
+        self.simulator = simulator
+        self.character = character
+        self.id = session_id or f"session-{next(_session_ids)}"
+
+        # 会話履歴（{'turn', 'user', 'ai'} のリスト）。追記は add_turn を使う
+        self.history: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add_turn(self, user: str, ai: str, turn: Optional[int] = None) -> Dict:
+        """1ターン分の発言を履歴に追加する（turn 省略時は通し番号）"""
+        with self._lock:
+            entry = {'turn': turn if turn is not None else len(self.history) + 1,
+                     'user': user, 'ai': ai}
+            self.history.append(entry)
+        return entry
+
+    def snapshot(self) -> List[Dict]:
+        """プロンプト組み立て用の履歴のコピー（他スレッドの追記の影響を受けない）"""
+        with self._lock:
+            return list(self.history)
+
+    # ---------- 推論（シミュレーターに委譲） ----------
+
+    def generate_response(self, user_input: str, is_first_greeting: bool = False,
+                          seed: Optional[int] = None) -> str:
+        return self.simulator.generate_response(
+            user_input, self.character, is_first_greeting, seed, session=self)
+
+    def submit_response(self, user_input: str, is_first_greeting: bool = False,
+                        seed: Optional[int] = None) -> Future:
+        return self.simulator.submit_response(
+            user_input, self.character, is_first_greeting, seed, session=self)
+
+    def stream_response(self, user_input: str, is_first_greeting: bool = False,
+                        seed: Optional[int] = None) -> Iterator[str]:
+        return self.simulator.stream_response(
+            user_input, self.character, is_first_greeting, seed, session=self)
+
+    def classify(self, use_cache: Optional[bool] = None,
+                 rng: Optional[random.Random] = None) -> Tuple[bool, float, Dict]:
+        """この会話の仲間判定"""
+        return self.simulator._classify_companion(self.character, use_cache,
+                                                  session=self, rng=rng)
+
+    def cancel(self):
+        """
+        この会話の実行中の生成・判定を中断させる（次のデコードステップで止まり、
+        呼び出し元には backends.GenerationCancelled が送出される）
+        """
+        self.simulator.backend.cancel(self.id)
+
+    def reset(self):
+        """履歴と、バックエンドが保持しているこの会話の状態を破棄する"""
+        with self._lock:
+            self.history = []
+        self.simulator.backend.reset(self.id)
@@ -0,0 +1,226 @@
+"""
+推論バッチングワーカー
+複数スレッドから届く generate / ロジット取得リクエストをキューに溜め、
+パディング付きバッチにまとめて1回の forward / generate で処理する
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence
+
+import torch
+from transformers import StoppingCriteriaList
+
+from backends.base import StopRule
+from backends.stopping import StopRuleCriteria
+
+
+class _Request:
+    """キューに積まれる1件分の推論リクエスト"""
+
+    __slots__ = ("kind", "prompt", "kwargs", "token_ids", "input_ids", "future", "key")
+
+    def __init__(self, kind: str, prompt: str, kwargs: Dict,
+                 token_ids: Optional[Sequence[int]] = None,
+                 input_ids: Optional[Sequence[int]] = None):
+        self.kind = kind
+        self.prompt = prompt
+        self.kwargs = kwargs
+        self.token_ids = token_ids
+        self.input_ids = input_ids
+        self.future: Future = Future()
+        # 同じキーのリクエストだけを1バッチにまとめる（生成パラメータが共通）
+        self.key = (kind, tuple(sorted(kwargs.items())))
+
+
+class InferenceWorker:
+    """リクエストをまとめてバッチ推論するバックグラウンドワーカー"""
+
+    def __init__(self, model, tokenizer, device: str,
+                 max_batch_size: int = 4,
+                 max_wait_ms: float = 20.0,
+                 max_length: int = 512,
+                 lock: Optional[threading.Lock] = None):
+        """
+        Args:
+            model: AutoModelForCausalLM
+            tokenizer: 対応するトークナイザ（左パディングに設定される）
+            device: 入力テンソルを載せるデバイス
+            max_batch_size: 1バッチに詰める最大リクエスト数
+            max_wait_ms: 最初のリクエスト到着後、後続を待つ最大時間
+            max_length: プロンプトの最大トークン長
+            lock: バッチの実行中に保持するロック。バッチ外でもモデルを使う場合に共有する
+                （サンプリングがグローバルな乱数状態を使うため、シード付きの生成と重ならないようにする）
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_length = max_length
+        self.lock = lock or threading.Lock()
+
+        # バッチ生成では末尾を揃えるため左パディング
+        self.tokenizer.padding_side = "left"
+
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._running = True
+
+        # 統計
+        self.batches_run = 0
+        self.requests_served = 0
+
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    # ---------- 受付 ----------
+
+    def submit_generate(self, prompt: str,
+                        input_ids: Optional[Sequence[int]] = None,
+                        stop: Optional[StopRule] = None,
+                        **generate_kwargs) -> Future:
+        """
+        生成リクエストを登録する。
+        input_ids を渡すとプロンプトを再トークン化せずにそのまま使う。
+        stop を渡すと、系列ごとに条件を満たした時点で生成を止める
+        （同じ条件のリクエストだけが1バッチにまとまる）。
+        Futureの結果は生成部分だけをデコードしたテキスト（プロンプトは含まない）。
+        """
+        if stop is not None:
+            generate_kwargs["stop"] = stop
+        return self._submit(_Request("generate", prompt, generate_kwargs,
+                                     input_ids=input_ids))
+
+    def submit_logits(self, prompt: str, token_ids: Sequence[int],
+                      input_ids: Optional[Sequence[int]] = None) -> Future:
+        """
+        次トークンのロジット取得リクエストを登録する。
+        Futureの結果は token_ids 各々のロジット値のリスト。
+        """
+        return self._submit(_Request("logits", prompt, {}, list(token_ids),
+                                     input_ids=input_ids))
+
+    def submit_hidden(self, prompt: str,
+                      input_ids: Optional[Sequence[int]] = None) -> Future:
+        """
+        末尾トークンの最終層の隠れ状態の取得リクエストを登録する。
+        Futureの結果は隠れ状態のベクトル（floatのリスト）。
+        """
+        return self._submit(_Request("hidden", prompt, {}, input_ids=input_ids))
+
+    def _submit(self, req: _Request) -> Future:
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("InferenceWorker is shut down")
+            self._queue.append(req)
+            self._cond.notify()
+        return req.future
+
+    def shutdown(self):
+        """ワーカーを停止する（未処理リクエストはキャンセル）"""
+        with self._cond:
+            self._running = False
+            pending = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        for req in pending:
+            req.future.cancel()
+        self._thread.join(timeout=5)
+
+    # ---------- バッチ処理 ----------
+
+    def _next_batch(self) -> List[_Request]:
+        """先頭リクエストと同じキーのものを、上限数か待ち時間まで集める"""
+        with self._cond:
+            while self._running and not self._queue:
+                self._cond.wait()
+            if not self._running:
+                return []
+
+            first = self._queue.popleft()
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                for req in list(self._queue):
+                    if req.key == first.key:
+                        self._queue.remove(req)
+                        batch.append(req)
+                        if len(batch) >= self.max_batch_size:
+                            break
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch_size or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+        return [req for req in batch if req.future.set_running_or_notify_cancel()]
+
+    def _loop(self):
+        while self._running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                with self.lock:
+                    if batch[0].kind == "generate":
+                        results = self._run_generate(batch)
+                    elif batch[0].kind == "hidden":
+                        results = self._run_hidden(batch)
+                    else:
+                        results = self._run_logits(batch)
+            except Exception as e:
+                for req in batch:
+                    req.future.set_exception(e)
+                continue
+
+            for req, result in zip(batch, results):
+                req.future.set_result(result)
+            self.batches_run += 1
+            self.requests_served += len(batch)
+
+    def _encode(self, batch: List[_Request]):
+        """トークン化済みのものはそのまま使い、左パディングでバッチにまとめる"""
+        ids = [list(req.input_ids) if req.input_ids is not None
+               else self.tokenizer(req.prompt, truncation=True,
+                                   max_length=self.max_length)["input_ids"]
+               for req in batch]
+        return self.tokenizer.pad(
+            {"input_ids": ids},
+            padding=True,
+            return_tensors="pt"
+        ).to(self.device)
+
+    def _run_generate(self, batch: List[_Request]) -> List[str]:
+        inputs = self._encode(batch)
+        prompt_len = inputs["input_ids"].shape[1]
+        kwargs = dict(batch[0].kwargs)
+        stop = kwargs.pop("stop", None)
+        if stop is not None:
+            kwargs["stopping_criteria"] = StoppingCriteriaList(
+                [StopRuleCriteria(self.tokenizer, prompt_len, stop)])
+        with torch.no_grad():
+            outputs = self.model.generate(**inputs, **kwargs)
+        return [self.tokenizer.decode(seq[prompt_len:], skip_special_tokens=True)
+                for seq in outputs]
+
+    def _forward(self, batch: List[_Request], **kwargs):
+        """バッチ全体を1回 forward する（左パディングなので末尾位置が各プロンプトの最終トークン）"""
+        inputs = self._encode(batch)
+        # 左パディング分をずらした位置IDを明示（パディング無しの場合と同じ位置になる）
+        position_ids = inputs["attention_mask"].long().cumsum(-1) - 1
+        position_ids.masked_fill_(inputs["attention_mask"] == 0, 1)
+
+        with torch.no_grad():
+            return self.model(**inputs, position_ids=position_ids, **kwargs)
+
+    def _run_logits(self, batch: List[_Request]) -> List[List[float]]:
+        next_token_logits = self._forward(batch).logits[:, -1, :]
+        return [[next_token_logits[i, tid].item() for tid in req.token_ids]
+                for i, req in enumerate(batch)]
+
+    def _run_hidden(self, batch: List[_Request]) -> List[List[float]]:
+        outputs = self._forward(batch, output_hidden_states=True)
+        return outputs.hidden_states[-1][:, -1, :].float().tolist()
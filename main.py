@@ -7,7 +7,7 @@ import pygame
 import sys
 import os
 
-from settings.settings import WINDOW, PORTRAIT, C
+from settings.settings import INFERENCE, WINDOW, PORTRAIT, C
 from screens.village import VillageScreen
 from screens.tavern import TavernScreen
 from screens.lodge import LodgeScreen
@@ -38,6 +38,12 @@ class Game:
             "adventure": AdventureScreen(screen, fonts, assets),
         }
         self.current = "village"
+        # 次のフレームは変わった領域に関わらず全体を画面に送る（画面遷移・ウィンドウの再表示）
+        self._full_redraw = True
+
+        # 村にいる間にモデルを読み込んでおき、酒場に入ったときの待ち時間をなくす
+        if INFERENCE.preload:
+            self.screens["tavern"].preload()
 
     def _init_fonts(self) -> dict:
         candidates = ["notosanscjkjp", "notosans", "dejavusans",
@@ -102,25 +108,53 @@ class Game:
 
     def _switch_to(self, name: str):
         """画面遷移"""
+        prev_obj = self.screens[self.current]
+        if hasattr(prev_obj, "leave"):
+            prev_obj.leave()
         self.current = name
+        self._full_redraw = True
         screen_obj = self.screens[name]
         if hasattr(screen_obj, "enter"):
             screen_obj.enter()
 
+    def _present(self, screen_obj):
+        """描いたフレームを画面に送る（変わった領域が分かる画面ではその領域だけ）"""
+        rects = screen_obj.dirty_rects()
+        if rects is None or self._full_redraw or not WINDOW.dirty_rects:
+            pygame.display.flip()
+        elif rects:
+            pygame.display.update(rects)
+        self._full_redraw = False
+
+    def _next_events(self) -> list:
+        """
+        次のフレームで処理するイベント。アニメーション中の画面ならすぐに返し、
+        そうでなければ入力・スレッドからの起床（WAKE_EVENT）・idle_wait_ms のいずれかまで待つ
+        （待っている間はCPUを使わず、推論に回せる）
+        """
+        if self.screens[self.current].is_animating():
+            return pygame.event.get()
+        first = pygame.event.wait(WINDOW.idle_wait_ms)
+        events = [] if first.type == pygame.NOEVENT else [first]
+        return events + pygame.event.get()
+
     def run(self):
         """メインゲームループ"""
         while True:
-            for event in pygame.event.get():
+            for event in self._next_events():
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self._full_redraw = True
 
                 result = self.screens[self.current].handle_event(event)
                 if result and result != self.current:
                     self._switch_to(result)
 
-            self.screens[self.current].draw()
-            pygame.display.flip()
+            screen_obj = self.screens[self.current]
+            screen_obj.draw()
+            self._present(screen_obj)
             self.clock.tick(WINDOW.fps)
 
 
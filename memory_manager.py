@@ -0,0 +1,219 @@
+"""
+推論モデルのメモリ管理
+酒場の外で一定時間使われなかったモデルをメモリから降ろし（アイドル退避）、
+プロセスのRSSが上限を超えた場合は酒場の外にいれば待たずに降ろす。
+酒場にいる間に上限を超えたら、まず会話のKVキャッシュを捨て、次の確認でも
+超えたままならモデルも降ろす（次の推論の前に読み込み直す）。
+アイドル時間は最初に酒場を出たときから数える（起動時の先読みは酒場に入るまで残す）。
+酒場に戻ったらバックグラウンドで読み込み直す（safetensorsスナップショットがあれば
+メモリマップで読むため速い）。退避したものと読み込み直しにかかった時間は
+ログとテレメトリ（"evict" / "reload" イベント）に出し、stats() でも参照できる
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+
+def _process_rss(pid: int) -> Optional[int]:
+    """1プロセスのRSS（バイト）。終了済み・測れない場合はNone"""
+    if PSUTIL_AVAILABLE:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        # Linux: statm の2列目が常駐ページ数
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def rss_mb(pids: List[int]) -> Optional[float]:
+    """プロセス群のRSSの合計（MB）。どれも測れなければNone"""
+    sizes = [size for size in map(_process_rss, pids) if size is not None]
+    if not sizes:
+        return None
+    return sum(sizes) / (1024 * 1024)
+
+
+class MemoryManager:
+    """バックエンドのモデルを、使われていない間だけメモリから降ろす"""
+
+    def __init__(self, backend, idle_seconds: Optional[float] = 300.0,
+                 rss_budget_mb: Optional[float] = None,
+                 check_interval: float = 1.0, telemetry=None):
+        """
+        Args:
+            backend: 管理するバックエンド（DialogueBackend の load / unload / trim を使う）
+            idle_seconds: 使用をやめてからモデルを降ろすまでの秒数（Noneで降ろさない）
+            rss_budget_mb: 自プロセスと推論用の子プロセスのRSS合計の上限（MB）。
+                超えたら、使用中はまず会話のKVキャッシュを捨て、次の確認でも超えていれば
+                モデルも降ろす。使用中でなければ待たずにモデルも降ろす
+            check_interval: アイドル時間とRSSを確認する間隔（秒）
+            telemetry: 退避・読み込み直しのイベントの送り先（telemetry.Telemetry）
+        """
+        self.backend = backend
+        self.idle_seconds = idle_seconds
+        self.rss_budget_mb = rss_budget_mb
+        self.check_interval = check_interval
+        self.telemetry = telemetry
+
+        self.in_use = False
+        self.reloading = False
+        self.last_rss_mb: Optional[float] = None
+        # 最後に使用を終えた時刻。一度も使われていなければNone（アイドル退避しない）
+        self._last_used: Optional[float] = None
+        # 使用中に上限を超えてKVキャッシュを捨て、まだ上限を下回っていない
+        self._trimmed = False
+
+        # 直近の退避・読み込み直しの記録
+        self.evictions: deque = deque(maxlen=20)
+        self.reloads: deque = deque(maxlen=20)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    # ---------- 使用状況 ----------
+
+    def enter(self):
+        """使用開始（酒場に入った）。退避済みならバックグラウンドで読み込み直す"""
+        self.in_use = True
+        if not self.reloading:
+            self.reloading = True
+            threading.Thread(target=self.reload, daemon=True).start()
+
+    def leave(self):
+        """使用終了（酒場を出た）。ここからアイドル時間を数える"""
+        self.in_use = False
+        self._last_used = time.monotonic()
+
+    def close(self):
+        self._stop.set()
+
+    # ---------- 退避・読み込み直し ----------
+
+    def check(self):
+        """アイドル時間とRSSを確認し、必要なら退避する（監視スレッドから定期的に呼ばれる）"""
+        rss = self.last_rss_mb = rss_mb(self._pids())
+        over = self.rss_budget_mb is not None and rss is not None and rss > self.rss_budget_mb
+
+        if not over:
+            self._trimmed = False
+        if self.in_use:
+            if over and not self._trimmed:
+                # 使用中はまず再計算できるキャッシュだけを捨てる
+                dropped = self.backend.trim()
+                self._trimmed = True
+                print(f"Memory budget exceeded while in use ({rss:.0f}MB > "
+                      f"{self.rss_budget_mb:.0f}MB); dropped {dropped} KV cache(s)")
+            elif over:
+                # キャッシュを捨てても上限を超えたまま → 使用中でもモデルを降ろす
+                self.evict("rss_budget", rss, force=True)
+            return
+
+        if over:
+            self.evict("rss_budget", rss)
+        elif (self.idle_seconds is not None and self._last_used is not None
+              and time.monotonic() - self._last_used >= self.idle_seconds
+              and self.backend.is_loaded()):
+            # 退避後に推論が来て読み込み直された場合も、使われていなければまた降ろす
+            self.evict("idle", rss)
+
+    def evict(self, reason: str, rss_before: Optional[float] = None,
+              force: bool = False) -> Dict:
+        """
+        モデルと会話のKVキャッシュを降ろす。何も降ろせなかった場合は空を返す。
+        force でなければ使用中は降ろさない（推論中のモデルはバックエンドが降ろさない）
+        """
+        with self._lock:
+            if self.in_use and not force:
+                return {}
+            t0 = time.perf_counter()
+            kv_sessions = self.backend.trim()
+            freed = self.backend.unload()
+            if not freed and not kv_sessions:
+                return {}
+
+            rss_after = self.last_rss_mb = rss_mb(self._pids())
+            record = {
+                'reason': reason,
+                'freed': freed,
+                'kv_sessions': kv_sessions,
+                'rss_before_mb': rss_before,
+                'rss_after_mb': rss_after,
+                'evict_s': time.perf_counter() - t0,
+                'ts': time.time(),
+            }
+            self.evictions.append(record)
+
+        what = freed.get('model', "model") if freed else f"{kv_sessions} KV cache(s)"
+        delta = (f", RSS {rss_before:.0f}MB -> {rss_after:.0f}MB"
+                 if rss_before is not None and rss_after is not None else "")
+        print(f"✓ Evicted {what} ({reason}){delta}")
+        self._emit("evict", **record)
+        return record
+
+    def reload(self) -> float:
+        """退避したモデルを読み込み直し、かかった秒数を返す（読み込み済みなら0）"""
+        try:
+            with self._lock:
+                seconds = self.backend.load()
+                if not seconds:
+                    return 0.0
+                self.last_rss_mb = rss_mb(self._pids())
+                record = {'load_s': seconds, 'rss_after_mb': self.last_rss_mb,
+                          'ts': time.time()}
+                self.reloads.append(record)
+        finally:
+            self.reloading = False
+
+        print(f"✓ Reloaded model in {seconds:.1f}s")
+        self._emit("reload", **record)
+        return seconds
+
+    def stats(self) -> Dict:
+        """現在の状態と直近の退避・読み込み直しの記録"""
+        return {
+            'in_use': self.in_use,
+            'loaded': self.backend.is_loaded(),
+            'rss_mb': self.last_rss_mb,
+            'rss_budget_mb': self.rss_budget_mb,
+            'idle_s': (None if self.in_use or self._last_used is None
+                       else time.monotonic() - self._last_used),
+            'evictions': list(self.evictions),
+            'reloads': list(self.reloads),
+        }
+
+    # ---------- 内部 ----------
+
+    def _pids(self) -> List[int]:
+        """RSSを合計するプロセス（推論を子プロセスで動かしている場合はそれも含む）"""
+        pids = [os.getpid()]
+        process = getattr(self.backend, "process", None)
+        if process is not None and process.pid is not None:
+            pids.append(process.pid)
+        return pids
+
+    def _loop(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                # 監視の失敗でゲームを止めない（推論側のエラーは推論の呼び出しで表示される）
+                print(f"Memory check failed: {type(e).__name__}: {e}")
+
+    def _emit(self, kind: str, **fields):
+        if self.telemetry is not None:
+            self.telemetry.emit(kind, backend=self.backend.name, **fields)
@@ -0,0 +1,124 @@
+"""
+トークン予算付きプロンプトビルダー
+テンプレートの固定部分・キャラクターごとのプロフィール・会話ターンを
+区切り（セグメント）単位でトークン化してキャッシュし、
+予算に収まるよう古い会話ターンから落として組み立てる
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, List, NamedTuple, Sequence, Tuple
+
+
+class Prompt(NamedTuple):
+    """組み立て済みプロンプト（テキストと、そのトークンID列）"""
+    text: str
+    ids: List[int]
+    dropped_turns: int = 0    # 予算に収めるため落とした古いターン数
+    truncated: bool = False   # 固定部分だけで予算を超え、先頭を切り詰めた（text も切り詰め後のもの）
+
+
+class PromptBuilder:
+    """
+    セグメントごとのトークンIDをキャッシュしてプロンプトを組み立てる。
+
+    セグメントの区切りはトークン境界と一致させる必要がある
+    （空白以外の文字の直後で切り、次のセグメントは改行か空白から始める）。
+    こうすると各セグメントのID列を連結したものが全文のトークン化と一致する。
+    """
+
+    def __init__(self, encode: Callable[[str], List[int]],
+                 budget: int = 512, max_cached: int = 2048):
+        """
+        Args:
+            encode: テキストをトークンID列にする関数（特殊トークンは付けない）
+            budget: プロンプト全体の最大トークン数
+            max_cached: キャッシュするセグメント数の上限（LRU）
+        """
+        self.encode = encode
+        self.budget = budget
+        self.max_cached = max(1, max_cached)
+        self._ids: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計
+        self.hits = 0
+        self.misses = 0
+
+    def segment(self, text: str) -> List[int]:
+        """セグメントのトークンID列（キャッシュ済みならそれを返す）"""
+        with self._lock:
+            ids = self._ids.get(text)
+            if ids is not None:
+                self._ids.move_to_end(text)
+                self.hits += 1
+                return ids
+            self.misses += 1
+
+        ids = list(self.encode(text))
+        with self._lock:
+            self._ids[text] = ids
+            while len(self._ids) > self.max_cached:
+                self._ids.popitem(last=False)
+        return ids
+
+    def build(self, head: Sequence[str], turns: Sequence[str] = (),
+              tail: Sequence[str] = ()) -> Prompt:
+        """
+        head + turns + tail の順に連結したプロンプトを作る。
+        head と tail は必ず残し、turns は新しいものから予算に入るだけ残す。
+        固定部分だけで予算を超える場合は、末尾（生成直前の部分）を優先して先頭を切る。
+        """
+        head_ids = [self.segment(s) for s in head if s]
+        tail_ids = [self.segment(s) for s in tail if s]
+        used = sum(len(ids) for ids in head_ids) + sum(len(ids) for ids in tail_ids)
+
+        # 新しいターンから順に、予算に収まる分だけ残す
+        kept: List[List[int]] = []
+        for text in reversed(turns):
+            ids = self.segment(text)
+            if used + len(ids) > self.budget:
+                break
+            kept.append(ids)
+            used += len(ids)
+        kept.reverse()
+        kept_turns = turns[len(turns) - len(kept):] if kept else []
+
+        texts = [s for s in head if s] + list(kept_turns) + [s for s in tail if s]
+        seg_ids = head_ids + kept + tail_ids
+        truncated = used > self.budget
+        if truncated:
+            texts, seg_ids = self._truncate(texts, seg_ids, used - self.budget)
+
+        ids = [tid for seg in seg_ids for tid in seg]
+        return Prompt("".join(texts), ids, len(turns) - len(kept), truncated)
+
+    def _truncate(self, texts: List[str], seg_ids: List[List[int]],
+                  excess: int) -> Tuple[List[str], List[List[int]]]:
+        """
+        先頭から excess トークン以上を落とす。丸ごと落とせないセグメントは
+        文字単位で後ろ側だけを残してトークン化し直す（テキストとID列を一致させるため）
+        """
+        while seg_ids and excess >= len(seg_ids[0]):
+            excess -= len(seg_ids[0])
+            texts, seg_ids = texts[1:], seg_ids[1:]
+        if excess <= 0:
+            return texts, seg_ids
+
+        # 残すトークン数に収まる最長の後ろ側を二分探索する
+        text, limit = texts[0], len(seg_ids[0]) - excess
+        lo, hi = 1, len(text)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if len(self.encode(text[mid:])) <= limit:
+                hi = mid
+            else:
+                lo = mid + 1
+        rest = list(self.encode(text[lo:]))
+        while len(rest) > limit:   # トークン数が文字位置に対して単調でない場合の保険
+            lo += 1
+            rest = list(self.encode(text[lo:]))
+        return [text[lo:]] + texts[1:], [rest] + seg_ids[1:]
+
+    def __len__(self) -> int:
+        return len(self._ids)
@@ -0,0 +1,91 @@
+"""
+応答メモ化キャッシュ
+プロンプト・サンプリング設定・シードをキーに生成結果を保持する。
+メモリ上はLRUで件数を制限し、任意でJSONLファイルに永続化する
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class ResponseCache:
+    """LRU＋任意のディスク永続化を持つ応答キャッシュ"""
+
+    def __init__(self, max_entries: int = 512, path: Optional[str] = None):
+        """
+        Args:
+            max_entries: メモリ上に保持する最大件数（超えると最も古いものから破棄）
+            path: JSONLの保存先。Noneならメモリのみ
+        """
+        self.max_entries = max(1, max_entries)
+        self.path = path
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計
+        self.hits = 0
+        self.misses = 0
+
+        if path and os.path.exists(path):
+            self._load(path)
+
+    @staticmethod
+    def make_key(prompt: str, params: Dict, seed: Optional[int] = None) -> str:
+        """プロンプト・生成パラメータ・シードから決定的なキーを作る"""
+        payload = json.dumps([prompt, params, seed], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._insert(key, value)
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "value": value},
+                                       ensure_ascii=False) + "\n")
+
+    def clear(self):
+        """メモリ上のエントリを破棄する（ディスクはそのまま）"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _insert(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, path: str):
+        """JSONLを読み込む（後の行が優先。壊れた行は無視）"""
+        n_lines = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                n_lines += 1
+                try:
+                    rec = json.loads(line)
+                    self._insert(rec["key"], rec["value"])
+                except (ValueError, KeyError):
+                    continue
+
+        # 追記で膨らんだファイルは保持中のエントリだけに書き直す
+        if n_lines > len(self._entries) * 2:
+            with open(path, "w", encoding="utf-8") as f:
+                for key, value in self._entries.items():
+                    f.write(json.dumps({"key": key, "value": value},
+                                       ensure_ascii=False) + "\n")
@@ -162,6 +162,13 @@ class AdventureScreen(BaseScreen):
 
     # ---------- 描画 ----------
 
+    def view_state(self):
+        back = (self.btn_back.rect, self.btn_back.appearance())
+        if self.state == self.ST_PREPARE:
+            return (self.state, [(self.menu_rect(self._get_item_rects()), self.selected),
+                                 (self.MENU_DESC_RECT, self.selected), back])
+        return ((self.state, self.current_floor), [back])
+
     def draw(self):
         if self.state == self.ST_PREPARE:
             self._draw_prepare()
@@ -172,22 +179,14 @@ class AdventureScreen(BaseScreen):
 
     def _draw_prepare(self):
         """冒険準備画面（Village風メニュー）"""
-        bg_img = self.assets.get("adventure_img")
-        if bg_img:
-            self.screen.blit(bg_img, (0, 0))
-            overlay = pygame.Surface((WINDOW.width, WINDOW.height),
-                                     pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 80))
-            self.screen.blit(overlay, (0, 0))
-        else:
-            self.screen.fill(C.black)
+        self.draw_background(self.assets.get("adventure_img"), (0, 0, 0, 80))
 
         # タイトル
-        title = self.fonts["title"].render("Adventure", True, C.white)
+        title = self.render_text(self.fonts["title"], "Adventure", True, C.white)
         self.screen.blit(title, (100, 180))
 
-        sub = self.fonts["small"].render("What would you like to do?",
-                                         True, C.parchment_dark)
+        sub = self.render_text(self.fonts["small"], "What would you like to do?",
+                               True, C.parchment_dark)
         self.screen.blit(sub, (100, 220))
 
         # メニューリスト
@@ -205,7 +204,7 @@ class AdventureScreen(BaseScreen):
                     (tri_x, tri_y),
                 ])
 
-            name_surf = self.fonts["village"].render(action["name"], True, color)
+            name_surf = self.render_text(self.fonts["village"], action["name"], True, color)
             self.screen.blit(name_surf, (rect.x, rect.y + 8))
 
         # 説明文
@@ -213,13 +212,14 @@ class AdventureScreen(BaseScreen):
         desc_x = 500
         desc_y = 400
         for line in self.wrap_text(action["desc"], self.fonts["body"], 500):
-            desc_surf = self.fonts["body"].render(line, True, C.parchment)
+            desc_surf = self.render_text(self.fonts["body"], line, True, C.parchment)
             self.screen.blit(desc_surf, (desc_x, desc_y))
             desc_y += 24
 
-        self.btn_back.draw(self.screen, self.fonts["body"])
+        self.btn_back.draw(self.screen, self.fonts["body"], self.text_cache)
 
-        hint = self.fonts["small"].render(
+        hint = self.render_text(
+            self.fonts["small"],
             "Up/Down to select  |  Enter or Click to confirm  |  Esc to go back",
             True, C.parchment_dark)
         self.screen.blit(hint, (100, WINDOW.height - 60))
@@ -227,52 +227,40 @@ class AdventureScreen(BaseScreen):
     def _draw_dungeon(self):
         """ダンジョン探索画面"""
         # 背景（現在の階層）
-        bg = self._get_dungeon_bg()
-        if bg:
-            self.screen.blit(bg, (0, 0))
-            overlay = pygame.Surface((WINDOW.width, WINDOW.height),
-                                     pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 60))
-            self.screen.blit(overlay, (0, 0))
-        else:
-            self.screen.fill(C.black)
+        self.draw_background(self._get_dungeon_bg(), (0, 0, 0, 60))
 
         # 階層情報
         floor_str = f"Floor {self.current_floor}"
-        floor_surf = self.fonts["title"].render(floor_str, True, C.white)
+        floor_surf = self.render_text(self.fonts["title"], floor_str, True, C.white)
         self.screen.blit(floor_surf, (100, 40))
 
         # 戻るボタン
         self.btn_back.text = "< Back"
-        self.btn_back.draw(self.screen, self.fonts["body"])
+        self.btn_back.draw(self.screen, self.fonts["body"], self.text_cache)
 
         # 操作ヒント
-        hint = self.fonts["small"].render(
+        hint = self.render_text(
+            self.fonts["small"],
             "Right / Enter / Space / Click to move forward  |  Esc to retreat",
             True, C.parchment_dark)
         self.screen.blit(hint, (100, WINDOW.height - 40))
 
     def _draw_boss(self):
         """ボス戦到達画面"""
-        # 背景（現在の階層）
-        bg = self._get_dungeon_bg()
-        if bg:
-            self.screen.blit(bg, (0, 0))
-
-        # 暗いオーバーレイ
-        overlay = pygame.Surface((WINDOW.width, WINDOW.height), pygame.SRCALPHA)
-        overlay.fill((80, 0, 0, 140))
-        self.screen.blit(overlay, (0, 0))
+        # 背景（現在の階層）に暗いオーバーレイ
+        self.draw_background(self._get_dungeon_bg(), (80, 0, 0, 140))
 
         # ボス到達テキスト
-        boss_title = self.fonts["title"].render(
+        boss_title = self.render_text(
+            self.fonts["title"],
             f"Floor {self.current_floor} - BOSS", True, C.red)
         self.screen.blit(boss_title,
                          (WINDOW.width // 2 - boss_title.get_width() // 2,
                           WINDOW.height // 2 - 80))
 
         # TODO表記
-        todo_surf = self.fonts["header"].render(
+        todo_surf = self.render_text(
+            self.fonts["header"],
             "Boss battle coming soon...", True, C.gold)
         self.screen.blit(todo_surf,
                          (WINDOW.width // 2 - todo_surf.get_width() // 2,
@@ -283,11 +271,11 @@ class AdventureScreen(BaseScreen):
             next_str = "Press Enter to return to camp (Final floor!)"
         else:
             next_str = f"Press Enter to advance to Floor {self.current_floor + 1}"
-        next_surf = self.fonts["body"].render(next_str, True, C.parchment)
+        next_surf = self.render_text(self.fonts["body"], next_str, True, C.parchment)
         self.screen.blit(next_surf,
                          (WINDOW.width // 2 - next_surf.get_width() // 2,
                           WINDOW.height // 2 + 40))
 
         # 戻るボタン
         self.btn_back.text = "< Retreat"
-        self.btn_back.draw(self.screen, self.fonts["body"])
+        self.btn_back.draw(self.screen, self.fonts["body"], self.text_cache)
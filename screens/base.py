@@ -1,16 +1,34 @@
 import pygame
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
 
 from settings.settings import WINDOW, C, UIButton
+from screens.text_cache import TextCache
+
+# 背景スレッドが表示内容を変えたときに、入力待ちのメインループを起こすイベント
+WAKE_EVENT = pygame.event.custom_type()
 
 
 class BaseScreen:
     """全画面の基底クラス"""
 
+    # 描画済みテキストのキャッシュ（全画面で共有。毎フレーム同じ文字列を描くため）
+    text_cache = TextCache()
+
+    # 画面ごとに保持する合成済みレイヤーの数（1枚でウィンドウ全体分のメモリを使う）
+    MAX_LAYERS = 4
+
+    # Village風メニュー（左に項目、右に選択中の説明文）の説明文の範囲
+    MENU_DESC_RECT = pygame.Rect(500, 400, WINDOW.width - 500, WINDOW.height - 460)
+
     def __init__(self, screen: pygame.Surface, fonts: Dict, assets: Dict):
         self.screen = screen
         self.fonts = fonts
         self.assets = assets
+        # 背景・暗幕・パネルなどの静的なレイヤーを1枚に合成したもの
+        self._layers: "OrderedDict[Hashable, pygame.Surface]" = OrderedDict()
+        # 前のフレームの view_state()
+        self._last_view = None
 
     def handle_event(self, event: pygame.event.Event) -> Optional[str]:
         """イベント処理。画面遷移先を返す。Noneなら遷移なし。"""
@@ -20,6 +38,85 @@ class BaseScreen:
         """画面描画"""
         pass
 
+    def is_animating(self) -> bool:
+        """入力が無くても毎フレーム描き直す必要があるか（False ならメインループは入力を待つ）"""
+        return False
+
+    @staticmethod
+    def wake():
+        """背景スレッドから呼ぶ。入力待ちのメインループに描き直させる"""
+        if pygame.display.get_init():
+            pygame.event.post(pygame.event.Event(WAKE_EVENT))
+
+    def view_state(self) -> Optional[Tuple[Hashable, List[Tuple[pygame.Rect, Hashable]]]]:
+        """
+        描画内容を決める状態。(画面全体の状態, [(領域, 領域内の描画を決める状態), ...]) を返す。
+        画面全体の状態が前のフレームと同じなら、状態が変わった領域だけが描き換わったとみなす。
+        None（既定）なら毎フレーム全体を描き換えたとみなす
+        """
+        return None
+
+    def dirty_rects(self) -> Optional[List[pygame.Rect]]:
+        """
+        draw() の後に呼ぶ。前のフレームから描き換わった領域を返す。
+        全体を画面に送る必要がある場合はNone
+        """
+        view, last = self.view_state(), self._last_view
+        self._last_view = view
+        if view is None or last is None:
+            return None
+        page, regions = view
+        last_page, last_regions = last
+        if page != last_page or len(regions) != len(last_regions):
+            return None
+        return [rect.union(last_rect)
+                for (rect, state), (last_rect, last_state) in zip(regions, last_regions)
+                if state != last_state or rect != last_rect]
+
+    @staticmethod
+    def menu_rect(item_rects: List[pygame.Rect]) -> pygame.Rect:
+        """メニュー項目と左の三角カーソルを含む範囲"""
+        area = item_rects[0].unionall(item_rects[1:])
+        return pygame.Rect(area.x - 24, area.y, area.w + 24, area.h)
+
+    def render_text(self, font: pygame.font.Font, text: str, antialias: bool,
+                    color: Tuple, background: Optional[Tuple] = None) -> pygame.Surface:
+        """font.render のキャッシュ付き版（返すサーフェスは書き換えないこと）"""
+        return self.text_cache.render(font, text, antialias, color, background)
+
+    def cached_layer(self, key: Hashable,
+                     build: Callable[[pygame.Surface], None]) -> pygame.Surface:
+        """
+        key ごとに build(layer) で描いた全画面の静的レイヤーを1度だけ作って使い回す。
+        毎フレームの全画面SRCALPHAサーフェスの確保とアルファ合成が、不透明な1枚の blit になる
+        """
+        layer = self._layers.get(key)
+        if layer is not None:
+            self._layers.move_to_end(key)
+            return layer
+
+        layer = pygame.Surface(self.screen.get_size(), 0, self.screen)
+        build(layer)
+        self._layers[key] = layer
+        if len(self._layers) > self.MAX_LAYERS:
+            self._layers.popitem(last=False)
+        return layer
+
+    def draw_background(self, bg_img: Optional[pygame.Surface], overlay: Tuple,
+                        fill: Tuple = C.black):
+        """背景画像（無ければ fill 一色）に暗幕 overlay (RGBA) を重ねたものを描く"""
+        def build(layer: pygame.Surface):
+            if bg_img:
+                layer.blit(bg_img, (0, 0))
+            else:
+                layer.fill(fill)
+            dim = pygame.Surface(layer.get_size(), pygame.SRCALPHA)
+            dim.fill(overlay)
+            layer.blit(dim, (0, 0))
+
+        key = ("background", bg_img, tuple(overlay), tuple(fill))
+        self.screen.blit(self.cached_layer(key, build), (0, 0))
+
     @staticmethod
     def wrap_text(text: str, font: pygame.font.Font,
                   max_width: int) -> List[str]:
@@ -41,21 +138,14 @@ class BaseScreen:
 
     def draw_placeholder(self, title: str, bg_img: Optional[pygame.Surface]):
         """汎用プレースホルダー画面（未実装場所用）"""
-        if bg_img:
-            self.screen.blit(bg_img, (0, 0))
-            overlay = pygame.Surface((WINDOW.width, WINDOW.height),
-                                     pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 100))
-            self.screen.blit(overlay, (0, 0))
-        else:
-            self.screen.fill(C.black)
-
-        t = self.fonts["title"].render(title, True, C.white)
+        self.draw_background(bg_img, (0, 0, 0, 100))
+
+        t = self.render_text(self.fonts["title"], title, True, C.white)
         self.screen.blit(t, (WINDOW.width // 2 - t.get_width() // 2,
                              WINDOW.height // 2 - 60))
 
-        msg = self.fonts["body"].render("Coming soon...", True, C.parchment_dark)
+        msg = self.render_text(self.fonts["body"], "Coming soon...", True, C.parchment_dark)
         self.screen.blit(msg, (WINDOW.width // 2 - msg.get_width() // 2,
                                WINDOW.height // 2))
 
-        self.btn_back.draw(self.screen, self.fonts["body"])
+        self.btn_back.draw(self.screen, self.fonts["body"], self.text_cache)
@@ -0,0 +1,114 @@
+import bisect
+import pygame
+from typing import Dict, List
+
+from settings.settings import C
+from screens.base import BaseScreen
+
+
+class ChatLog:
+    """
+    会話ログの吹き出し描画キャッシュ。
+    メッセージごとに話者名と吹き出しを1枚のサーフェスに描いておき、
+    文面が変わったメッセージ（ストリーミング中の応答など）だけを描き直す。
+    描画はスクロール位置から見えている範囲の吹き出しだけを貼る
+    """
+
+    SPEAKER_H = 18
+    BUBBLE_PAD = 10
+    GAP = 10
+
+    def __init__(self, fonts: Dict, width: int):
+        """
+        Args:
+            fonts: 画面共通のフォント（"body" を本文、"small" を話者名に使う）
+            width: 会話エリアの幅
+        """
+        self.fonts = fonts
+        self.width = width
+        self.max_text_w = width - 80
+
+        # メッセージごとのキャッシュ（描いたときのメッセージと文面、サーフェス）
+        self._msgs: List[Dict] = []
+        self._texts: List[str] = []
+        self._surfaces: List[pygame.Surface] = []
+        # _tops[i] はメッセージ i の上端（ログ先頭から）。末尾は全体の高さ
+        self._tops: List[int] = [0]
+
+    @property
+    def height(self) -> int:
+        """全メッセージを並べたときの高さ"""
+        return self._tops[-1]
+
+    def sync(self, messages: List[Dict]):
+        """messages に合わせてキャッシュを更新する（変わったメッセージだけ描き直す）"""
+        first_changed = None
+        for i, msg in enumerate(messages):
+            if (i < len(self._msgs) and self._msgs[i] is msg
+                    and self._texts[i] == msg['text']):
+                continue
+            surface = self._render(msg)
+            if i < len(self._msgs):
+                self._msgs[i], self._texts[i], self._surfaces[i] = msg, msg['text'], surface
+            else:
+                self._msgs.append(msg)
+                self._texts.append(msg['text'])
+                self._surfaces.append(surface)
+            if first_changed is None:
+                first_changed = i
+
+        if len(self._msgs) > len(messages):
+            del self._msgs[len(messages):]
+            del self._texts[len(messages):]
+            del self._surfaces[len(messages):]
+            first_changed = min(first_changed if first_changed is not None else len(messages),
+                                len(messages))
+
+        if first_changed is not None:
+            # 変わった位置より後ろの上端だけを計算し直す
+            del self._tops[first_changed + 1:]
+            for surface in self._surfaces[first_changed:]:
+                self._tops.append(self._tops[-1] + surface.get_height() + self.GAP)
+
+    def draw(self, screen: pygame.Surface, x: int, y: int, view: pygame.Rect):
+        """ログ先頭を (x, y) に置いたとき、view（画面上の表示範囲）に入る吹き出しだけを描く"""
+        view_top = view.top - y
+        view_bottom = view.bottom - y
+        first = max(0, bisect.bisect_right(self._tops, view_top) - 1)
+        for i in range(first, len(self._surfaces)):
+            top = self._tops[i]
+            if top >= view_bottom:
+                break
+            screen.blit(self._surfaces[i], (x, y + top))
+
+    def _render(self, msg: Dict) -> pygame.Surface:
+        """話者名と吹き出しを1枚に描く（幅は会話エリア全体、透明な背景）"""
+        font = self.fonts["body"]
+        pad = self.BUBBLE_PAD
+        lines = BaseScreen.wrap_text(msg['text'], font, self.max_text_w)
+        line_h = font.get_linesize()
+        bubble_h = len(lines) * line_h + pad * 2 + 4
+        bubble_w = min(self.max_text_w + pad * 2,
+                       max(font.size(l)[0] for l in lines) + pad * 2)
+
+        surface = pygame.Surface((self.width, self.SPEAKER_H + bubble_h), pygame.SRCALPHA)
+        if msg['is_user']:
+            bx = self.width - bubble_w - 8
+            bg_color = C.user_bg
+            sp = self.fonts["small"].render("You", True, C.parchment_dark)
+            surface.blit(sp, (bx + bubble_w - sp.get_width(), 0))
+        else:
+            bx = 8
+            bg_color = C.npc_bg
+            sp = self.fonts["small"].render(msg['speaker'], True, C.gold)
+            surface.blit(sp, (bx, 0))
+
+        bubble_rect = pygame.Rect(bx, self.SPEAKER_H, bubble_w, bubble_h)
+        pygame.draw.rect(surface, bg_color, bubble_rect, border_radius=8)
+        pygame.draw.rect(surface, C.wood, bubble_rect, 1, border_radius=8)
+
+        ty = self.SPEAKER_H + pad
+        for line in lines:
+            surface.blit(font.render(line, True, C.charcoal), (bx + pad, ty))
+            ty += line_h
+        return surface
@@ -24,5 +24,8 @@ class LodgeScreen(BaseScreen):
                 return "village"
         return None
 
+    def view_state(self):
+        return ("placeholder", [(self.btn_back.rect, self.btn_back.appearance())])
+
     def draw(self):
         self.draw_placeholder("Lodge", self.assets.get("lodge_img"))
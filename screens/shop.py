@@ -250,6 +250,28 @@ class ShopScreen(BaseScreen):
 
     # ---------- 描画 ----------
 
+    def is_animating(self) -> bool:
+        # 購入メッセージはフレーム数で消える
+        return self.message_timer > 0
+
+    def view_state(self):
+        back = (self.btn_back.rect, self.btn_back.appearance())
+        if self.state == self.ST_CATEGORY:
+            return ((self.state, self.gold, self.message),
+                    [(self.menu_rect(self._get_category_rects()), self.category_selected),
+                     (self.MENU_DESC_RECT, self.category_selected), back])
+
+        # アイテム一覧（カーソルを含む行の範囲）と詳細パネルは選択中のアイテムで描き換わる
+        page = (self.state, self.category_selected, self.item_scroll, self.gold, self.message)
+        rows = pygame.Rect(40, 140, WINDOW.width - 80, self.items_visible * 44)
+        detail = pygame.Rect(60, WINDOW.height - 160, WINDOW.width - 120, 100)
+        regions = [(rows, self.item_selected), (detail, self.item_selected), back]
+        if self.state == self.ST_CONFIRM:
+            page += (self.item_selected,)
+            regions = [(rect, self.confirm_selected) for rect in self._get_confirm_rects()]
+            regions.append(back)
+        return (page, regions)
+
     def draw(self):
         # メッセージタイマー更新
         if self.message_timer > 0:
@@ -257,28 +279,20 @@ class ShopScreen(BaseScreen):
             if self.message_timer <= 0:
                 self.message = ""
 
-        shop_imgg = self.assets.get("shop_img")
-        if shop_imgg:
-            self.screen.blit(shop_imgg, (0, 0))
-            overlay = pygame.Surface((WINDOW.width, WINDOW.height),
-                                     pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 80))
-            self.screen.blit(overlay, (0, 0))
-        else:
-            self.screen.fill(C.black)
+        self.draw_background(self.assets.get("shop_img"), (0, 0, 0, 80))
 
         # タイトル（左寄せ、Village風）
-        title = self.fonts["title"].render("Shop", True, C.white)
+        title = self.render_text(self.fonts["title"], "Shop", True, C.white)
         self.screen.blit(title, (100, 180))
 
         # 所持金表示
         gold_str = f"Gold: {self.gold:,}"
-        gold_surf = self.fonts["header"].render(gold_str, True, C.gold)
+        gold_surf = self.render_text(self.fonts["header"], gold_str, True, C.gold)
         self.screen.blit(gold_surf, (100, 600))
 
         # 戻るボタン
         self.btn_back.text = "< Village" if self.state == self.ST_CATEGORY else "< Back"
-        self.btn_back.draw(self.screen, self.fonts["body"])
+        self.btn_back.draw(self.screen, self.fonts["body"], self.text_cache)
 
         if self.state == self.ST_CATEGORY:
             self._draw_category()
@@ -295,8 +309,8 @@ class ShopScreen(BaseScreen):
             self._draw_message()
 
     def _draw_category(self):
-        sub = self.fonts["small"].render("What would you like to buy?",
-                                         True, C.parchment_dark)
+        sub = self.render_text(self.fonts["small"], "What would you like to buy?",
+                               True, C.parchment_dark)
         self.screen.blit(sub, (100, 220))
 
         rects = self._get_category_rects()
@@ -315,7 +329,7 @@ class ShopScreen(BaseScreen):
                 ])
 
             # テキスト
-            name_surf = self.fonts["village"].render(cat["Category"], True, color)
+            name_surf = self.render_text(self.fonts["village"], cat["Category"], True, color)
             self.screen.blit(name_surf, (rect.x, rect.y + 8))
 
         # 選択中カテゴリの説明文
@@ -323,12 +337,13 @@ class ShopScreen(BaseScreen):
         desc_x = 500
         desc_y = 400
         for line in self.wrap_text(cat["Description"], self.fonts["body"], 500):
-            desc_surf = self.fonts["body"].render(line, True, C.parchment)
+            desc_surf = self.render_text(self.fonts["body"], line, True, C.parchment)
             self.screen.blit(desc_surf, (desc_x, desc_y))
             desc_y += 24
 
         # 操作ヒント
-        hint = self.fonts["small"].render(
+        hint = self.render_text(
+            self.fonts["small"],
             "Up/Down to select  |  Enter or Click to confirm  |  Esc to go back",
             True, C.parchment_dark)
         self.screen.blit(hint, (100, WINDOW.height - 60))
@@ -336,7 +351,8 @@ class ShopScreen(BaseScreen):
     def _draw_item_list(self):
         # カテゴリ名表示
         cat = self.categories[self.category_selected]
-        cat_label = self.fonts["body"].render(
+        cat_label = self.render_text(
+            self.fonts["body"],
             f"Buy {cat['Category']}", True, C.parchment_dark)
         self.screen.blit(cat_label, (60, 70))
 
@@ -351,7 +367,7 @@ class ShopScreen(BaseScreen):
         col_price_x = hx + 560
         col_desc_x = hx + 680
 
-        self.screen.blit(self.fonts["small"].render("Name", True, C.gold),
+        self.screen.blit(self.render_text(self.fonts["small"], "Name", True, C.gold),
                          (col_name_x, hy + 4))
 
         # カテゴリに応じたステータスヘッダー
@@ -361,11 +377,11 @@ class ShopScreen(BaseScreen):
             stat_header = "DEF"
         else:
             stat_header = "Stats"
-        self.screen.blit(self.fonts["small"].render(stat_header, True, C.gold),
+        self.screen.blit(self.render_text(self.fonts["small"], stat_header, True, C.gold),
                          (col_stat_x, hy + 4))
-        self.screen.blit(self.fonts["small"].render("Price", True, C.gold),
+        self.screen.blit(self.render_text(self.fonts["small"], "Price", True, C.gold),
                          (col_price_x, hy + 4))
-        self.screen.blit(self.fonts["small"].render("Description", True, C.gold),
+        self.screen.blit(self.render_text(self.fonts["small"], "Description", True, C.gold),
                          (col_desc_x, hy + 4))
 
         # アイテム一覧
@@ -405,7 +421,7 @@ class ShopScreen(BaseScreen):
             text_color = C.gold if selected else C.parchment
 
             # Name
-            name_surf = self.fonts["body"].render(item["Name"], True, text_color)
+            name_surf = self.render_text(self.fonts["body"], item["Name"], True, text_color)
             self.screen.blit(name_surf, (col_name_x, ry + 10))
 
             # Stats
@@ -422,19 +438,19 @@ class ShopScreen(BaseScreen):
                         parts.append(f"{s}+{v}")
                 stat_str = " ".join(parts) if parts else "-"
 
-            stat_surf = self.fonts["stat"].render(stat_str, True, C.green)
+            stat_surf = self.render_text(self.fonts["stat"], stat_str, True, C.green)
             self.screen.blit(stat_surf, (col_stat_x, ry + 12))
 
             # Price
             price = item.get("Price", 0)
             affordable = self.gold >= price
             price_color = C.gold if affordable else C.red
-            price_surf = self.fonts["stat"].render(f"{price:,}G", True, price_color)
+            price_surf = self.render_text(self.fonts["stat"], f"{price:,}G", True, price_color)
             self.screen.blit(price_surf, (col_price_x, ry + 12))
 
             # Description (truncated)
             desc = item.get("Description", "")
-            desc_surf = self.fonts["small"].render(desc, True, C.parchment_dark)
+            desc_surf = self.render_text(self.fonts["small"], desc, True, C.parchment_dark)
             # clip description to available space
             desc_area = pygame.Rect(col_desc_x, ry, WINDOW.width - col_desc_x - 70, row_h)
             self.screen.set_clip(desc_area)
@@ -445,11 +461,11 @@ class ShopScreen(BaseScreen):
         total = len(self.items)
         if total > self.items_visible:
             if self.item_scroll > 0:
-                up_surf = self.fonts["small"].render("^ more items above ^", True, C.parchment_dark)
+                up_surf = self.render_text(self.fonts["small"], "^ more items above ^", True, C.parchment_dark)
                 self.screen.blit(up_surf, (WINDOW.width // 2 - up_surf.get_width() // 2,
                                             start_y - 18))
             if self.item_scroll + self.items_visible < total:
-                down_surf = self.fonts["small"].render("v more items below v", True, C.parchment_dark)
+                down_surf = self.render_text(self.fonts["small"], "v more items below v", True, C.parchment_dark)
                 self.screen.blit(down_surf, (WINDOW.width // 2 - down_surf.get_width() // 2,
                                               start_y + self.items_visible * row_h + 4))
 
@@ -458,7 +474,8 @@ class ShopScreen(BaseScreen):
             self._draw_item_detail(self.items[self.item_selected], cat["Category"])
 
         # 操作ヒント
-        hint = self.fonts["small"].render(
+        hint = self.render_text(
+            self.fonts["small"],
             "Up/Down to select  |  Enter or Click to buy  |  Esc to go back",
             True, C.parchment_dark)
         self.screen.blit(hint, (60, WINDOW.height - 30))
@@ -477,34 +494,34 @@ class ShopScreen(BaseScreen):
         y = panel_rect.y + 10
 
         # アイテム名
-        name_surf = self.fonts["header"].render(item["Name"], True, C.gold)
+        name_surf = self.render_text(self.fonts["header"], item["Name"], True, C.gold)
         self.screen.blit(name_surf, (x, y))
 
         # 価格
-        price_surf = self.fonts["body"].render(f"{item.get('Price', 0):,} Gold",
-                                                  True, C.gold)
+        price_surf = self.render_text(self.fonts["body"], f"{item.get('Price', 0):,} Gold",
+                                      True, C.gold)
         self.screen.blit(price_surf, (x + 400, y))
 
         y += 30
 
         # ステータス
         if category == "Weapon":
-            stat_surf = self.fonts["body"].render(f"ATK +{item.get('ATK', 0)}", True, C.green)
+            stat_surf = self.render_text(self.fonts["body"], f"ATK +{item.get('ATK', 0)}", True, C.green)
             self.screen.blit(stat_surf, (x, y))
         elif category == "Armor":
-            stat_surf = self.fonts["body"].render(f"DEF +{item.get('DEF', 0)}", True, C.green)
+            stat_surf = self.render_text(self.fonts["body"], f"DEF +{item.get('DEF', 0)}", True, C.green)
             self.screen.blit(stat_surf, (x, y))
         else:
             sx = x
             for s in ("HP", "ATK", "DEF", "WIS", "LUC", "AGI"):
                 v = item.get(s, 0)
                 if v:
-                    ss = self.fonts["stat"].render(f"{s}+{v}", True, C.green)
+                    ss = self.render_text(self.fonts["stat"], f"{s}+{v}", True, C.green)
                     self.screen.blit(ss, (sx, y))
                     sx += 70
 
         # 説明
-        desc_surf = self.fonts["body"].render(item.get("Description", ""), True, C.parchment)
+        desc_surf = self.render_text(self.fonts["body"], item.get("Description", ""), True, C.parchment)
         self.screen.blit(desc_surf, (x, y + 24))
 
     def _draw_confirm(self):
@@ -525,20 +542,20 @@ class ShopScreen(BaseScreen):
         item = self.items[self.item_selected]
 
         # タイトル
-        title = self.fonts["header"].render("Purchase?", True, C.gold)
+        title = self.render_text(self.fonts["header"], "Purchase?", True, C.gold)
         self.screen.blit(title, (dx + dw // 2 - title.get_width() // 2, dy + 20))
 
         # アイテム名と価格
-        name_surf = self.fonts["body"].render(item["Name"], True, C.parchment)
+        name_surf = self.render_text(self.fonts["body"], item["Name"], True, C.parchment)
         self.screen.blit(name_surf, (dx + dw // 2 - name_surf.get_width() // 2, dy + 55))
 
         price = item.get("Price", 0)
-        price_surf = self.fonts["body"].render(f"{price:,} Gold", True, C.gold)
+        price_surf = self.render_text(self.fonts["body"], f"{price:,} Gold", True, C.gold)
         self.screen.blit(price_surf, (dx + dw // 2 - price_surf.get_width() // 2, dy + 80))
 
         affordable = self.gold >= price
         if not affordable:
-            warn = self.fonts["small"].render("Not enough gold!", True, C.red)
+            warn = self.render_text(self.fonts["small"], "Not enough gold!", True, C.red)
             self.screen.blit(warn, (dx + dw // 2 - warn.get_width() // 2, dy + 108))
 
         # Yes / No ボタン
@@ -555,13 +572,13 @@ class ShopScreen(BaseScreen):
             pygame.draw.rect(self.screen, bg, rect, border_radius=6)
             pygame.draw.rect(self.screen, C.gold if selected else C.wood_dark,
                              rect, 2, border_radius=6)
-            txt = self.fonts["body"].render(label, True, C.charcoal)
+            txt = self.render_text(self.fonts["body"], label, True, C.charcoal)
             self.screen.blit(txt, (rect.x + rect.w // 2 - txt.get_width() // 2,
                                    rect.y + rect.h // 2 - txt.get_height() // 2))
 
     def _draw_message(self):
         """購入結果メッセージ"""
-        msg_surf = self.fonts["header"].render(self.message, True, C.white)
+        msg_surf = self.render_text(self.fonts["header"], self.message, True, C.white)
         msg_w = msg_surf.get_width() + 40
         msg_h = 40
         msg_x = WINDOW.width // 2 - msg_w // 2
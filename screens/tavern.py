@@ -1,10 +1,18 @@
 import pygame
+import os
 import threading
 from typing import Dict, List, Optional
 
 from Phi2DialogueSimulatour import Phi2DialogueSimulator
-from settings.settings import DIALOGUE, WINDOW, LAYOUT, PORTRAIT, C, UIButton
+from dialogue_session import DialogueSession
+from backends import DialogueBackend, GenerationCancelled, create_backend
+from response_cache import ResponseCache
+from verdict_head import VerdictHead
+from memory_manager import MemoryManager
+from telemetry import JsonlSink, RingBufferSink, Telemetry
+from settings.settings import DIALOGUE, INFERENCE, WINDOW, LAYOUT, PORTRAIT, C, UIButton
 from screens.base import BaseScreen
+from screens.chat_log import ChatLog
 
 
 class TavernScreen(BaseScreen):
@@ -16,23 +24,43 @@ class TavernScreen(BaseScreen):
     ST_GREETING = "greeting"
     ST_TALKING = "talking"
     ST_GENERATING = "generating"
+    ST_STREAMING = "streaming"
     ST_JUDGING = "judging"
     ST_VERDICT = "verdict"
+    ST_ERROR = "error"
 
-    _INTERACTIVE_STATES = {ST_WAITING, ST_GREETING, ST_TALKING, ST_VERDICT}
+    _INTERACTIVE_STATES = {ST_WAITING, ST_GREETING, ST_TALKING, ST_VERDICT, ST_ERROR}
+    # 推論中でも画面を離れる・次のキャラクターに移れる（実行中の推論は中断する）
+    _CANCELLABLE_STATES = {ST_GENERATING, ST_STREAMING, ST_JUDGING}
+
+    # 判定結果のフェードインが終わるフレーム数（不透明度 6/フレームで 200 に達する）
+    VERDICT_FADE_FRAMES = 34
+
+    GREETING_MSG = ("Hello! I'm looking for companions. "
+                    "Can you tell me about yourself and your abilities?")
 
     def __init__(self, screen: pygame.Surface, fonts: Dict, assets: Dict):
         super().__init__(screen, fonts, assets)
 
         self.state = self.ST_LOADING
+        self._active = False  # 酒場画面を表示中か
 
-        # 対話状態
+        # モデルのアイドル退避（読み込み後に作る）
+        self.memory: Optional[MemoryManager] = None
+
+        # 対話状態（会話履歴とKVキャッシュのキーはセッションが持つ）
+        self.session: Optional[DialogueSession] = None
         self.character: Optional[Dict] = None
         self.turn_count = 0
         self.messages: List[Dict] = []
         self.input_text = ""
         self.scroll_offset = 0
         self.max_scroll = 0
+        self.chat_log = ChatLog(fonts, LAYOUT.right_panel_w - LAYOUT.padding * 2)
+
+        # 判定結果の大きな文字（フレームごとに作るとフォント検索が走り、テキストキャッシュも効かない）
+        path = pygame.font.match_font("notosans") or pygame.font.match_font("dejavusans")
+        self.verdict_font = pygame.font.Font(path, 64) if path else pygame.font.Font(None, 72)
 
         # 判定結果
         self.verdict_result: Optional[bool] = None
@@ -42,6 +70,14 @@ class TavernScreen(BaseScreen):
 
         # AI応答スレッド
         self._ai_busy = False
+        self.error_message = ""
+
+        # 次キャラクターの先行生成（判定表示中・待機中にバックグラウンドで準備）
+        self._prepared: Optional[Dict] = None
+        self._prepare_session: Optional[DialogueSession] = None  # 準備中の生成のセッション
+        self._preparing = False
+        self._prepare_epoch = 0
+        self._prepare_lock = threading.Lock()
 
         # ボタン
         self.btn_new = UIButton(
@@ -60,31 +96,150 @@ class TavernScreen(BaseScreen):
 
         # Simulator
         self.simulator: Optional[Phi2DialogueSimulator] = None
+        self._loading = False
+
+        # 推論テレメトリ（直近のイベントはデバッグ表示用にメモリに残す）
+        self.telemetry_events = RingBufferSink()
+        self.telemetry = Telemetry(self.telemetry_events)
+        path = self._project_path(INFERENCE.telemetry_path)
+        if path:
+            self.telemetry.add_sink(JsonlSink(path))
 
     def enter(self):
         """画面に入ったときの処理"""
+        self._active = True
+        if self.memory:
+            self.memory.enter()  # 退避済みならバックグラウンドで読み込み直す
         if self.simulator:
             self.state = self.ST_WAITING
+            self._start_prepare()
         else:
             self.state = self.ST_LOADING
-            threading.Thread(target=self._load_simulator,
-                             daemon=True).start()
+            self.preload()
+
+    def preload(self):
+        """モデルの読み込みをバックグラウンドで開始する（読み込み中・済みなら何もしない）"""
+        if self.simulator or self._loading:
+            return
+        self._loading = True
+        self._spawn(self._load_simulator)
 
     def _load_simulator(self):
-        self.simulator = Phi2DialogueSimulator(use_gpu=True)
+        try:
+            self.simulator = Phi2DialogueSimulator(
+                backend=self._make_backend(),
+                response_cache=self._make_response_cache(),
+                prompt_budget=INFERENCE.prompt_budget,
+                telemetry=self.telemetry,
+                verdict_head=self._load_verdict_head())
+            self.memory = MemoryManager(self.simulator.backend,
+                                        idle_seconds=INFERENCE.idle_unload_s,
+                                        rss_budget_mb=INFERENCE.rss_budget_mb,
+                                        telemetry=self.telemetry)
+            if self._active:
+                self.memory.enter()
+        finally:
+            self._loading = False
         self.state = self.ST_WAITING
+        if self._active:
+            # 起動時の先読みでは準備しない（村にいる間に推論を走らせない。酒場に入ったときに始める）
+            self._start_prepare()
+
+    def _spawn(self, fn):
+        """AI処理をバックグラウンドで実行する（失敗したらエラー状態にする）"""
+        def run():
+            try:
+                fn()
+            except GenerationCancelled:
+                pass  # 画面遷移・キャラクター切り替えで中断された（結果は捨てる）
+            except Exception as e:
+                self._fail(e)
+            finally:
+                self.wake()  # 結果（状態の変化）を描かせる
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _fail(self, error: Exception):
+        """推論の失敗（ワーカープロセスの異常終了を含む）をエラー状態として表示する"""
+        print(f"Inference error: {error}")
+        self._discard_prepared()
+        self.error_message = str(error)
+        self._ai_busy = False
+        self.state = self.ST_ERROR
+
+    def _restart_simulator(self):
+        """エラー後にバックエンドを作り直す"""
+        if self.memory:
+            self.memory.close()
+            self.memory = None
+        if self.simulator and hasattr(self.simulator.backend, "close"):
+            self.simulator.backend.close()
+        self.simulator = None
+        self.error_message = ""
+        self.session = None
+        self.character = None
+        self.messages = []
+        self.state = self.ST_LOADING
+        self.preload()
+
+    def leave(self):
+        """画面を離れるときの処理（実行中の推論は中断し、会話と先行生成の結果は破棄）"""
+        self._discard_prepared()
+        self._end_conversation()
+        self._active = False
+        if self.memory:
+            self.memory.leave()
+
+    @staticmethod
+    def _make_backend() -> DialogueBackend:
+        options = {}
+        if INFERENCE.backend == "hf":
+            options = dict(use_gpu=INFERENCE.use_gpu,
+                           quantize=INFERENCE.quantize,
+                           draft_model=INFERENCE.draft_model,
+                           snapshot_dir=TavernScreen._project_path(INFERENCE.snapshot_dir))
+        elif INFERENCE.backend == "onnx":
+            options = dict(use_gpu=INFERENCE.use_gpu,
+                           export_dir=TavernScreen._project_path(INFERENCE.onnx_export_dir))
+
+        if INFERENCE.out_of_process:
+            return create_backend("process", kind=INFERENCE.backend, **options)
+        return create_backend(INFERENCE.backend, **options)
+
+    @staticmethod
+    def _make_response_cache() -> Optional[ResponseCache]:
+        if INFERENCE.response_cache_size <= 0:
+            return None
+        path = TavernScreen._project_path(INFERENCE.response_cache_path)
+        return ResponseCache(INFERENCE.response_cache_size, path)
+
+    @staticmethod
+    def _load_verdict_head() -> Optional[VerdictHead]:
+        path = TavernScreen._project_path(INFERENCE.verdict_head)
+        if not path or not os.path.exists(path):
+            return None
+        head = VerdictHead.load(path)
+        print(f"✓ Loaded verdict head ({head.hidden_size} dims)")
+        return head
+
+    @staticmethod
+    def _project_path(rel_path: Optional[str]) -> Optional[str]:
+        """設定の相対パスをプロジェクトルート基準の絶対パスにする"""
+        if not rel_path:
+            return None
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_dir, rel_path)
 
     # ---------- イベント処理 ----------
 
     def handle_event(self, event: pygame.event.Event) -> Optional[str]:
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             pos = event.pos
+            self._update_buttons()
             if self.btn_back.clicked(pos):
-                if self.state in self._INTERACTIVE_STATES:
-                    return "village"
+                return "village"
             elif self.btn_new.clicked(pos):
-                if self.state in self._INTERACTIVE_STATES:
-                    self._new_character()
+                self._new_character()
             elif self.btn_send.clicked(pos):
                 self._send_message()
 
@@ -95,7 +250,7 @@ class TavernScreen(BaseScreen):
 
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
-                if self.state in self._INTERACTIVE_STATES:
+                if self._can_interrupt():
                     return "village"
             elif self.state in (self.ST_GREETING, self.ST_TALKING):
                 if event.key == pygame.K_RETURN:
@@ -108,8 +263,22 @@ class TavernScreen(BaseScreen):
 
         return None
 
+    def _can_interrupt(self) -> bool:
+        return self.state in self._INTERACTIVE_STATES or self.state in self._CANCELLABLE_STATES
+
+    def _update_buttons(self):
+        """戻る・次のキャラクターは中断できる状態でだけ押せる（状態は推論スレッドでも変わる）"""
+        self.btn_new.enabled = self.btn_back.enabled = self._can_interrupt()
+
     # ---------- 描画 ----------
 
+    def is_animating(self) -> bool:
+        # 読み込み中の「...」、入力欄のカーソル点滅、判定結果のフェードイン。
+        # 推論中の表示はスレッドが wake() で描き直させるため、ここでは描き続けない
+        if self.state in (self.ST_LOADING, self.ST_GREETING, self.ST_TALKING):
+            return True
+        return self.state == self.ST_VERDICT and self.verdict_frame < self.VERDICT_FADE_FRAMES
+
     def draw(self):
         if self.state == self.ST_LOADING:
             self._draw_loading_screen()
@@ -122,40 +291,43 @@ class TavernScreen(BaseScreen):
             self._draw_turn_counter()
             self._draw_status_bar()
 
-            self.btn_new.enabled = self.state in self._INTERACTIVE_STATES
-            self.btn_new.draw(self.screen, self.fonts["body"])
-
-            if self.state in self._INTERACTIVE_STATES:
-                self.btn_back.draw(self.screen, self.fonts["body"])
+            self._update_buttons()
+            self.btn_new.draw(self.screen, self.fonts["body"], self.text_cache)
+            if self.btn_back.enabled:
+                self.btn_back.draw(self.screen, self.fonts["body"], self.text_cache)
 
             self._draw_verdict_overlay()
 
     # ---------- タバーン描画メソッド ----------
 
     def _draw_background(self):
+        # 背景・左右パネル・タイトルバーは変わらないため、合成済みの1枚を貼る
+        self.screen.blit(self.cached_layer("background", self._build_background), (0, 0))
+
+    def _build_background(self, layer: pygame.Surface):
         bg_img = self.assets.get("tavern_img")
         if bg_img:
-            self.screen.blit(bg_img, (0, 0))
+            layer.blit(bg_img, (0, 0))
         else:
-            self.screen.fill(C.wood)
+            layer.fill(C.wood)
 
         left_bg = pygame.Surface((LAYOUT.left_panel_w, WINDOW.height), pygame.SRCALPHA)
         left_bg.fill((*C.wood_dark, 180))
-        self.screen.blit(left_bg, (0, 0))
+        layer.blit(left_bg, (0, 0))
 
         right_bg = pygame.Surface((LAYOUT.right_panel_w, WINDOW.height), pygame.SRCALPHA)
         right_bg.fill((*C.wood_dark, 120))
-        self.screen.blit(right_bg, (LAYOUT.left_panel_w, 0))
+        layer.blit(right_bg, (LAYOUT.left_panel_w, 0))
 
-        pygame.draw.line(self.screen, C.gold_dim,
+        pygame.draw.line(layer, C.gold_dim,
                          (LAYOUT.left_panel_w, 0), (LAYOUT.left_panel_w, WINDOW.height), 2)
 
         title_rect = pygame.Rect(0, 0, WINDOW.width, 70)
-        pygame.draw.rect(self.screen, C.wood_dark, title_rect)
-        pygame.draw.line(self.screen, C.gold,
+        pygame.draw.rect(layer, C.wood_dark, title_rect)
+        pygame.draw.line(layer, C.gold,
                          (0, 70), (WINDOW.width, 70), 2)
-        title = self.fonts["title"].render("Tavern Recruitment", True, C.gold)
-        self.screen.blit(title, (WINDOW.width // 2 - title.get_width() // 2, 8))
+        title = self.render_text(self.fonts["title"], "Tavern Recruitment", True, C.gold)
+        layer.blit(title, (WINDOW.width // 2 - title.get_width() // 2, 8))
 
     def _draw_portrait(self):
         x = LAYOUT.left_panel_w // 2 - PORTRAIT.width // 2
@@ -174,14 +346,15 @@ class TavernScreen(BaseScreen):
             pygame.draw.rect(self.screen, C.grey, frame, 2, border_radius=4)
             placeholder = pygame.Surface((PORTRAIT.width, PORTRAIT.height))
             placeholder.fill(C.wood_dark)
-            q = self.fonts["title"].render("?", True, C.grey)
+            q = self.render_text(self.fonts["title"], "?", True, C.grey)
             placeholder.blit(q, (PORTRAIT.width // 2 - q.get_width() // 2,
                                  PORTRAIT.height // 2 - q.get_height() // 2))
             self.screen.blit(placeholder, (x, y))
 
     def _draw_character_info(self):
         if not self.character:
-            hint = self.fonts["body"].render(
+            hint = self.render_text(
+                self.fonts["body"],
                 'Click "New Character" to begin.', True, C.parchment)
             self.screen.blit(hint, (LAYOUT.right_panel_x + LAYOUT.padding, 80))
             return
@@ -190,24 +363,25 @@ class TavernScreen(BaseScreen):
         x = LAYOUT.right_panel_x + LAYOUT.padding
         y = 65
 
-        name_surf = self.fonts["header"].render(ch['name'], True, C.gold)
+        name_surf = self.render_text(self.fonts["header"], ch['name'], True, C.gold)
         self.screen.blit(name_surf, (x, y))
         y += 30
 
         job_str = f"{ch['job']}  ({ch['role']})"
-        job_surf = self.fonts["body"].render(job_str, True, C.parchment)
+        job_surf = self.render_text(self.fonts["body"], job_str, True, C.parchment)
         self.screen.blit(job_surf, (x, y))
         y += 24
 
         pers_str = f"Personality: {ch['personality']} - {ch['personality_desc']}"
         for line in self.wrap_text(pers_str, self.fonts["small"],
                                    LAYOUT.right_panel_w - LAYOUT.padding * 2):
-            surf = self.fonts["small"].render(line, True, C.parchment_dark)
+            surf = self.render_text(self.fonts["small"], line, True, C.parchment_dark)
             self.screen.blit(surf, (x, y))
             y += 18
 
         y += 4
-        wep = self.fonts["small"].render(
+        wep = self.render_text(
+            self.fonts["small"],
             f"Weapon: {ch['weapon']}   |   Abilities: {ch['abilities']}",
             True, C.parchment_dark)
         self.screen.blit(wep, (x, y))
@@ -241,7 +415,7 @@ class TavernScreen(BaseScreen):
                 val_color = C.white
                 val_str = "0"
 
-            txt = self.fonts["stat"].render(f"{label} {val_str}", True, val_color)
+            txt = self.render_text(self.fonts["stat"], f"{label} {val_str}", True, val_color)
             txt_rect = txt.get_rect(center=rect.center)
             self.screen.blit(txt, txt_rect)
 
@@ -260,54 +434,10 @@ class TavernScreen(BaseScreen):
         clip_rect = pygame.Rect(area_x, area_y, area_w, area_h)
         self.screen.set_clip(clip_rect)
 
-        msg_y = area_y + 8 - self.scroll_offset
-        bubble_pad = 10
-        max_text_w = area_w - 80
-
-        total_height = 0
-        for msg in self.messages:
-            lines = self.wrap_text(msg['text'], self.fonts["body"], max_text_w)
-            line_h = self.fonts["body"].get_linesize()
-            bubble_h = len(lines) * line_h + bubble_pad * 2 + 4
-            speaker_h = 18
-
-            if msg['is_user']:
-                bubble_w = min(max_text_w + bubble_pad * 2,
-                               max(self.fonts["body"].size(l)[0] for l in lines)
-                               + bubble_pad * 2)
-                bx = area_x + area_w - bubble_w - 8
-                bg_color = C.user_bg
-                sp = self.fonts["small"].render("You", True, C.parchment_dark)
-                if area_y <= msg_y + total_height <= area_y + area_h:
-                    self.screen.blit(sp, (bx + bubble_w - sp.get_width(),
-                                         msg_y + total_height))
-            else:
-                bubble_w = min(max_text_w + bubble_pad * 2,
-                               max(self.fonts["body"].size(l)[0] for l in lines)
-                               + bubble_pad * 2)
-                bx = area_x + 8
-                bg_color = C.npc_bg
-                name = msg['speaker']
-                sp = self.fonts["small"].render(name, True, C.gold)
-                if area_y <= msg_y + total_height <= area_y + area_h:
-                    self.screen.blit(sp, (bx, msg_y + total_height))
-
-            total_height += speaker_h
-
-            bubble_rect = pygame.Rect(bx, msg_y + total_height,
-                                      bubble_w, bubble_h)
-            pygame.draw.rect(self.screen, bg_color, bubble_rect,
-                             border_radius=8)
-            pygame.draw.rect(self.screen, C.wood, bubble_rect, 1,
-                             border_radius=8)
-
-            ty = msg_y + total_height + bubble_pad
-            for line in lines:
-                txt = self.fonts["body"].render(line, True, C.charcoal)
-                self.screen.blit(txt, (bx + bubble_pad, ty))
-                ty += line_h
-
-            total_height += bubble_h + 10
+        # 吹き出しは文面が変わったものだけ描き直し、見えている範囲だけ貼る
+        self.chat_log.sync(self.messages)
+        self.chat_log.draw(self.screen, area_x, area_y + 8 - self.scroll_offset, clip_rect)
+        total_height = self.chat_log.height
 
         self.max_scroll = max(0, total_height - area_h + 20)
         self.screen.set_clip(None)
@@ -335,12 +465,12 @@ class TavernScreen(BaseScreen):
                          border_radius=4)
 
         if can_type and self.input_text:
-            txt = self.fonts["body"].render(self.input_text, True, C.charcoal)
+            txt = self.render_text(self.fonts["body"], self.input_text, True, C.charcoal)
             self.screen.set_clip(input_rect.inflate(-8, -4))
             self.screen.blit(txt, (ix + 8, iy + 10))
             self.screen.set_clip(None)
         elif can_type:
-            ph = self.fonts["body"].render("Type your message...", True, C.grey)
+            ph = self.render_text(self.fonts["body"], "Type your message...", True, C.grey)
             self.screen.blit(ph, (ix + 8, iy + 10))
 
         if can_type and (pygame.time.get_ticks() // 500) % 2 == 0:
@@ -351,7 +481,7 @@ class TavernScreen(BaseScreen):
 
         self.btn_send.enabled = can_type and len(self.input_text.strip()) > 0
         self.btn_send.rect.topleft = (ix + iw + 10, iy)
-        self.btn_send.draw(self.screen, self.fonts["body"])
+        self.btn_send.draw(self.screen, self.fonts["body"], self.text_cache)
 
     def _draw_turn_counter(self):
         if not self.character or self.state in (self.ST_WAITING, self.ST_LOADING):
@@ -362,7 +492,7 @@ class TavernScreen(BaseScreen):
 
         remaining = max(0, DIALOGUE.max_turns - (self.turn_count - 1))
 
-        label = self.fonts["small"].render("Turns remaining", True, C.parchment_dark)
+        label = self.render_text(self.fonts["small"], "Turns remaining", True, C.parchment_dark)
         self.screen.blit(label, (x - label.get_width() // 2, y))
 
         if remaining >= 3:
@@ -374,7 +504,7 @@ class TavernScreen(BaseScreen):
         else:
             color = C.red
 
-        num = self.fonts["title"].render(str(remaining), True, color)
+        num = self.render_text(self.fonts["title"], str(remaining), True, color)
         self.screen.blit(num, (x - num.get_width() // 2, y + 22))
 
         dot_y = y + 62
@@ -396,21 +526,53 @@ class TavernScreen(BaseScreen):
 
         if self.state == self.ST_LOADING:
             txt = "Loading Phi-2 model... please wait"
+        elif self.state == self.ST_WAITING and self.memory and self.memory.reloading:
+            txt = "Waking up the model..."
         elif self.state == self.ST_WAITING:
             txt = 'Click "New Character" to meet an adventurer'
         elif self.state == self.ST_GENERATING:
             txt = "Thinking..."
+        elif self.state == self.ST_STREAMING:
+            txt = f"{self.character['name']} is speaking..."
         elif self.state == self.ST_JUDGING:
             txt = "Evaluating recruitment..."
         elif self.state == self.ST_VERDICT:
             txt = "Verdict shown. Meet another character?"
+        elif self.state == self.ST_ERROR:
+            txt = f'Inference failed ({self.error_message}). Click "New Character" to restart.'
         else:
             remaining = max(0, DIALOGUE.max_turns - (self.turn_count - 1))
             txt = f"Talk to recruit this character. {remaining} turn(s) left."
 
-        surf = self.fonts["small"].render(txt, True, C.parchment_dark)
+        surf = self.render_text(self.fonts["small"], txt, True, C.parchment_dark)
         self.screen.blit(surf, (LAYOUT.right_panel_x + LAYOUT.padding, WINDOW.height - 32))
 
+        if INFERENCE.debug_overlay:
+            self._draw_debug_overlay()
+
+    def _draw_debug_overlay(self):
+        """直近の生成速度・prefill時間・応答キャッシュとテキストキャッシュのヒット率・RSSをステータスバー右端に表示"""
+        parts = []
+        gen = self.telemetry_events.latest("generate")
+        if gen:
+            if gen.get('tokens_per_s'):
+                parts.append(f"{gen['tokens_per_s']:.1f} tok/s")
+            if gen.get('prefill_s') is not None:
+                parts.append(f"prefill {gen['prefill_s'] * 1000:.0f}ms")
+        cache = self.simulator.response_cache if self.simulator else None
+        if cache is not None and cache.hits + cache.misses:
+            parts.append(f"cache {cache.hits / (cache.hits + cache.misses):.0%}")
+        if self.memory and self.memory.last_rss_mb is not None:
+            parts.append(f"RSS {self.memory.last_rss_mb:.0f}MB")
+        if self.text_cache.hits + self.text_cache.misses:
+            parts.append(f"text {self.text_cache.hit_rate:.0%}")
+        if not parts:
+            return
+
+        surf = self.render_text(self.fonts["small"], " | ".join(parts), True, C.gold_dim)
+        self.screen.blit(surf, (WINDOW.width - LAYOUT.padding - surf.get_width(),
+                                WINDOW.height - 32))
+
     def _draw_verdict_overlay(self):
         if self.state != self.ST_VERDICT:
             return
@@ -430,51 +592,38 @@ class TavernScreen(BaseScreen):
         self.screen.blit(overlay, (0, 0))
 
         if self.verdict_frame > 15:
-            big_font = pygame.font.Font(
-                pygame.font.match_font("notosans") or
-                pygame.font.match_font("dejavusans"),
-                64) if pygame.font.match_font("notosans") or \
-                       pygame.font.match_font("dejavusans") \
-                else pygame.font.Font(None, 72)
-
-            txt = big_font.render(main_text, True, C.white)
+            txt = self.render_text(self.verdict_font, main_text, True, C.white)
             tx = WINDOW.width // 2 - txt.get_width() // 2
             ty = WINDOW.height // 2 - 60
             self.screen.blit(txt, (tx, ty))
 
             prob_str = f"YES: {self.verdict_prob:.1%}   |   {self.verdict_details.get('decision_type', '')}"
-            prob = self.fonts["header"].render(prob_str, True, C.white)
+            prob = self.render_text(self.fonts["header"], prob_str, True, C.white)
             self.screen.blit(prob,
                              (WINDOW.width // 2 - prob.get_width() // 2,
                               ty + 80))
 
             if self.character:
                 name_str = f"{self.character['name']} the {self.character['job']}"
-                ns = self.fonts["body"].render(name_str, True, C.parchment)
+                ns = self.render_text(self.fonts["body"], name_str, True, C.parchment)
                 self.screen.blit(ns,
                                  (WINDOW.width // 2 - ns.get_width() // 2,
                                   ty + 120))
 
     def _draw_loading_screen(self):
-        bg_img = self.assets.get("tavern_img")
-        if bg_img:
-            self.screen.blit(bg_img, (0, 0))
-            overlay = pygame.Surface((WINDOW.width, WINDOW.height), pygame.SRCALPHA)
-            overlay.fill((*C.wood_dark, 180))
-            self.screen.blit(overlay, (0, 0))
-        else:
-            self.screen.fill(C.wood_dark)
+        self.draw_background(self.assets.get("tavern_img"), (*C.wood_dark, 180), C.wood_dark)
 
-        txt = self.fonts["title"].render("Loading Phi-2 Model...", True, C.gold)
+        txt = self.render_text(self.fonts["title"], "Loading Phi-2 Model...", True, C.gold)
         self.screen.blit(txt, (WINDOW.width // 2 - txt.get_width() // 2,
                                WINDOW.height // 2 - 40))
 
         dots = "." * ((pygame.time.get_ticks() // 500) % 4)
-        d = self.fonts["header"].render(dots, True, C.parchment)
+        d = self.render_text(self.fonts["header"], dots, True, C.parchment)
         self.screen.blit(d, (WINDOW.width // 2 - d.get_width() // 2,
                              WINDOW.height // 2 + 20))
 
-        sub = self.fonts["small"].render(
+        sub = self.render_text(
+            self.fonts["small"],
             "This may take a minute on first run.", True, C.parchment_dark)
         self.screen.blit(sub, (WINDOW.width // 2 - sub.get_width() // 2,
                                WINDOW.height // 2 + 60))
@@ -482,39 +631,127 @@ class TavernScreen(BaseScreen):
     # ---------- ゲームロジック ----------
 
     def _new_character(self):
+        if self.state == self.ST_ERROR:
+            self._restart_simulator()
+            return
         if not self.simulator:
             return
 
-        self.simulator.reset()
-        self.character = self.simulator.create_random_character()
-        self.turn_count = 0
-        self.messages = []
-        self.scroll_offset = 0
-        self.verdict_result = None
-        self.verdict_frame = 0
-        self.input_text = ""
-
+        self._end_conversation()
         self.state = self.ST_GENERATING
         self._ai_busy = True
 
+        with self._prepare_lock:
+            if self._prepared:
+                # 準備済み → 即座に引き渡す
+                self._apply_prepared()
+                return
+            preparing = self._preparing
+        if preparing:
+            # 準備中の生成はストリーミングしないため、待つと何も表示されないままになる。
+            # 破棄して表示中の会話としてストリーミングで生成し直す
+            self._discard_prepared()
+
+        self.character = self.simulator.create_random_character()
+        self.session = session = self.simulator.new_session(self.character)
+        first_msg = self.GREETING_MSG
+        self.messages.append({
+            'speaker': 'You', 'text': first_msg, 'is_user': True})
+
         def gen():
-            first_msg = ("Hello! I'm looking for companions. "
-                         "Can you tell me about yourself and your abilities?")
-            resp = self.simulator.generate_response(
-                first_msg, self.character, is_first_greeting=True)
-            self.simulator.conversation_history.append({
-                'turn': 1, 'user': first_msg, 'ai': resp
-            })
-            self.messages.append({
-                'speaker': 'You', 'text': first_msg, 'is_user': True})
-            self.messages.append({
-                'speaker': self.character['name'],
-                'text': resp, 'is_user': False})
+            resp = self._stream_npc_reply(session, first_msg, is_first_greeting=True)
+            self._check_current(session)  # 応答を受け取った後に会話が替わっていたら何も書き換えない
+            session.add_turn(first_msg, resp, turn=1)
             self.turn_count = 1
             self.state = self.ST_GREETING
             self._ai_busy = False
 
-        threading.Thread(target=gen, daemon=True).start()
+        self._spawn(gen)
+
+    def _end_conversation(self):
+        """表示中の会話を終える（実行中の生成・判定は中断させ、会話の状態を破棄する）"""
+        if self.session:
+            self.session.cancel()
+            self.session.reset()
+        self.session = None
+        self.character = None
+        self.turn_count = 0
+        self.messages = []
+        self.scroll_offset = 0
+        self.verdict_result = None
+        self.verdict_frame = 0
+        self.input_text = ""
+        self._ai_busy = False
+
+    def _check_current(self, session: DialogueSession):
+        """session が表示中の会話でなくなっていたら（中断・破棄済み）以降の処理をやめる"""
+        if session is not self.session:
+            raise GenerationCancelled(f"{session.id} is no longer shown")
+
+    def _start_prepare(self):
+        """次のキャラクターと挨拶をバックグラウンドで生成しておく"""
+        with self._prepare_lock:
+            # 作り直し・読み込み失敗で途中から None になっても使えるよう、ここで取っておく
+            simulator = self.simulator
+            if simulator is None or self._preparing or self._prepared:
+                return
+            self._preparing = True
+            epoch = self._prepare_epoch
+
+        def prepare():
+            # 表示中の会話とは別のセッションで生成する（KVキャッシュを上書きしない）
+            session = simulator.new_session(simulator.create_random_character())
+            with self._prepare_lock:
+                if epoch != self._prepare_epoch:
+                    return  # 破棄済み
+                self._prepare_session = session
+            try:
+                greeting = session.generate_response(self.GREETING_MSG, is_first_greeting=True)
+            except Exception:
+                if epoch != self._prepare_epoch:
+                    return  # 破棄済み（作り直す前のバックエンドの失敗は表示しない）
+                raise
+
+            with self._prepare_lock:
+                if epoch != self._prepare_epoch:
+                    session.reset()
+                    return  # 破棄済み
+                self._prepare_session = None
+                self._preparing = False
+                self._prepared = {'session': session, 'greeting': greeting}
+
+        self._spawn(prepare)
+
+    def _discard_prepared(self):
+        """準備中・準備済みの先行生成を破棄する"""
+        with self._prepare_lock:
+            self._prepare_epoch += 1
+            if self._prepare_session:
+                # 生成中なら次のデコードステップで止める
+                self._prepare_session.cancel()
+                self._prepare_session.reset()
+                self._prepare_session = None
+            if self._prepared:
+                self._prepared['session'].reset()
+            self._prepared = None
+            self._preparing = False
+
+    def _apply_prepared(self):
+        """準備済みのキャラクターと挨拶を会話に反映する（_prepare_lock 保持中に呼ぶ）"""
+        prepared = self._prepared
+        self._prepared = None
+
+        self.session = prepared['session']
+        self.character = self.session.character
+        self.messages = [
+            {'speaker': 'You', 'text': self.GREETING_MSG, 'is_user': True},
+            {'speaker': self.character['name'],
+             'text': prepared['greeting'], 'is_user': False},
+        ]
+        self.session.add_turn(self.GREETING_MSG, prepared['greeting'], turn=1)
+        self.turn_count = 1
+        self.state = self.ST_GREETING
+        self._ai_busy = False
 
     def _send_message(self):
         text = self.input_text.strip()
@@ -534,16 +771,12 @@ class TavernScreen(BaseScreen):
 
         self.scroll_offset = max(0, self.max_scroll + 100)
 
+        session = self.session
+
         def gen():
-            resp = self.simulator.generate_response(text, self.character)
-            self.simulator.conversation_history.append({
-                'turn': self.turn_count,
-                'user': text,
-                'ai': resp
-            })
-            self.messages.append({
-                'speaker': self.character['name'],
-                'text': resp, 'is_user': False})
+            resp = self._stream_npc_reply(session, text)
+            self._check_current(session)  # 応答を受け取った後に会話が替わっていたら何も書き換えない
+            session.add_turn(text, resp, turn=self.turn_count)
             self._ai_busy = False
 
             self.scroll_offset = max(0, self.max_scroll + 200)
@@ -554,18 +787,47 @@ class TavernScreen(BaseScreen):
             else:
                 self.state = self.ST_TALKING
 
-        threading.Thread(target=gen, daemon=True).start()
+        self._spawn(gen)
+
+    def _stream_npc_reply(self, session: DialogueSession, text: str,
+                          is_first_greeting: bool = False) -> str:
+        """NPCの応答をストリーミングで受け取り、吹き出しを伸ばしながら表示する"""
+        name = session.character['name']
+        npc_msg = {'speaker': name, 'text': '', 'is_user': False}
+        raw = ""
+
+        for chunk in session.stream_response(text, is_first_greeting=is_first_greeting):
+            self._check_current(session)
+            raw += chunk
+            partial = raw.strip().split('\n')[0]
+            if not partial:
+                continue
+            if self.state != self.ST_STREAMING:
+                self.messages.append(npc_msg)
+                self.state = self.ST_STREAMING
+            npc_msg['text'] = partial
+            self.scroll_offset = max(0, self.max_scroll + 200)
+            self.wake()
+
+        self._check_current(session)
+        resp = self.simulator._extract_phi2_response(raw, "", name)
+        npc_msg['text'] = resp
+        if self.state != self.ST_STREAMING:
+            self.messages.append(npc_msg)
+        return resp
 
     def _finalize_recruitment(self):
         self.state = self.ST_JUDGING
+        session = self.session
 
         def judge():
-            result, prob, details = self.simulator._classify_companion(
-                self.character)
+            result, prob, details = session.classify()
+            self._check_current(session)
             self.verdict_result = result
             self.verdict_prob = prob
             self.verdict_details = details
             self.verdict_frame = 0
             self.state = self.ST_VERDICT
+            self._start_prepare()
 
-        threading.Thread(target=judge, daemon=True).start()
+        self._spawn(judge)
@@ -0,0 +1,47 @@
+import pygame
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class TextCache:
+    """
+    描画済みテキストのサーフェスキャッシュ（全画面で共有）。
+    (フォント, 文字列, アンチエイリアス, 色, 背景色) をキーに、最後に使われたのが
+    古いものから捨てる。返すサーフェスは共有されるため、呼び出し側で書き換えないこと
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._surfaces: "OrderedDict[tuple, pygame.Surface]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._surfaces)
+
+    def render(self, font: pygame.font.Font, text: str, antialias: bool,
+               color: Tuple, background: Optional[Tuple] = None) -> pygame.Surface:
+        """font.render と同じ引数で、同じ内容なら描画済みのサーフェスを返す"""
+        key = (font, text, antialias, tuple(color),
+               tuple(background) if background is not None else None)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        # pygame はヌル文字を含む文字列を描画できない（入力欄・モデル出力に混ざりうる）
+        surface = font.render(text.replace("\x00", ""), antialias, color, background)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.maxsize:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        self._surfaces.clear()
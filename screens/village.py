@@ -54,24 +54,20 @@ class VillageScreen(BaseScreen):
 
         return None
 
+    def view_state(self):
+        return ("village", [(self.menu_rect(self._get_item_rects()), self.selected),
+                            (self.MENU_DESC_RECT, self.selected)])
+
     def draw(self):
         # 背景
-        village_img = self.assets.get("village_img")
-        if village_img:
-            self.screen.blit(village_img, (0, 0))
-            overlay = pygame.Surface((WINDOW.width, WINDOW.height),
-                                     pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 80))
-            self.screen.blit(overlay, (0, 0))
-        else:
-            self.screen.fill(C.black)
+        self.draw_background(self.assets.get("village_img"), (0, 0, 0, 80))
 
         # タイトル
-        title = self.fonts["title"].render("Village", True, C.white)
+        title = self.render_text(self.fonts["title"], "Village", True, C.white)
         self.screen.blit(title, (100, 180))
 
-        sub = self.fonts["small"].render("Where would you like to go?",
-                                         True, C.parchment_dark)
+        sub = self.render_text(self.fonts["small"], "Where would you like to go?",
+                               True, C.parchment_dark)
         self.screen.blit(sub, (100, 220))
 
         # メニューリスト
@@ -90,7 +86,7 @@ class VillageScreen(BaseScreen):
                     (tri_x, tri_y),
                 ])
 
-            name_surf = self.fonts["village"].render(loc["name"], True, color)
+            name_surf = self.render_text(self.fonts["village"], loc["name"], True, color)
             self.screen.blit(name_surf, (rect.x, rect.y + 8))
 
         # 説明文
@@ -98,12 +94,13 @@ class VillageScreen(BaseScreen):
         desc_x = 500
         desc_y = 400
         for line in self.wrap_text(loc["desc"], self.fonts["body"], 500):
-            desc_surf = self.fonts["body"].render(line, True, C.parchment)
+            desc_surf = self.render_text(self.fonts["body"], line, True, C.parchment)
             self.screen.blit(desc_surf, (desc_x, desc_y))
             desc_y += 24
 
         # 操作ヒント
-        hint = self.fonts["small"].render(
+        hint = self.render_text(
+            self.fonts["small"],
             "Up/Down to select  |  Enter or Click to confirm",
             True, C.parchment_dark)
         self.screen.blit(hint, (100, WINDOW.height - 60))
@@ -1,5 +1,5 @@
 import pygame
-from typing import Dict, List, NamedTuple, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 # ============================================
 # 定数（メモリ効率の良い NamedTuple 構造体）
@@ -7,10 +7,30 @@ from typing import Dict, List, NamedTuple, Tuple
 class DialogueConfig(NamedTuple):
     max_turns: int
 
+class InferenceConfig(NamedTuple):
+    backend: str                  # "hf" / "onnx" / "mock"
+    out_of_process: bool          # バックエンドを別プロセスで動かす（描画とGILを取り合わない）
+    use_gpu: bool
+    quantize: Optional[str]       # None / "int8"（CPU時のみ有効）
+    draft_model: Optional[str]    # 補助デコード用の下書きモデル（例: "microsoft/phi-1_5"。Noneで無効）
+    prompt_budget: int            # プロンプトの最大トークン数（超える分は古い会話ターンから落とす）
+    response_cache_size: int      # 応答メモ化の最大件数（0で無効）
+    response_cache_path: Optional[str]  # 永続化先（プロジェクトからの相対パス。Noneでメモリのみ）
+    snapshot_dir: Optional[str]   # safetensorsスナップショットの保存先（プロジェクトからの相対パス。Noneで無効）
+    onnx_export_dir: str          # ONNXエクスポートの保存先（プロジェクトからの相対パス。モデルごとのサブディレクトリに保存）
+    preload: bool                 # 起動時にバックグラウンドでモデルを読み込み始める
+    telemetry_path: Optional[str] # 推論イベントのJSONL出力先（プロジェクトからの相対パス。Noneで出力しない）
+    debug_overlay: bool           # ステータスバーに直近の生成速度・prefill時間・キャッシュ率を表示
+    verdict_head: Optional[str]   # 学習済み判定ヘッド（プロジェクトからの相対パス。無ければYES/NOロジットで判定）
+    idle_unload_s: Optional[float]  # 酒場を出てからモデルをメモリから降ろすまでの秒数（Noneで常駐。起動時の先読みは酒場に入るまで残す）
+    rss_budget_mb: Optional[int]  # ゲームと推論プロセスのRSS合計の上限（MB。Noneで無制限。酒場にいる間はKVキャッシュを捨て、それでも超えればモデルも降ろす）
+
 class WindowConfig(NamedTuple):
     width: int
     height: int
     fps: int
+    dirty_rects: bool             # 変わった領域だけを画面に送る（Falseで毎フレーム全体を flip）
+    idle_wait_ms: int             # アニメーションの無い画面で、入力が無くても描き直すまでの最長待ち時間
 
 class LayoutConfig(NamedTuple):
     left_panel_w: int
@@ -45,7 +65,26 @@ class ColorPalette(NamedTuple):
 
 DIALOGUE = DialogueConfig(max_turns=3)
 
-WINDOW = WindowConfig(width=1200, height=800, fps=30)
+INFERENCE = InferenceConfig(
+    backend="hf",
+    out_of_process=True,
+    use_gpu=True,
+    quantize=None,
+    draft_model=None,
+    prompt_budget=512,
+    response_cache_size=512,
+    response_cache_path=None,
+    snapshot_dir="models/phi-2",
+    onnx_export_dir="models/onnx",
+    preload=True,
+    telemetry_path=None,
+    debug_overlay=False,
+    verdict_head="models/verdict_head.npz",
+    idle_unload_s=300.0,
+    rss_budget_mb=None,
+)
+
+WINDOW = WindowConfig(width=1200, height=800, fps=30, dirty_rects=True, idle_wait_ms=500)
 
 LAYOUT = LayoutConfig(
     left_panel_w=380,
@@ -98,7 +137,8 @@ class UIButton:
         self.disabled_color = disabled_color
         self.enabled = True
 
-    def draw(self, surface: pygame.Surface, font: pygame.font.Font):
+    def draw(self, surface: pygame.Surface, font: pygame.font.Font, text_cache=None):
+        """text_cache（screens.text_cache.TextCache）を渡すと描画済みの文字を使い回す"""
         mouse = pygame.mouse.get_pos()
         if not self.enabled:
             bg = self.disabled_color
@@ -112,10 +152,18 @@ class UIButton:
         pygame.draw.rect(surface, C.wood_dark, self.rect, 2, border_radius=6)
 
         # テキスト
-        txt = font.render(self.text, True,
-                          self.text_color if self.enabled else C.white)
+        color = self.text_color if self.enabled else C.white
+        if text_cache is not None:
+            txt = text_cache.render(font, self.text, True, color)
+        else:
+            txt = font.render(self.text, True, color)
         txt_rect = txt.get_rect(center=self.rect.center)
         surface.blit(txt, txt_rect)
 
+    def appearance(self) -> Tuple:
+        """描画結果を決める状態（文字・有効/無効・ホバー）"""
+        hover = self.enabled and self.rect.collidepoint(pygame.mouse.get_pos())
+        return (self.text, self.enabled, hover)
+
     def clicked(self, pos: Tuple[int, int]) -> bool:
         return self.enabled and self.rect.collidepoint(pos)
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+推論テレメトリ
+生成・分類・キャッシュの呼び出しごとに構造化イベント（dict）を発行し、
+差し替え可能なシンク（JSONLファイル・メモリ上のリングバッファ）に流す
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class RingBufferSink:
+    """直近のイベントをメモリ上に保持するシンク（デバッグ表示用）"""
+
+    def __init__(self, maxlen: int = 256):
+        self._events: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def write(self, event: Dict):
+        with self._lock:
+            self._events.append(event)
+
+    def events(self, kind: Optional[str] = None) -> List[Dict]:
+        """保持中のイベント（古い順）。kind を指定するとその種類だけ"""
+        with self._lock:
+            return [e for e in self._events if kind is None or e['kind'] == kind]
+
+    def latest(self, kind: str) -> Optional[Dict]:
+        """指定した種類の最新イベント"""
+        with self._lock:
+            for event in reversed(self._events):
+                if event['kind'] == kind:
+                    return event
+        return None
+
+
+class JsonlSink:
+    """イベントを1行1件のJSONとしてファイルに追記するシンク"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def write(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class Telemetry:
+    """イベントを登録済みの全シンクに配る"""
+
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def emit(self, kind: str, **fields):
+        """イベントを組み立てて発行する（時刻と種類を付与）"""
+        self.forward({'ts': time.time(), 'kind': kind, **fields})
+
+    def forward(self, event: Dict):
+        """組み立て済みのイベント（子プロセスから届いたもの等）をそのまま発行する"""
+        for sink in self.sinks:
+            try:
+                sink.write(event)
+            except OSError as e:
+                # テレメトリの失敗で推論を止めない
+                print(f"Telemetry sink failed: {e}")
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# ウィンドウ・音声デバイスの無い環境でも pygame を初期化できるようにする
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# リポジトリ直下のモジュール（Phi2DialogueSimulatour など）を import できるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+"""一括シミュレーションの出力と、シード付き実行の再現性（モックバックエンド）"""
+
+import csv
+
+import pytest
+
+import bulk_recruitment
+from backends import create_backend
+from Phi2DialogueSimulatour import Phi2DialogueSimulator
+
+
+@pytest.fixture
+def sim():
+    return Phi2DialogueSimulator(backend=create_backend("mock"), verbose=False)
+
+
+def run_to_csv(sim, path, seeded=True, workers=2):
+    scenarios = bulk_recruitment.SCENARIOS[:2]
+    tasks = bulk_recruitment._make_tasks(sim, scenarios, 3, grid=False, seed=7)
+    summary = bulk_recruitment.run(sim, tasks, scenarios, str(path), workers,
+                                   progress_every=100, seeded=seeded)
+    with open(path, newline="", encoding="utf-8") as f:
+        return summary, list(csv.DictReader(f))
+
+
+def test_writes_one_row_per_character_and_scenario(sim, tmp_path):
+    summary, rows = run_to_csv(sim, tmp_path / "out.csv")
+    assert summary['simulations'] == len(rows) == 6
+    assert summary['failed'] == 0
+    assert sum(summary['bands'].values()) == 6
+    assert [int(r['index']) for r in rows] == list(range(6))
+    for row in rows:
+        assert row['band'] == sim.verdict_band(float(row['yes_prob']))
+        assert row['turn1_user'] == bulk_recruitment.GREETING
+        assert row['turn4_ai']
+
+
+def test_seeded_runs_are_reproducible(sim, tmp_path):
+    _, first = run_to_csv(sim, tmp_path / "a.csv", workers=1)
+    _, second = run_to_csv(sim, tmp_path / "b.csv", workers=3)
+    assert first == second
+    assert all(row['seed'] for row in first)
+
+
+def test_unseeded_runs_omit_the_seed_column(sim, tmp_path):
+    _, rows = run_to_csv(sim, tmp_path / "out.csv", seeded=False)
+    assert 'seed' not in rows[0]
+
+
+def test_grid_covers_every_job_and_personality(sim):
+    tasks = bulk_recruitment._make_tasks(sim, [["hi"]], 1, grid=True, seed=0)
+    combos = {(t.character['job'], t.character['personality']) for t in tasks}
+    assert len(combos) == len(sim.jobs) * len(sim.personalities) == len(tasks)
@@ -0,0 +1,67 @@
+"""CancelToken と、会話単位でのバックエンドの中断"""
+
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from backends.base import CancelToken, GenerationCancelled
+from backends.mock import MockBackend
+
+
+def test_cancel_runs_callbacks_once():
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: calls.append("a"))
+    assert not token.cancelled
+    token.check()
+
+    token.cancel()
+    token.cancel()
+    assert token.cancelled
+    assert calls == ["a"]
+    with pytest.raises(GenerationCancelled):
+        token.check()
+
+
+def test_on_cancel_after_cancel_runs_immediately():
+    token = CancelToken()
+    token.cancel()
+    calls = []
+    token.on_cancel(lambda: calls.append("late"))
+    assert calls == ["late"]
+
+
+def test_wait_returns_result():
+    token = CancelToken()
+    future = Future()
+    future.set_result(42)
+    assert token.wait(future) == 42
+
+
+def test_wait_withdraws_queued_future():
+    token = CancelToken()
+    future = Future()   # 実行が始まっていない（キュー待ち）
+    threading.Timer(0.05, token.cancel).start()
+    with pytest.raises(GenerationCancelled):
+        token.wait(future)
+    assert future.cancelled()
+
+
+def test_backend_cancel_stops_only_that_session():
+    backend = MockBackend(decode_ms_per_token=5)
+    stream = backend.stream("prompt", 50, 0.7, session="a")
+    other = backend.stream("prompt", 50, 0.7, session="b")
+    next(stream)
+    first = next(other)
+    assert backend._in_flight() == 2
+
+    backend.cancel("a")
+    with pytest.raises(GenerationCancelled):
+        for _ in stream:
+            pass
+    assert first + "".join(other) == backend.generate("prompt", 50, 0.7)
+    assert backend._in_flight() == 0
+
+    # 中断後に送られたリクエストは通常どおり実行される
+    assert backend.generate("prompt", 50, 0.7, session="a")
@@ -0,0 +1,74 @@
+"""ChatLog の再描画対象と、表示範囲に入る吹き出しの選び方"""
+
+import pygame
+import pytest
+
+from screens.chat_log import ChatLog
+
+
+class RecordingScreen:
+    """blit された位置だけを記録する描画先"""
+
+    def __init__(self):
+        self.blits = []
+
+    def blit(self, surface, pos):
+        self.blits.append((surface, pos))
+
+
+@pytest.fixture(scope="module")
+def fonts():
+    pygame.font.init()
+    yield {"body": pygame.font.Font(None, 22), "small": pygame.font.Font(None, 16)}
+    pygame.font.quit()
+
+
+def make_messages(n):
+    return [{'speaker': "You" if i % 2 == 0 else "Rose", 'text': f"message {i} " * (i % 4 + 1),
+             'is_user': i % 2 == 0} for i in range(n)]
+
+
+def test_tops_follow_surface_heights(fonts):
+    log = ChatLog(fonts, 400)
+    log.sync(make_messages(6))
+    top = 0
+    for i, surface in enumerate(log._surfaces):
+        assert log._tops[i] == top
+        top += surface.get_height() + ChatLog.GAP
+    assert log.height == top
+
+
+def test_sync_redraws_only_changed_messages(fonts, monkeypatch):
+    log = ChatLog(fonts, 400)
+    messages = make_messages(5)
+    log.sync(messages)
+
+    rendered = []
+    render = log._render
+    monkeypatch.setattr(log, "_render", lambda msg: rendered.append(msg) or render(msg))
+    log.sync(messages)
+    assert rendered == []
+
+    messages[-1]['text'] += " and a streamed token that wraps onto another line" * 3
+    log.sync(messages)
+    assert rendered == [messages[-1]]
+    assert log.height == log._tops[-2] + log._surfaces[-1].get_height() + ChatLog.GAP
+
+    log.sync(messages[:2])
+    assert len(log._surfaces) == 2 and len(log._tops) == 3
+
+
+@pytest.mark.parametrize("scroll", [0, 35, 120, 10_000])
+def test_draws_only_visible_bubbles(fonts, scroll):
+    log = ChatLog(fonts, 400)
+    log.sync(make_messages(12))
+    view = pygame.Rect(0, 100, 400, 150)
+    y = view.top - scroll   # ログ先頭の画面上の位置
+
+    screen = RecordingScreen()
+    log.draw(screen, 0, y, view)
+
+    drawn = [pos[1] - y for _, pos in screen.blits]
+    expected = [top for top, surface in zip(log._tops, log._surfaces)
+                if top < view.bottom - y and top + surface.get_height() + ChatLog.GAP > view.top - y]
+    assert drawn == expected
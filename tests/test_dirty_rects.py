@@ -0,0 +1,63 @@
+"""BaseScreen.dirty_rects が前のフレームとの差分から描き換わった領域を求めること"""
+
+import pygame
+
+from screens.base import BaseScreen
+
+
+class StateScreen(BaseScreen):
+    """view_state をテストから差し替えられる画面"""
+
+    def __init__(self):
+        super().__init__(pygame.Surface((8, 8)), {}, {})
+        self.view = None
+
+    def view_state(self):
+        return self.view
+
+
+A = pygame.Rect(0, 0, 10, 10)
+B = pygame.Rect(20, 0, 10, 10)
+
+
+def test_first_frame_and_unknown_state_redraw_everything():
+    screen = StateScreen()
+    assert screen.dirty_rects() is None          # view_state が None
+    screen.view = ("page", [(A, 1)])
+    assert screen.dirty_rects() is None          # 前のフレームが無い
+
+
+def test_unchanged_frame_has_no_dirty_rects():
+    screen = StateScreen()
+    screen.view = ("page", [(A, 1), (B, "x")])
+    screen.dirty_rects()
+    assert screen.dirty_rects() == []
+
+
+def test_only_changed_regions_are_dirty():
+    screen = StateScreen()
+    screen.view = ("page", [(A, 1), (B, "x")])
+    screen.dirty_rects()
+    screen.view = ("page", [(A, 2), (B, "x")])
+    assert screen.dirty_rects() == [A]
+
+
+def test_moved_region_covers_old_and_new_position():
+    screen = StateScreen()
+    screen.view = ("page", [(A, 1)])
+    screen.dirty_rects()
+    moved = A.move(5, 5)
+    screen.view = ("page", [(moved, 1)])
+    assert screen.dirty_rects() == [pygame.Rect(0, 0, 15, 15)]
+
+
+def test_page_or_region_count_change_redraws_everything():
+    screen = StateScreen()
+    screen.view = ("page", [(A, 1)])
+    screen.dirty_rects()
+    screen.view = ("other", [(A, 1)])
+    assert screen.dirty_rects() is None
+    screen.view = ("other", [(A, 1), (B, 1)])
+    assert screen.dirty_rects() is None
+    screen.view = ("other", [(A, 1), (B, 1)])
+    assert screen.dirty_rects() == []
@@ -0,0 +1,79 @@
+"""会話（session）ごとのKVキャッシュの保持・再利用と、上限を超えたときのLRU破棄"""
+
+import threading
+from collections import OrderedDict
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from backends.hf_phi2 import HFPhi2Backend
+
+
+class FakeCache:
+    """past_key_values の代わり（長さと crop だけを持つ）"""
+
+    def __init__(self, length):
+        self.length = length
+
+    def get_seq_length(self):
+        return self.length
+
+    def crop(self, n):
+        # DynamicCache.crop と同じく負の値は末尾から落とす長さ
+        self.length += n
+
+
+def make_backend(kv_sessions=2):
+    # モデルは読み込まない（KVキャッシュの出し入れだけを見る）
+    backend = HFPhi2Backend.__new__(HFPhi2Backend)
+    backend.use_kv_cache = True
+    backend.kv_sessions = kv_sessions
+    backend._kv = OrderedDict()
+    backend._kv_lock = threading.Lock()
+    return backend
+
+
+def ids(*values):
+    return torch.tensor([values])
+
+
+def test_least_recently_used_session_is_evicted():
+    backend = make_backend(kv_sessions=2)
+    backend._store_kv_cache("a", ids(1, 2), FakeCache(2))
+    backend._store_kv_cache("b", ids(1, 2), FakeCache(2))
+    backend._store_kv_cache("a", ids(1, 2, 3), FakeCache(3))   # a を最近使ったものにする
+    backend._store_kv_cache("c", ids(1, 2), FakeCache(2))      # b が破棄される
+    assert list(backend._kv) == ["a", "c"]
+
+
+def test_sessions_do_not_share_caches():
+    backend = make_backend()
+    backend._store_kv_cache("a", ids(1, 2, 3), FakeCache(3))
+    assert backend._reuse_kv_cache(ids(1, 2, 3, 4), "b") is None
+    assert backend._reuse_kv_cache(ids(1, 2, 3, 4), "a") is not None
+
+
+def test_reuse_keeps_only_the_matching_prefix():
+    backend = make_backend()
+    cache = FakeCache(4)
+    backend._store_kv_cache("a", ids(1, 2, 3, 4), cache)
+    assert backend._reuse_kv_cache(ids(1, 2, 9, 9, 9), "a") is cache
+    assert cache.length == 2
+
+
+def test_mismatch_from_the_start_drops_the_session():
+    backend = make_backend()
+    backend._store_kv_cache("a", ids(1, 2, 3), FakeCache(3))
+    assert backend._reuse_kv_cache(ids(7, 8, 9), "a") is None
+    assert "a" not in backend._kv
+
+
+def test_reset_and_trim():
+    backend = make_backend(kv_sessions=4)
+    for session in ("a", "b", "c"):
+        backend._store_kv_cache(session, ids(1, 2), FakeCache(2))
+    backend.reset("b")
+    assert list(backend._kv) == ["a", "c"]
+    assert backend.trim() == 2
+    assert not backend._kv
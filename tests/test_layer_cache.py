@@ -0,0 +1,44 @@
+"""背景と暗幕を合成した静的レイヤーのキャッシュ"""
+
+import pygame
+
+from screens.base import BaseScreen
+
+
+def make_screen():
+    return BaseScreen(pygame.Surface((16, 16)), {}, {})
+
+
+def test_layer_is_built_once_per_key():
+    screen = make_screen()
+    builds = []
+    build = lambda layer: builds.append(layer) or layer.fill((10, 20, 30))
+    first = screen.cached_layer("bg", build)
+    assert screen.cached_layer("bg", build) is first
+    assert len(builds) == 1
+    assert first.get_size() == (16, 16)
+
+
+def test_least_recently_used_layer_is_evicted():
+    screen = make_screen()
+    builds = []
+    build = lambda key: (lambda layer: builds.append(key))
+    for key in range(BaseScreen.MAX_LAYERS):
+        screen.cached_layer(key, build(key))
+    screen.cached_layer(0, build(0))                       # 0 を最近使ったものにする
+    screen.cached_layer("new", build("new"))               # 1 が追い出される
+    screen.cached_layer(0, build(0))
+    screen.cached_layer(1, build(1))
+    assert builds == list(range(BaseScreen.MAX_LAYERS)) + ["new", 1]
+
+
+def test_draw_background_composites_overlay():
+    screen = make_screen()
+    image = pygame.Surface((16, 16))
+    image.fill((200, 200, 200))
+    screen.draw_background(image, (0, 0, 0, 128))
+    r, g, b, _ = screen.screen.get_at((0, 0))
+    assert 90 <= r <= 110 and r == g == b
+
+    screen.draw_background(None, (0, 0, 0, 0), fill=(1, 2, 3))
+    assert tuple(screen.screen.get_at((5, 5)))[:3] == (1, 2, 3)
@@ -0,0 +1,111 @@
+"""MemoryManager のアイドル退避と、RSS上限超過時の段階的な退避"""
+
+import pytest
+
+import memory_manager
+from backends.mock import MockBackend
+from memory_manager import MemoryManager
+
+
+class UnloadableMock(MockBackend):
+    """load / unload / trim の呼び出しを数えるモックバックエンド"""
+
+    def __init__(self):
+        super().__init__()
+        self.loaded = True
+        self.trims = 0
+        self.unloads = 0
+
+    def load(self):
+        if self.loaded:
+            return 0.0
+        self.loaded = True
+        return 0.5
+
+    def unload(self):
+        if not self.loaded:
+            return {}
+        self.loaded = False
+        self.unloads += 1
+        return {'model': "mock"}
+
+    def is_loaded(self):
+        return self.loaded
+
+    def trim(self):
+        self.trims += 1
+        return 1
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """rss_mb が返す値を差し替える"""
+    value = {'mb': 100.0}
+    monkeypatch.setattr(memory_manager, "rss_mb", lambda pids: value['mb'])
+    return value
+
+
+def make_manager(backend, **options):
+    # 監視スレッドは動かさず、check() をテストから呼ぶ
+    manager = MemoryManager(backend, check_interval=3600, **options)
+    manager.close()
+    return manager
+
+
+def test_idle_unload_starts_after_first_leave(rss):
+    backend = UnloadableMock()
+    manager = make_manager(backend, idle_seconds=0)
+
+    manager.check()            # 起動時の先読み（まだ酒場に入っていない）は降ろさない
+    assert backend.loaded
+
+    manager.enter()
+    manager.check()            # 使用中は降ろさない
+    assert backend.loaded
+
+    manager.leave()
+    manager.check()
+    assert not backend.loaded
+    assert [e['reason'] for e in manager.evictions] == ["idle"]
+
+    manager.check()            # 降ろした後は何もしない
+    assert len(manager.evictions) == 1
+
+
+def test_over_budget_in_use_trims_then_unloads(rss):
+    backend = UnloadableMock()
+    manager = make_manager(backend, idle_seconds=None, rss_budget_mb=50)
+    manager.in_use = True
+
+    rss['mb'] = 80.0
+    manager.check()
+    assert (backend.trims, backend.unloads) == (1, 0)
+
+    manager.check()            # KVキャッシュを捨てても超えたまま → モデルも降ろす
+    assert backend.unloads == 1
+    assert manager.evictions[-1]['reason'] == "rss_budget"
+
+
+def test_trim_that_brings_rss_under_budget_keeps_model(rss):
+    backend = UnloadableMock()
+    manager = make_manager(backend, idle_seconds=None, rss_budget_mb=50)
+    manager.in_use = True
+
+    rss['mb'] = 80.0
+    manager.check()
+    rss['mb'] = 40.0
+    manager.check()
+    assert (backend.trims, backend.unloads) == (1, 0)
+
+    rss['mb'] = 80.0           # 再び超えたらまずKVキャッシュから捨てる
+    manager.check()
+    assert (backend.trims, backend.unloads) == (2, 0)
+
+
+def test_over_budget_outside_tavern_unloads_immediately(rss):
+    backend = UnloadableMock()
+    manager = make_manager(backend, idle_seconds=None, rss_budget_mb=50)
+
+    rss['mb'] = 80.0
+    manager.check()
+    assert backend.unloads == 1
@@ -0,0 +1,37 @@
+"""create_backend とモックバックエンドの決定性"""
+
+import pytest
+
+from backends import StopRule, create_backend
+from backends.mock import MockBackend
+
+
+def test_create_backend_by_name():
+    assert isinstance(create_backend("mock"), MockBackend)
+    with pytest.raises(ValueError):
+        create_backend("no-such-backend")
+
+
+def test_output_depends_only_on_prompt_and_seed():
+    a, b = create_backend("mock"), create_backend("mock")
+    assert a.generate("hello", 50, 0.7, seed=1) == b.generate("hello", 50, 0.7, seed=1)
+    replies = {a.generate("hello", 50, 0.7, seed=s) for s in range(20)}
+    assert len(replies) > 1
+    assert a.classify("hello", [" YES", " NO"]) == b.classify("hello", [" YES", " NO"])
+
+
+def test_stream_matches_generate_and_honours_limits():
+    backend = create_backend("mock")
+    assert "".join(backend.stream("hi", 50, 0.7, seed=3)) == backend.generate("hi", 50, 0.7, seed=3)
+    assert len(backend.generate("hi", 3, 0.7, seed=3).split()) <= 3
+
+    stopped = backend.generate("hi", 50, 0.7, seed=3, stop=StopRule(max_sentences=1))
+    assert stopped.count(".") <= 1
+
+
+def test_classify_follows_conversation_words():
+    backend = create_backend("mock")
+    yes, no = backend.classify("I would gladly join, honored to be yours", [" YES", " NO"])
+    assert yes > no
+    yes, no = backend.classify("not sure, busy, maybe another time", [" YES", " NO"])
+    assert yes < no
@@ -0,0 +1,70 @@
+"""子プロセスのバックエンドの異常終了と、子プロセス側の例外の型"""
+
+import time
+
+import pytest
+
+from backends.base import GenerationCancelled
+from backends.process import BackendCrashed, BackendError, ProcessBackend
+
+
+@pytest.fixture
+def backend():
+    backend = ProcessBackend("mock", decode_ms_per_token=20)
+    yield backend
+    backend.close()
+
+
+def test_generates_in_child_process(backend):
+    assert backend.alive
+    assert backend.generate("hello", 5, 0.7) == "".join(backend.stream("hello", 5, 0.7))
+
+
+def test_killed_child_fails_pending_and_later_requests(backend):
+    future = backend.submit("hello", 50, 0.7)
+    stream = backend.stream("hello", 50, 0.7)
+    next(stream)
+    backend.process.kill()
+
+    with pytest.raises(BackendCrashed):
+        future.result(timeout=10)
+    with pytest.raises(BackendCrashed):
+        for _ in stream:
+            pass
+    deadline = time.time() + 10
+    while backend.alive and time.time() < deadline:
+        time.sleep(0.05)
+    assert not backend.alive
+    assert "killed by signal" in backend.error
+    with pytest.raises(BackendCrashed):
+        backend.generate("hello", 5, 0.7)
+
+
+def test_remote_cancel_is_generation_cancelled(backend):
+    stream = backend.stream("hello", 50, 0.7, session="s")
+    next(stream)
+    backend.cancel("s")
+    with pytest.raises(GenerationCancelled):
+        for _ in stream:
+            pass
+
+
+def test_remote_errors_keep_their_type():
+    error = ProcessBackend._remote_error(("NotImplementedError", "no hidden states"))
+    assert type(error) is NotImplementedError
+    assert str(error) == "no hidden states"
+    assert type(ProcessBackend._remote_error(("GenerationCancelled", ""))) is GenerationCancelled
+
+    error = ProcessBackend._remote_error(("ValueError", "bad input"))
+    assert type(error) is BackendError
+    assert str(error) == "ValueError: bad input"
+
+
+def test_remote_error_from_unknown_method(backend):
+    with pytest.raises(BackendError, match="AttributeError"):
+        backend._call("no_such_method").result(timeout=10)
+
+
+def test_failed_start_raises_backend_error():
+    with pytest.raises(BackendError, match="TypeError"):
+        ProcessBackend("mock", no_such_option=1)
@@ -0,0 +1,109 @@
+"""PromptBuilder のセグメント連結がプロンプト全体のトークン化と一致すること"""
+
+import re
+
+import pytest
+
+from Phi2DialogueSimulatour import Phi2DialogueSimulator
+from prompt_builder import PromptBuilder
+
+# GPT-2 系トークナイザの事前分割（空白は次の単語に付き、連続する空白は直後の空白の手前で切れる）
+_PRETOKENIZE = re.compile(
+    r"""'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?[^\s\w]+|\s+(?!\S)|\s+""")
+
+
+class WordEncoder:
+    """事前分割の単位をそのまま1トークンにするエンコーダ"""
+
+    def __init__(self):
+        self.vocab = {}
+
+    def __call__(self, text):
+        return [self.vocab.setdefault(piece, len(self.vocab))
+                for piece in _PRETOKENIZE.findall(text)]
+
+
+CHARACTER = {
+    'name': "Rose", 'job': "Mage", 'personality': "Calm",
+    'role': "Support", 'weapon': "Staff", 'abilities': "Heal",
+}
+
+
+@pytest.fixture
+def encode():
+    return WordEncoder()
+
+
+@pytest.fixture
+def sim(encode):
+    # モデルは使わない（プロンプトの組み立てだけを見る）
+    sim = Phi2DialogueSimulator.__new__(Phi2DialogueSimulator)
+    sim.prompts = PromptBuilder(encode, budget=4096)
+    return sim
+
+
+def test_ids_match_full_tokenization(encode):
+    builder = PromptBuilder(encode, budget=4096)
+    prompt = builder.build(["I am Rose.", "\n\n    "],
+                           ["\nUser: hi\nRose: Hello.", "\nUser: join?\nRose: Maybe."],
+                           ["\nUser:", " why?", "\n    Rose:"])
+    assert prompt.ids == encode(prompt.text)
+    assert prompt.dropped_turns == 0 and not prompt.truncated
+
+
+@pytest.mark.parametrize("reply", ["Sure, I will join.", ""])
+def test_simulator_prompts_match_full_tokenization(sim, encode, reply):
+    history = [{'user': "hi", 'ai': reply}, {'user': "Will you join?", 'ai': reply}]
+    for build in (sim._build_verdict_prompt, sim._build_cached_verdict_prompt,
+                  sim._build_conversation_prompt):
+        prompt = build(CHARACTER, history)
+        assert prompt.ids == encode(prompt.text), build.__name__
+
+
+def test_drops_oldest_turns_to_fit_budget(encode):
+    head, tail = ["Head."], ["\nTail:"]
+    turns = [f"\nUser: turn {i}" for i in range(5)]
+    fixed = len(encode("Head.")) + len(encode("\nTail:"))
+    per_turn = len(encode(turns[0]))
+    builder = PromptBuilder(encode, budget=fixed + per_turn * 2)
+
+    prompt = builder.build(head, turns, tail)
+    assert prompt.dropped_turns == 3
+    assert prompt.text == "Head." + turns[3] + turns[4] + "\nTail:"
+    assert prompt.ids == encode(prompt.text)
+
+
+def test_truncates_head_when_fixed_part_exceeds_budget(encode):
+    builder = PromptBuilder(encode, budget=3)
+    prompt = builder.build(["one two three four"], tail=[" five"])
+    assert prompt.truncated
+    assert prompt.text == " three four five"
+    assert prompt.ids == encode(prompt.text)
+    assert prompt.ids == encode("one two three four five")[-3:]
+
+
+@pytest.mark.parametrize("budget", [0, 1, 4, 6, 9])
+def test_truncated_text_matches_ids(encode, budget):
+    builder = PromptBuilder(encode, budget=budget)
+    head, tail = ["Instruct: read this.", "\n\nConversation:"], ["\n\nAnswer YES or NO.", "\nOutput:"]
+    prompt = builder.build(head, ["\nUser: hi"], tail)
+    assert prompt.truncated
+    assert prompt.dropped_turns == 1
+    assert len(prompt.ids) <= budget
+    assert prompt.ids == encode(prompt.text)
+    # 生成直前の部分を残し、先頭から切り詰める
+    assert "".join(head + tail).endswith(prompt.text)
+
+
+def test_segment_cache_is_lru(encode):
+    builder = PromptBuilder(encode, max_cached=2)
+    builder.segment("a")
+    builder.segment("b")
+    builder.segment("a")   # a を最近使ったものにする
+    builder.segment("c")   # b が追い出される
+    assert len(builder) == 2
+    hits = builder.hits
+    builder.segment("a")
+    assert builder.hits == hits + 1
+    builder.segment("b")
+    assert builder.misses == 4
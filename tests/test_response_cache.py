@@ -0,0 +1,62 @@
+"""ResponseCache の LRU と JSONL からの復元"""
+
+import json
+
+from response_cache import ResponseCache
+
+
+def test_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"   # a を最近使ったものにする
+    cache.put("c", "C")            # b が追い出される
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_key_depends_on_prompt_params_and_seed():
+    key = ResponseCache.make_key("hi", {"temperature": 0.7, "max_tokens": 50}, seed=1)
+    assert key == ResponseCache.make_key("hi", {"max_tokens": 50, "temperature": 0.7}, seed=1)
+    assert key != ResponseCache.make_key("hi", {"temperature": 0.7, "max_tokens": 50}, seed=2)
+    assert key != ResponseCache.make_key("hi", {"temperature": 0.7, "max_tokens": 50})
+    assert key != ResponseCache.make_key("hey", {"temperature": 0.7, "max_tokens": 50}, seed=1)
+
+
+def test_reloads_from_jsonl(tmp_path):
+    path = str(tmp_path / "cache" / "responses.jsonl")
+    cache = ResponseCache(path=path)
+    cache.put("a", "first")
+    cache.put("b", [1.5, -2.0])
+    cache.put("a", "second")   # 後の行が優先される
+
+    reloaded = ResponseCache(path=path)
+    assert reloaded.get("a") == "second"
+    assert reloaded.get("b") == [1.5, -2.0]
+
+
+def test_reload_skips_broken_lines_and_compacts(tmp_path):
+    path = tmp_path / "responses.jsonl"
+    lines = [json.dumps({"key": "a", "value": i}) for i in range(5)]
+    lines.insert(2, "{not json")
+    lines.append(json.dumps({"value": "no key"}))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    cache = ResponseCache(path=str(path))
+    assert cache.get("a") == 4
+    # 保持中の1件だけに書き直される
+    assert path.read_text(encoding="utf-8").splitlines() == [json.dumps({"key": "a", "value": 4})]
+
+
+def test_reload_keeps_only_newest_entries(tmp_path):
+    path = str(tmp_path / "responses.jsonl")
+    cache = ResponseCache(max_entries=10, path=path)
+    for i in range(5):
+        cache.put(str(i), i)
+
+    small = ResponseCache(max_entries=2, path=path)
+    assert len(small) == 2
+    assert small.get("3") == 3 and small.get("4") == 4
+    assert small.get("0") is None
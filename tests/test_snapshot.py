@@ -0,0 +1,54 @@
+"""ローカルスナップショットは同じモデルから作ったものだけを使うこと"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("transformers")
+from backends.hf_phi2 import HFPhi2Backend
+
+
+class FakePretrained:
+    """save_pretrained で重み・トークナイザのファイルを書くだけのモデル／トークナイザ"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.config = SimpleNamespace(_commit_hash="abc123")
+
+    def save_pretrained(self, path, **kwargs):
+        with open(os.path.join(path, self.filename), "w") as f:
+            f.write("weights")
+
+
+def make_backend(model_name, snapshot_dir):
+    # モデルは読み込まない（スナップショットの判定と書き出しだけを見る）
+    backend = HFPhi2Backend.__new__(HFPhi2Backend)
+    backend.model_name = model_name
+    backend.snapshot_dir = str(snapshot_dir)
+    backend.tokenizer = FakePretrained("tokenizer.json")
+    return backend
+
+
+def test_saved_snapshot_is_used_for_the_same_model(tmp_path):
+    backend = make_backend("microsoft/phi-2", tmp_path)
+    assert not backend._has_snapshot()
+    backend._save_snapshot(FakePretrained("model.safetensors"))
+    assert backend._has_snapshot()
+    assert make_backend("microsoft/phi-2", tmp_path)._has_snapshot()
+
+
+def test_snapshot_of_another_model_is_not_used(tmp_path):
+    make_backend("microsoft/phi-2", tmp_path)._save_snapshot(FakePretrained("model.safetensors"))
+
+    other = make_backend("microsoft/phi-1_5", tmp_path)
+    assert not other._has_snapshot()
+    other._save_snapshot(FakePretrained("model.safetensors"))   # 作り直す
+    assert other._has_snapshot()
+    assert not make_backend("microsoft/phi-2", tmp_path)._has_snapshot()
+
+
+def test_snapshot_without_record_is_not_used(tmp_path):
+    # 記録の無い古い形式・書き出し途中のスナップショット
+    (tmp_path / "model.safetensors").write_text("weights")
+    assert not make_backend("microsoft/phi-2", tmp_path)._has_snapshot()
@@ -0,0 +1,54 @@
+"""StopRule で止めた位置の出力が、最後まで生成した場合と同じ応答に整形されること"""
+
+import pytest
+
+from backends.base import StopRule
+from Phi2DialogueSimulatour import Phi2DialogueSimulator
+
+
+@pytest.fixture
+def sim():
+    # モデルは使わない（_extract_phi2_response は stop_rule しか見ない）
+    sim = Phi2DialogueSimulator.__new__(Phi2DialogueSimulator)
+    sim.stop_rule = StopRule()
+    return sim
+
+
+def stopped_at(rule: StopRule, text: str) -> str:
+    """1文字ずつ生成したとして、should_stop が最初に真になった時点の出力"""
+    for end in range(1, len(text) + 1):
+        if rule.should_stop(text[:end]):
+            return text[:end]
+    return text
+
+
+OUTPUTS = [
+    " glad to meet you. I fight with a bow. My aim is true.",
+    " a healer from the north.\nUser: Will you join?",
+    " not sure about you yet User: why not?",
+    "\n  Happy to help!\nMore text",
+    " hmm",
+    " " + "very " * 60 + "long answer. Second one.",
+]
+
+
+@pytest.mark.parametrize("output", OUTPUTS)
+def test_stopping_does_not_change_extracted_response(sim, output):
+    partial = stopped_at(sim.stop_rule, output)
+    assert (sim._extract_phi2_response(partial, "", "Rose")
+            == sim._extract_phi2_response(output, "", "Rose"))
+
+
+def test_stops_at_newline_marker_and_sentences():
+    rule = StopRule()
+    assert not rule.should_stop("\n  ")            # 本文が始まる前の改行では止めない
+    assert rule.should_stop(" Hello\n")
+    assert rule.should_stop(" Sure User:")
+    assert not rule.should_stop(" One. Two")
+    assert rule.should_stop(" One. Two.")
+    assert rule.should_stop(" " + "x" * 201)
+
+
+def test_limits_can_be_disabled():
+    rule = StopRule(newline=False, markers=(), max_sentences=0, max_chars=0)
+    assert not rule.should_stop(" One. Two. Three.\n" + "x" * 500)
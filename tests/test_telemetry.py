@@ -0,0 +1,42 @@
+"""テレメトリのイベント配信とシンク、バックエンドが出す計測値"""
+
+import json
+
+from backends.mock import MockBackend
+from telemetry import JsonlSink, RingBufferSink, Telemetry
+
+
+class FailingSink:
+    def write(self, event):
+        raise OSError("disk full")
+
+
+def test_events_reach_every_sink(tmp_path):
+    ring = RingBufferSink(maxlen=2)
+    path = tmp_path / "logs" / "events.jsonl"
+    telemetry = Telemetry(ring, FailingSink())   # 失敗するシンクがあっても止めない
+    telemetry.add_sink(JsonlSink(str(path)))
+
+    telemetry.emit("generate", tokens=3)
+    telemetry.emit("classify", classify_s=0.1)
+    telemetry.emit("generate", tokens=5)
+
+    assert [e['kind'] for e in ring.events()] == ["classify", "generate"]
+    assert ring.latest("generate")['tokens'] == 5
+    assert ring.latest("evict") is None
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [e['kind'] for e in lines] == ["generate", "classify", "generate"]
+    assert all('ts' in e for e in lines)
+
+
+def test_backend_reports_prefill_and_decode_timing():
+    ring = RingBufferSink()
+    backend = MockBackend(decode_ms_per_token=1)
+    backend.telemetry = Telemetry(ring)
+    backend.generate("hello there", 5, 0.7)
+
+    event = ring.latest("generate")
+    assert event['backend'] == "mock"
+    assert event['generated_tokens'] == 5
+    assert event['prefill_s'] >= 0 and event['total_s'] >= event['prefill_s']
+    assert event['tokens_per_s'] > 0
@@ -0,0 +1,41 @@
+"""全画面で共有する描画済みテキストのキャッシュ"""
+
+import pygame
+import pytest
+
+from screens.text_cache import TextCache
+
+
+@pytest.fixture(scope="module")
+def font():
+    pygame.font.init()
+    yield pygame.font.Font(None, 20)
+    pygame.font.quit()
+
+
+def test_same_arguments_return_the_cached_surface(font):
+    cache = TextCache()
+    surface = cache.render(font, "Tavern", True, (255, 255, 255))
+    assert cache.render(font, "Tavern", True, [255, 255, 255]) is surface   # 色はリストでも同じキー
+    assert cache.render(font, "Tavern", True, (0, 0, 0)) is not surface
+    assert cache.render(font, "Tavern", True, (255, 255, 255), (0, 0, 0)) is not surface
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert cache.hit_rate == pytest.approx(0.25)
+
+
+def test_least_recently_used_text_is_evicted(font):
+    cache = TextCache(maxsize=2)
+    a = cache.render(font, "a", True, (0, 0, 0))
+    cache.render(font, "b", True, (0, 0, 0))
+    cache.render(font, "a", True, (0, 0, 0))       # a を最近使ったものにする
+    cache.render(font, "c", True, (0, 0, 0))       # b が追い出される
+    assert len(cache) == 2
+    assert cache.render(font, "a", True, (0, 0, 0)) is a
+    misses = cache.misses
+    cache.render(font, "b", True, (0, 0, 0))
+    assert cache.misses == misses + 1
+
+
+def test_renders_text_with_null_characters(font):
+    cache = TextCache()
+    assert cache.render(font, "a\x00b", True, (0, 0, 0)).get_width() > 0
@@ -0,0 +1,50 @@
+"""判定ヘッドの学習・保存・読み込み"""
+
+import numpy as np
+import pytest
+
+from verdict_head import VerdictHead, evaluate
+
+
+@pytest.fixture
+def separable():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(200, 8))
+    y = (x[:, 0] + 0.5 * x[:, 1] > 0).astype(float)
+    return x, y
+
+
+def test_fit_separates_training_data(separable):
+    x, y = separable
+    head = VerdictHead.fit(x, y)
+    probs = np.array([head.predict(row) for row in x])
+    assert ((probs > 0.5) == (y > 0.5)).mean() > 0.95
+
+
+def test_save_and_load_round_trip(separable, tmp_path):
+    x, y = separable
+    head = VerdictHead.fit(x, y, meta={'model': "microsoft/phi-2"})
+    path = str(tmp_path / "heads" / "verdict_head")   # 拡張子なしでもそのパスに保存する
+    head.save(path)
+
+    loaded = VerdictHead.load(path)
+    assert loaded.model == "microsoft/phi-2"
+    assert loaded.hidden_size == 8
+    assert loaded.logit(x[0]) == pytest.approx(head.logit(x[0]))
+
+
+def test_predict_is_stable_for_extreme_logits():
+    head = VerdictHead(np.ones(2), 0.0, np.zeros(2), np.ones(2))
+    assert head.predict([-1e6, 0.0]) == pytest.approx(0.0)
+    assert head.predict([1e6, 0.0]) == pytest.approx(1.0)
+
+
+def test_rejects_hidden_state_of_another_size():
+    head = VerdictHead(np.ones(2), 0.0, np.zeros(2), np.ones(2))
+    with pytest.raises(ValueError):
+        head.logit([1.0, 2.0, 3.0])
+
+
+def test_evaluate_reports_accuracy():
+    report = evaluate([0.9, 0.8, 0.2, 0.1], [1, 1, 0, 1])
+    assert report['accuracy'] == pytest.approx(0.75)
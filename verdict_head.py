@@ -0,0 +1,232 @@
+"""
+学習済みの仲間判定ヘッド
+会話末尾トークンの最終層の隠れ状態に対するロジスティック回帰。
+会話の生成で作られたKVキャッシュの続きとして末尾を1回 forward するだけで判定でき、
+" YES" / " NO" の次トークンロジットを比べる判定より軽く、確率も較正される。
+ヘッドが無い・モデルと合わない場合は従来のロジット判定を使う
+
+学習（bulk_recruitment.py の出力CSVから）:
+    python verdict_head.py --data results/recruitment.csv --output models/verdict_head.npz
+    python verdict_head.py --data labelled.csv --label-column label   # 人手のラベルで学習
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class VerdictHead:
+    """隠れ状態 → YES確率 のロジスティック回帰（特徴量は学習時の平均・標準偏差で正規化）"""
+
+    def __init__(self, weight: np.ndarray, bias: float,
+                 mean: np.ndarray, scale: np.ndarray, meta: Optional[Dict] = None):
+        """
+        Args:
+            weight: 正規化後の特徴量に対する重み（隠れ状態の次元数）
+            bias: バイアス
+            mean / scale: 特徴量の正規化に使う平均・標準偏差
+            meta: 学習元のモデル名や評価値などの情報
+        """
+        self.weight = np.asarray(weight, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.meta = dict(meta or {})
+
+    @property
+    def hidden_size(self) -> int:
+        return self.weight.shape[0]
+
+    @property
+    def model(self) -> Optional[str]:
+        """学習に使ったモデル（別のモデルの隠れ状態には使えない）"""
+        return self.meta.get('model')
+
+    def logit(self, hidden: Sequence[float]) -> float:
+        """YESのロジット（softmax(logit, 0) がYES確率）"""
+        x = np.asarray(hidden, dtype=np.float64)
+        if x.shape != self.weight.shape:
+            raise ValueError(f"hidden state has {x.size} dims, head expects {self.hidden_size}")
+        return float(((x - self.mean) / self.scale) @ self.weight + self.bias)
+
+    def predict(self, hidden: Sequence[float]) -> float:
+        """YES確率"""
+        return float(_sigmoid(np.asarray(self.logit(hidden))))
+
+    # ---------- 保存・読み込み ----------
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # np.savez は拡張子が無いと ".npz" を付けるため、開いたファイルに書き込む
+        with open(path, "wb") as f:
+            np.savez(f, weight=self.weight, bias=np.array(self.bias),
+                     mean=self.mean, scale=self.scale,
+                     meta=np.array(json.dumps(self.meta, ensure_ascii=False)))
+
+    @classmethod
+    def load(cls, path: str) -> "VerdictHead":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['weight'], float(data['bias']), data['mean'], data['scale'],
+                       json.loads(str(data['meta'])))
+
+    # ---------- 学習 ----------
+
+    @classmethod
+    def fit(cls, features: np.ndarray, targets: np.ndarray, l2: float = 1e-2,
+            epochs: int = 500, lr: float = 0.5, meta: Optional[Dict] = None) -> "VerdictHead":
+        """
+        L2正則化付きロジスティック回帰を全バッチの勾配降下で学習する。
+        targets は 0/1 のラベル、または 0〜1 の確率（言語モデルの判定を蒸留する場合）
+        """
+        x = np.asarray(features, dtype=np.float64)
+        y = np.asarray(targets, dtype=np.float64)
+        mean = x.mean(axis=0)
+        scale = x.std(axis=0)
+        scale[scale < 1e-6] = 1.0
+        x = (x - mean) / scale
+
+        n, d = x.shape
+        weight = np.zeros(d)
+        bias = math.log((y.mean() + 1e-6) / (1 - y.mean() + 1e-6))
+        for _ in range(epochs):
+            p = _sigmoid(x @ weight + bias)
+            grad = p - y
+            weight -= lr * (x.T @ grad / n + l2 * weight)
+            bias -= lr * grad.mean()
+
+        return cls(weight, bias, mean, scale, meta)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -50, 50)))
+
+
+def evaluate(probs: Sequence[float], targets: Sequence[float], bins: int = 10) -> Dict:
+    """
+    対数損失・正解率（0.5で二値化）・ECE（確率の区間ごとの、平均予測と平均正解の差）
+    """
+    p = np.clip(np.asarray(probs, dtype=np.float64), 1e-7, 1 - 1e-7)
+    y = np.asarray(targets, dtype=np.float64)
+    if not len(p):
+        return {'count': 0}
+
+    ece = 0.0
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        mask = (p >= lo) & ((p < hi) if hi < 1.0 else (p <= hi))
+        if mask.any():
+            ece += mask.mean() * abs(p[mask].mean() - y[mask].mean())
+
+    return {
+        'count': int(len(p)),
+        'log_loss': float(-(y * np.log(p) + (1 - y) * np.log(1 - p)).mean()),
+        'accuracy': float(((p >= 0.5) == (y >= 0.5)).mean()),
+        'ece': float(ece),
+    }
+
+
+# ---------- 学習CLI ----------
+
+def _read_conversations(path: str, label_column: str) -> List[Tuple[Dict, List[Dict], float, Dict]]:
+    """bulk_recruitment.py 形式のCSVから (キャラクター, 会話履歴, 目標値, 元の行) を読む"""
+    conversations = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            value = row.get(label_column, "")
+            if value == "":
+                continue
+            target = {"true": 1.0, "false": 0.0}.get(value.lower())
+            target = float(value) if target is None else target
+
+            history = []
+            t = 1
+            while row.get(f'turn{t}_user'):
+                history.append({'turn': t, 'user': row[f'turn{t}_user'],
+                                'ai': row.get(f'turn{t}_ai', "")})
+                t += 1
+            if not history:
+                continue
+            character = {'name': row['name'], 'job': row['job'],
+                         'personality': row['personality']}
+            conversations.append((character, history, target, row))
+    return conversations
+
+
+def main():
+    from Phi2DialogueSimulatour import Phi2DialogueSimulator
+    from backends import create_backend
+
+    parser = argparse.ArgumentParser(description="Train the learned verdict head")
+    parser.add_argument("--data", required=True, help="CSV written by bulk_recruitment.py")
+    parser.add_argument("--label-column", default="yes_prob",
+                        help="target column: 0/1 labels or probabilities (default: distil yes_prob)")
+    parser.add_argument("--output", default="models/verdict_head.npz")
+    parser.add_argument("--backend", default="hf", choices=["hf", "mock"])
+    parser.add_argument("--model", default="microsoft/phi-2")
+    parser.add_argument("--gpu", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--holdout", type=float, default=0.2,
+                        help="fraction of conversations kept out for evaluation")
+    parser.add_argument("--l2", type=float, default=1e-2)
+    parser.add_argument("--epochs", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    conversations = _read_conversations(args.data, args.label_column)
+    if len(conversations) < 2:
+        parser.error(f"{args.data}: need at least 2 labelled conversations")
+
+    if args.backend == "mock":
+        backend = create_backend("mock")
+    else:
+        backend = create_backend("hf", model_name=args.model, use_gpu=args.gpu,
+                                 batch_size=args.batch_size)
+    sim = Phi2DialogueSimulator(backend=backend, verbose=False)
+
+    # 隠れ状態の抽出（バッチ推論でまとめて処理）
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.batch_size)) as pool:
+        features = list(pool.map(lambda c: sim.verdict_features(c[0], c[1]), conversations))
+    print(f"Extracted {len(features)} hidden states in {time.perf_counter() - t0:.1f}s")
+
+    order = list(range(len(conversations)))
+    random.Random(args.seed).shuffle(order)
+    n_test = int(len(order) * args.holdout) if len(order) >= 5 else 0
+    test, train = order[:n_test], order[n_test:]
+
+    x = np.asarray(features)
+    y = np.asarray([c[2] for c in conversations])
+    head = VerdictHead.fit(x[train], y[train], l2=args.l2, epochs=args.epochs, meta={
+        'model': backend.cache_tag().get('model'),
+        'backend': backend.name,
+        'label_column': args.label_column,
+        'data': os.path.basename(args.data),
+        'train_count': len(train),
+    })
+
+    report = {'train': evaluate([head.predict(x[i]) for i in train], y[train])}
+    if test:
+        report['holdout'] = evaluate([head.predict(x[i]) for i in test], y[test])
+        # 言語モデルのYES/NOロジット判定（CSVに記録済み）との比較
+        if args.label_column != "yes_prob":
+            baseline = [float(conversations[i][3]['yes_prob']) for i in test
+                        if conversations[i][3].get('yes_prob')]
+            if len(baseline) == len(test):
+                report['holdout_logit_verdict'] = evaluate(baseline, y[test])
+    head.meta['metrics'] = report
+
+    head.save(args.output)
+    print(json.dumps(report, indent=2))
+    print(f"✓ Saved verdict head to {args.output}")
+
+
+if __name__ == "__main__":
+    main()